@@ -37,6 +37,6 @@ from .spectral_norm import spectral_norm
 from .submanifoldConvolution import SubmanifoldConvolution, ValidConvolution
 from .tables import *
 from .unPooling import UnPooling
-from .utils import append_tensors, AddCoords, add_feature_planes, concatenate_feature_planes, compare_sparse
+from .utils import append_tensors, AddCoords, add_feature_planes, concatenate_feature_planes, compare_sparse, checkpoint_sparse
 from .shapeContext import ShapeContext, MultiscaleShapeContext
 from .fpn_net import FPN_Net
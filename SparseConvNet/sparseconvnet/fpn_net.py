@@ -14,9 +14,13 @@ class FPN_Net(torch.nn.Module):
     _show = SHOW_MODEL
     def __init__(self, full_scale, dimension, raw_elements, reps, nPlanesF, nPlaneM, residual_blocks,
                   fpn_scales_from_top, roi_scales_from_top, downsample, rpn_map_sizes,
-                  rpn_3d_2d_selector, leakiness=0, voxel_scale=None, bn_momentum=0.9, track_running_stats=True):
+                  rpn_3d_2d_selector, leakiness=0, voxel_scale=None, bn_momentum=0.9, track_running_stats=True,
+                  checkpoint_mode='none', checkpoint_downs=(), checkpoint_ups=()):
         '''
         downsample:[kernel, stride] :[[2,2,2], [2,2,2]]
+        checkpoint_mode, checkpoint_downs, checkpoint_ups: the stages to
+          recompute in backward instead of keeping the activations (see
+          checkpoint_stages)
         '''
         nn.Module.__init__(self)
 
@@ -40,7 +44,7 @@ class FPN_Net(torch.nn.Module):
         self.layers_in_0 = scn.Sequential(
                 scn.InputLayer(dimension,full_scale, mode=4))
         self.layers_in = scn.Sequential(
-                scn.InputLayer(dimension,full_scale, mode=4),
+                scn.InputLayer(dimension,full_scale, mode=4, device_reduce=True),
                 scn.SubmanifoldConvolution(dimension, in_channels, nPlanesF[0], 3, False))
 
         self.layers_out = scn.Sequential(
@@ -134,11 +138,39 @@ class FPN_Net(torch.nn.Module):
         self.operations_down = operations_down
         self.operations_up = operations_up
 
+        self.build_plan()
+        checkpoint_downs, checkpoint_ups = checkpoint_stages(checkpoint_mode, scale_num,
+                                  checkpoint_downs, checkpoint_ups, self._plan['up_num'])
+        self.checkpoint_downs = set(checkpoint_downs)
+        self.checkpoint_ups = set(checkpoint_ups)
+
+    def build_plan(self):
+      '''
+      Only the levels of ups consumed by rpn_3d_2d_selector and
+      roi_scales_from_top are needed. ups[k+1] is built from the un-merged
+      sum of level k, so m_mergeds[k] is only needed when ups[k+1] is used,
+      and the top-down path can stop at the deepest used level.
+      '''
+      n3d = len(self.fpn_scales_from_top)
+      rpn_sources = []
+      for s in self.rpn_3d_2d_selector:
+        if s < n3d:
+          rpn_sources.append( (self.fpn_scales_from_top[s], -1) )
+        else:
+          rpn_sources.append( (self.fpn_scales_from_top[s-n3d], s-n3d) )
+      used_ups = set([src[0] for src in rpn_sources]) | set(self.roi_scales_from_top)
+      self._plan = {
+        'rpn_sources': rpn_sources,
+        'used_ups': used_ups,
+        'up_num': max(used_ups),
+        # map size check is only for the 3d maps that are really computed
+        'check_sizes': [(i, self.rpn_map_sizes[i]) for i in range(n3d) if self.fpn_scales_from_top[i] in used_ups],
+      }
 
 
 
     def forward(self, net0):
-      if CHECK_NAN:
+      if CHECK_NAN and self.training:
         if not torch.isnan( self.layers_in[1].weight ).sum() == 0:
           self.check_grad_nan()
           import pdb; pdb.set_trace()  # XXX BREAKPOINT
@@ -165,46 +197,54 @@ class FPN_Net(torch.nn.Module):
       print_max_grad(self.m_mergeds , f'm_mergeds')
       pass
 
+    def run_stage(self, m, net, checkpoint):
+      if checkpoint and self.training and torch.is_grad_enabled():
+        return scn.checkpoint_sparse(m, net)
+      return m(net)
+
     def forward_fpn(self, net):
       if self._show:
         print('input sparse format:')
         sparse_shape(net)
 
       scales_num = len(self.m_downs)
+      plan = self._plan
       downs = []
       #if self._show:    print('\ndowns:')
-      for m in self.m_downs:
-        net = m(net)
+      for i, m in enumerate(self.m_downs):
+        net = self.run_stage(m, net, i in self.checkpoint_downs)
         #if self._show:  sparse_shape(net)
         downs.append(net)
 
       net = self.m_shortcuts[-1](net)
+      # ups[i] is None for the levels not consumed by rpn or roi
       ups = [net]
       #if self._show:    print('\nups:')
-      #fpn_scales_from_top_from_back = [scales_num-1-i for i in self.fpn_scales_from_top]
-      #fpn_scales_from_top_from_back.sort()
-      for k in range(scales_num-1):
-        #if k >= max(fpn_scales_from_top_from_back):
-        #  continue
+      for k in range(plan['up_num']):
         j = scales_num-1-k-1
-        net = self.m_ups[k](net)
+        net = self.run_stage(self.m_ups[k], net, k in self.checkpoint_ups)
         #if self._show:  sparse_shape(net)
         shorcut = self.m_shortcuts[j]( downs[j] )
         net = scn.add_feature_planes([ net, shorcut ])
         #net = self.m_ups_decoder[k](net)
         #if self._show:  sparse_shape(net)
-        ups.append(self.m_mergeds[k](net))
-
-      rpn_maps_3d = [ups[i] for i in self.fpn_scales_from_top]
-      rpn_maps_2d = [ self.convs_pro2d[i](rpn_maps_3d[i]) for i in range(len(rpn_maps_3d)) ]
-      rpn_maps = rpn_maps_3d + rpn_maps_2d
-      rpn_maps = [rpn_maps[i] for i in self.rpn_3d_2d_selector]
+        if k+1 in plan['used_ups'] or self._show:
+          ups.append(self.m_mergeds[k](net))
+        else:
+          ups.append(None)
+
+      rpn_maps = []
+      for level, pro2d_i in plan['rpn_sources']:
+        if pro2d_i < 0:
+          rpn_maps.append( ups[level] )
+        else:
+          rpn_maps.append( self.convs_pro2d[pro2d_i](ups[level]) )
 
       roi_maps = [ups[i] for i in self.roi_scales_from_top]
 
-
-      for i in range(len(rpn_maps_3d)):
-        assert torch.all(rpn_maps_3d[i].spatial_size == torch.tensor(self.rpn_map_sizes[i]))
+      if self.training:
+        for i, map_size in plan['check_sizes']:
+          assert torch.all(ups[self.fpn_scales_from_top[i]].spatial_size == torch.tensor(map_size))
 
       if self._show:
             receptive_field(self.operations_down, self.voxel_scale)
@@ -265,6 +305,38 @@ class FPN_Net(torch.nn.Module):
       return rpn_maps, roi_maps
 
 
+def checkpoint_stages(mode, scale_num, downs=(), ups=(), up_num=None):
+  '''
+  Activation checkpointing presets, from less memory saving to more.
+  m_downs[0] and the last run up stage work on the finest scale, which have
+  most active sites.
+    'none':   keep all activations
+    'fine':   the two finest down stages and the finest run up stage
+    'downs':  all down stages
+    'all':    all down and run up stages
+    'custom': downs and ups as given
+  up_num: number of m_ups run, plan['up_num'] of FPN_Net.build_plan (the
+    top-down path stops at the deepest level used by rpn and roi), default
+    all scale_num - 1
+  Returns: (ids of m_downs, ids of m_ups)
+  '''
+  if up_num is None:
+    up_num = scale_num - 1
+  if mode == 'none':
+    return [], []
+  elif mode == 'fine':
+    return [0, 1], [up_num-1] if up_num > 0 else []
+  elif mode == 'downs':
+    return list(range(scale_num)), []
+  elif mode == 'all':
+    return list(range(scale_num)), list(range(up_num))
+  elif mode == 'custom':
+    assert all([0 <= i < scale_num for i in downs]), downs
+    assert all([0 <= i < scale_num - 1 for i in ups]), ups
+    return list(downs), list(ups)
+  else:
+    raise NotImplementedError(mode)
+
 def receptive_field(operations, voxel_scale = None):
   '''
   https://medium.com/mlreview/a-guide-to-receptive-field-arithmetic-for-convolutional-neural-networks-e0f514068807
@@ -35,14 +35,21 @@ class InputLayer(Module):
     mode == 3 to sum feature vectors sharing one spatial location
     mode == 4 to average feature vectors at each spatial location
 
+    device_reduce: for mode 3 and 4, merge the duplicates with tensor ops on
+    the device of the features (GPU when available) before building the
+    metadata, so only the unique coordinates go to the CPU hash. The output is
+    the same, but an OutputLayer then maps back to the unique locations, not
+    to the input points.
+
     Output is a SparseConvNetTensor
     """
-    def __init__(self, dimension, spatial_size, mode=3):
+    def __init__(self, dimension, spatial_size, mode=3, device_reduce=False):
         Module.__init__(self)
         self.dimension = dimension
         self.spatial_size = toLongTensor(dimension, spatial_size)
         self.mode = mode
         self.device = None
+        self.device_reduce = device_reduce
 
     def to(self, device):
         self.device=device
@@ -53,18 +60,58 @@ class InputLayer(Module):
             metadata=Metadata(
                 self.dimension),
             spatial_size=self.spatial_size)
+        coords = input[0]
+        features = input[1].to(self.device) if self.device else input[1]
+        mode = self.mode
+        if self.device_reduce and mode in (3, 4):
+            coords, features = reduce_duplicate_locations(
+                coords.to(features.device), features, self.spatial_size, mode)
+            mode = 0
         output.features = InputLayerFunction.apply(
             self.dimension,
             output.metadata,
             self.spatial_size,
-            input[0].cpu().long(),
-            input[1].to(self.device) if self.device else input[1],
+            coords.cpu().long(),
+            features,
             0 if len(input) == 2 else input[2],
-            self.mode
+            mode
         )
         return output
 
 
+def reduce_duplicate_locations(coords, features, spatial_size, mode):
+    """
+    Sum (mode 3) or average (mode 4) the feature vectors sharing one spatial
+    location. Each location (with the batch index, if coords has it as the
+    last column) is packed into one int64 key, so a 1d unique on the device
+    of coords replaces the per point hash lookups.
+    Returns the unique coords (same columns as coords) and their features.
+    """
+    spatial_size = [int(s) for s in spatial_size]
+    dimension = len(spatial_size)
+    with torch.no_grad():
+        coords = coords.long()
+        if coords.shape[1] == dimension + 1:
+            key = coords[:, dimension].clone()
+        else:
+            key = coords.new_zeros(coords.shape[0])
+        for d in range(dimension):
+            key = key * spatial_size[d] + coords[:, d]
+        key, inverse, counts = torch.unique(
+            key, sorted=True, return_inverse=True, return_counts=True)
+        coords_unique = coords.new_empty(key.shape[0], coords.shape[1])
+        for d in reversed(range(dimension)):
+            coords_unique[:, d] = key % spatial_size[d]
+            key = key // spatial_size[d]
+        if coords.shape[1] == dimension + 1:
+            coords_unique[:, dimension] = key
+    inverse = inverse.to(features.device)
+    features_unique = features.new_zeros(coords_unique.shape[0], features.shape[1]).index_add(0, inverse, features)
+    if mode == 4:
+        features_unique = features_unique / counts.to(features.device).view(-1, 1).type_as(features)
+    return coords_unique, features_unique
+
+
 class OutputLayer(Module):
     """
     Used in conjunction with an InputLayer for 'autoencoder' style networks
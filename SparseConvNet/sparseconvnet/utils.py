@@ -212,7 +212,7 @@ class checkpointFunction(torch.autograd.Function):
         ctx.x_metadata=x_metadata
         with torch.no_grad():
             y = run_function(
-                scn.SparseConvNetTensor
+                SparseConvNetTensor
                 (x_features, x_metadata, x_spatial_size))
         return y.features
     @staticmethod
@@ -222,7 +222,7 @@ class checkpointFunction(torch.autograd.Function):
         x_features.requires_grad = True
         with torch.enable_grad():
             y = ctx.run_function(
-                scn.SparseConvNetTensor
+                SparseConvNetTensor
                 (x_features, ctx.x_metadata, x_spatial_size))
         torch.autograd.backward(y.features, grad_y_features,retain_graph=False)
         return None, x_features.grad, None, None
@@ -230,7 +230,32 @@ class checkpointFunction(torch.autograd.Function):
 def checkpoint101(run_function, x, down=1):
     f=checkpointFunction.apply(run_function, x.features, x.metadata, x.spatial_size)
     s=x.spatial_size//down
-    return scn.SparseConvNetTensor(f, x.metadata, s)
+    return SparseConvNetTensor(f, x.metadata, s)
+
+def checkpoint_sparse(module, x):
+    """
+    Checkpoint any sparse module: the output spatial size is taken from the
+    forward pass, and the batch norm running stats are not updated a second
+    time while recomputing in backward. The metadata object is shared, so the
+    rulebooks built in forward are reused by the recomputation.
+    """
+    out = {}
+    def run_function(t):
+        if not torch.is_grad_enabled():
+            y = module(t)
+            out['spatial_size'] = y.spatial_size
+            return y
+        bns = [m for m in module.modules() if hasattr(m, 'running_mean') and hasattr(m, 'momentum')]
+        momentums = [m.momentum for m in bns]
+        for m in bns:
+            m.momentum = 1
+        try:
+            return module(t)
+        finally:
+            for m, mo in zip(bns, momentums):
+                m.momentum = mo
+    f=checkpointFunction.apply(run_function, x.features, x.metadata, x.spatial_size)
+    return SparseConvNetTensor(f, x.metadata, out['spatial_size'])
 
 def matplotlib_cubes(ax, positions,colors):
     from mpl_toolkits.mplot3d import Axes3D
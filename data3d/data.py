@@ -7,10 +7,26 @@
 
 import torch, numpy as np, glob, math, torch.utils.data, scipy.ndimage, multiprocessing as mp
 from .suncg_utils.suncg_dataset import SUNCGDataset
+from maskrcnn_benchmark.data.samplers import SizeBalancedBatchSampler
 import logging
 
 DEBUG = True
 
+def trainMerge(data_ls):
+  locs = torch.cat( [data['x'][0] for data in data_ls], 0 )
+  pns = [data['x'][0].shape[0] for data in data_ls]
+  batch_size = len(data_ls)
+  batch_ids = torch.cat([torch.LongTensor(pns[i],1).fill_(i) for i in range(batch_size)], 0)
+  locs = torch.cat([locs, batch_ids], 1)
+
+  feats = torch.cat( [data['x'][1] for data in data_ls], 0 )
+  labels = [data['y'] for data in data_ls]
+  ids = [data['id'] for data in data_ls]
+  fns = [data['fn'] for data in data_ls]
+  data = {'x': [locs,feats], 'y': labels, 'id': ids, 'fn': fns}
+  return data
+
+
 def make_data_loader(cfg, is_train, is_distributed=False, start_iter=0):
   batch_size = cfg.SOLVER.IMS_PER_BATCH if is_train else cfg.TEST.IMS_PER_BATCH
 
@@ -20,22 +36,17 @@ def make_data_loader(cfg, is_train, is_distributed=False, start_iter=0):
   logger = logging.getLogger("maskrcnn_benchmark.input")
   logger.info(f'\n\nexample num: {len(dataset_)}\n')
 
-  def trainMerge(data_ls):
-    locs = torch.cat( [data['x'][0] for data in data_ls], 0 )
-    pns = [data['x'][0].shape[0] for data in data_ls]
-    batch_size = len(data_ls)
-    batch_ids = torch.cat([torch.LongTensor(pns[i],1).fill_(i) for i in range(batch_size)], 0)
-    locs = torch.cat([locs, batch_ids], 1)
-
-    feats = torch.cat( [data['x'][1] for data in data_ls], 0 )
-    labels = [data['y'] for data in data_ls]
-    ids = [data['id'] for data in data_ls]
-    fns = [data['fn'] for data in data_ls]
-    data = {'x': [locs,feats], 'y': labels, 'id': ids, 'fn': fns}
-    return data
-
-  data__loader = torch.utils.data.DataLoader(
-      dataset_, batch_size=batch_size, collate_fn=trainMerge, num_workers=10*(1-DEBUG), shuffle=is_train)
+  if is_distributed or cfg.DATALOADER.SIZE_BALANCED:
+    batch_sampler = SizeBalancedBatchSampler(dataset_.get_points_nums(), batch_size,
+                      shuffle=is_train, bucket_steps=cfg.DATALOADER.BUCKET_STEPS)
+    stats = batch_sampler.balance_stats()
+    rank_sizes = ' '.join([f'{s/1e6:.1f}' for s in stats['rank_sizes']])
+    logger.info(f'points per rank (M): {rank_sizes}  step imbalance: {stats["imbalance"]:.3f}')
+    data__loader = torch.utils.data.DataLoader(
+        dataset_, batch_sampler=batch_sampler, collate_fn=trainMerge, num_workers=10*(1-DEBUG))
+  else:
+    data__loader = torch.utils.data.DataLoader(
+        dataset_, batch_size=batch_size, collate_fn=trainMerge, num_workers=10*(1-DEBUG), shuffle=is_train)
 
 
   return data__loader
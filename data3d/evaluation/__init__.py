@@ -1,17 +1,21 @@
-from .suncg import suncg_evaluation
+from .suncg import suncg_evaluation, SuncgOnlineEval
+from .prediction_store import PredictionStore, PredictionStoreWriter
 
 
-def evaluate(dataset, predictions, iou_thresh_eval,  output_folder, epoch, is_train, eval_aug_thickness, **kwargs):
+def evaluate(dataset, predictions, iou_thresh_eval,  output_folder, epoch, is_train, eval_aug_thickness, data_ids=None, **kwargs):
     """evaluate dataset using different methods based on dataset type.
     Args:
         dataset: Dataset object
-        predictions(list[BoxList]): each item in the list represents the
+        predictions(list[BoxList] or PredictionStore): each item in the list represents the
             prediction results for one image.
         output_folder: output folder, to save evaluation files or results.
+        data_ids: for PredictionStore, only read and evaluate these scenes
         **kwargs: other args.
     Returns:
         evaluation result
     """
+    if isinstance(predictions, PredictionStore):
+        predictions = predictions.boxlists(data_ids)
 
     args = dict(
         dataset=dataset, predictions=predictions, iou_thresh_eval=iou_thresh_eval, output_folder=output_folder, epoch=epoch, is_train=is_train, eval_aug_thickness=eval_aug_thickness, **kwargs
@@ -0,0 +1,195 @@
+import os, glob, json, shutil
+import numpy as np
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
+
+'''
+Columnar storage of BoxList3D predictions.
+A store is a directory with one part per writer (rank):
+  part_{r}/bbox3d.bin            [N,7] float32, the boxes of all scenes
+  part_{r}/field_{name}.bin      [N,...] one file per field (scores, labels ...)
+  part_{r}/index.npy             per scene: data_id, start row, box num, size3d
+  part_{r}/class_offsets.npy     [S, C+1] rows of class l in scene s:
+                                 start + class_offsets[s,l] : start + class_offsets[s,l+1]
+  part_{r}/meta.json             mode, field dtypes and shapes
+Boxes of one scene are contiguous and sorted by label, so a scene or a class
+of a scene is one slice of the memory mapped arrays.
+'''
+
+INDEX_DTYPE = np.dtype([('data_id', np.int64), ('start', np.int64), ('num', np.int64),
+                        ('has_size3d', np.bool_), ('size3d', np.float32, (6,))])
+LABEL_FIELD = 'labels'
+
+
+def clear_store(path):
+  '''
+  Remove the parts of a previous run, also the ones of ranks the current
+  run does not have, which the reader would otherwise mix in. To call from
+  one process, before the writers are created.
+  '''
+  for part_path in glob.glob(os.path.join(path, 'part_*')):
+    shutil.rmtree(part_path)
+
+
+class PredictionStoreWriter():
+  def __init__(self, path, part=0):
+    self.path = os.path.join(path, f'part_{part}')
+    if not os.path.exists(self.path):
+      os.makedirs(self.path)
+    for fn in glob.glob(os.path.join(self.path, '*')):
+      os.remove(fn)
+    self.files = {}
+    self.fields = None
+    self.mode = None
+    self.index = []
+    self.row_num = 0
+
+  def _write(self, name, array):
+    if name not in self.files:
+      self.files[name] = open(os.path.join(self.path, f'{name}.bin'), 'ab')
+    self.files[name].write(np.ascontiguousarray(array).tobytes())
+
+  def add(self, boxlist):
+    '''
+    boxlist: BoxList3D of one scene, with constants['data_id']
+    '''
+    n = len(boxlist)
+    if self.fields is None:
+      self.mode = boxlist.mode
+      self.fields = {k: (boxlist.get_field(k).cpu().numpy().dtype.str, list(boxlist.get_field(k).shape[1:]))
+                     for k in boxlist.fields()}
+    order = None
+    if LABEL_FIELD in self.fields:
+      labels = boxlist.get_field(LABEL_FIELD).cpu().numpy()
+      order = np.argsort(labels, kind='stable')
+    def rows(t):
+      a = t.detach().cpu().numpy()
+      return a if order is None else a[order]
+    self._write('bbox3d', rows(boxlist.bbox3d).astype(np.float32))
+    for k, (dtype, _) in self.fields.items():
+      self._write(f'field_{k}', rows(boxlist.get_field(k)).astype(dtype))
+
+    size3d = np.zeros(6, dtype=np.float32)
+    if boxlist.size3d is not None:
+      size3d = boxlist.size3d.cpu().numpy().reshape(6)
+    self.index.append((boxlist.constants['data_id'], self.row_num, n, boxlist.size3d is not None, size3d))
+    self.row_num += n
+
+  def close(self):
+    for f in self.files.values():
+      f.close()
+    self.files = {}
+    index = np.array(self.index, dtype=INDEX_DTYPE)
+    np.save(os.path.join(self.path, 'index.npy'), index)
+    meta = {'mode': self.mode, 'fields': self.fields or {}, 'row_num': self.row_num}
+    with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+      json.dump(meta, f)
+
+    if self.fields is not None and LABEL_FIELD in self.fields:
+      labels = _memmap(self.path, f'field_{LABEL_FIELD}', self.fields[LABEL_FIELD], self.row_num)
+      class_num = int(labels.max()) + 1 if self.row_num > 0 else 1
+      grid = np.arange(class_num + 1)
+      class_offsets = np.stack([np.searchsorted(labels[s:s+n], grid, side='left')
+                                for s, n in zip(index['start'], index['num'])]) if len(index) > 0 \
+                      else np.zeros([0, class_num + 1], dtype=np.int64)
+      np.save(os.path.join(self.path, 'class_offsets.npy'), class_offsets)
+
+
+def _memmap(path, name, dtype_shape, row_num):
+  dtype, shape = dtype_shape
+  fn = os.path.join(path, f'{name}.bin')
+  if row_num == 0 or not os.path.exists(fn):
+    return np.zeros([0] + list(shape), dtype=dtype)
+  return np.memmap(fn, dtype=dtype, mode='r', shape=tuple([row_num] + list(shape)))
+
+
+class PredictionStore():
+  '''
+  Read a prediction store with memory mapped arrays, only the index is loaded.
+  '''
+  def __init__(self, path):
+    self.parts = []
+    self.scenes = {}
+    for pi, part_path in enumerate(sorted(glob.glob(os.path.join(path, 'part_*')))):
+      with open(os.path.join(part_path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+      n = meta['row_num']
+      part = {'meta': meta,
+              'index': np.load(os.path.join(part_path, 'index.npy')),
+              'bbox3d': _memmap(part_path, 'bbox3d', ('<f4', [7]), n),
+              'fields': {k: _memmap(part_path, f'field_{k}', v, n) for k, v in meta['fields'].items()}}
+      co_fn = os.path.join(part_path, 'class_offsets.npy')
+      part['class_offsets'] = np.load(co_fn) if os.path.exists(co_fn) else None
+      self.parts.append(part)
+      for si, data_id in enumerate(part['index']['data_id']):
+        self.scenes[int(data_id)] = (pi, si)
+
+  @staticmethod
+  def exists(path):
+    return len(glob.glob(os.path.join(path, 'part_*', 'meta.json'))) > 0
+
+  def __len__(self):
+    return len(self.scenes)
+
+  def data_ids(self):
+    return sorted(self.scenes.keys())
+
+  def _rows(self, data_id, label=None):
+    pi, si = self.scenes[data_id]
+    part = self.parts[pi]
+    scene = part['index'][si]
+    s, e = scene['start'], scene['start'] + scene['num']
+    if label is not None:
+      co = part['class_offsets']
+      assert co is not None, 'no labels in the store'
+      if label + 1 >= co.shape[1]:
+        return part, scene, s, s
+      s, e = scene['start'] + co[si, label], scene['start'] + co[si, label+1]
+    return part, scene, s, e
+
+  def scene_arrays(self, data_id, label=None):
+    '''
+    numpy arrays (memmap slices) of one scene, or of one class of one scene
+    Returns: dict: bbox3d and every field
+    '''
+    part, _, s, e = self._rows(data_id, label)
+    arrays = {'bbox3d': part['bbox3d'][s:e]}
+    for k, v in part['fields'].items():
+      arrays[k] = v[s:e]
+    return arrays
+
+  def class_arrays(self, label, data_ids=None):
+    '''
+    Predictions of one class over scenes (all by default), concatenated.
+    Returns: dict: bbox3d, every field and data_id of each box
+    '''
+    if data_ids is None:
+      data_ids = self.data_ids()
+    arrays = [self.scene_arrays(i, label) for i in data_ids]
+    res = {k: np.concatenate([a[k] for a in arrays], 0) for k in arrays[0]} if len(arrays) > 0 else {}
+    res['data_id'] = np.concatenate([np.full(len(a['bbox3d']), i, dtype=np.int64)
+                                     for i, a in zip(data_ids, arrays)]) if len(arrays) > 0 else np.zeros(0, np.int64)
+    return res
+
+  def get(self, data_id, labels=None):
+    '''
+    BoxList3D of one scene, only the classes in labels if not None
+    '''
+    part, scene, _, _ = self._rows(data_id)
+    if labels is None:
+      arrays = self.scene_arrays(data_id)
+    else:
+      arrays_l = [self.scene_arrays(data_id, l) for l in labels]
+      arrays = {k: np.concatenate([a[k] for a in arrays_l], 0) for k in arrays_l[0]}
+    size3d = torch.from_numpy(np.array(scene['size3d']).reshape(1, 6)) if scene['has_size3d'] else None
+    boxlist = BoxList3D(torch.from_numpy(np.array(arrays['bbox3d'])), size3d, part['meta']['mode'], None,
+                        {'prediction': True, 'data_id': int(data_id)})
+    for k in part['fields']:
+      boxlist.add_field(k, torch.from_numpy(np.array(arrays[k])))
+    return boxlist
+
+  def boxlists(self, data_ids=None, labels=None):
+    if data_ids is None:
+      data_ids = self.data_ids()
+    return [self.get(i, labels) for i in data_ids]
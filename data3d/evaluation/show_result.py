@@ -1,6 +1,7 @@
 import os, torch
 import numpy as np
 from data3d.evaluation.suncg.suncg_eval import show_pred, draw_recall_precision_score
+from data3d.evaluation.prediction_store import PredictionStore
 
 RES_PATH0 = '/home/z/Research/Detection_3D/RES/res_sw4c_fpn432_bs1_lr5_T6655/inference_3d/paper_suncg_test_1605_iou_3_augth_2'
 RES_PATH1 = '/home/z/Research/Detection_3D/RES/res_CiFl_Fpn21_bs1_lr2_T5223/inference_3d/suncg_test_1309_iou_3_augth_2'
@@ -15,6 +16,18 @@ def show_prediction():
   import pdb; pdb.set_trace()  # XXX BREAKPOINT
   show_pred(gt_boxlists_, pred_boxlists_, files)
 
+def show_stored_predictions(data_ids=None, labels=None, score_threshold=0.5):
+  '''
+  Show the predictions of some scenes / classes, only they are read from the store.
+  '''
+  store = PredictionStore(os.path.join(RES_PATH, 'predictions'))
+  if data_ids is None:
+    data_ids = store.data_ids()[0:5]
+  for data_id in data_ids:
+    preds = store.get(data_id, labels).remove_low('scores', score_threshold)
+    print(f'data_id: {data_id}  {len(preds)} predictions')
+    preds.show()
+
 def show_performance():
   pred_fn = os.path.join(RES_PATH, 'performance_res.pth')
   result = torch.load(pred_fn)
@@ -49,23 +62,30 @@ def show_performance_of_two():
 
 
 def smooth_curve(rec_prec_score_iou_org, iou_threshold=0.3):
+  '''
+  For each recall r: max precision and score of the predictions with recall >= r,
+  and the mean iou of those with iou > iou_threshold.
+  The recall is sorted, so these are suffix max / sums looked up by searchsorted.
+  '''
   new_rpsi = [rec_prec_score_iou_org[0]]
   num_classes = len(rec_prec_score_iou_org)
+  grid = np.arange(0.0, 1.1, 0.002)
   for l in range(1, num_classes):
     rec = rec_prec_score_iou_org[l][:,0]
-    psis = []
-    for r in np.arange(0.0, 1.1, 0.002):
-        if np.sum(rec > r) == 0:
-          psi = np.array([r,0,0,0]).reshape([1,-1])
-        else:
-          tmp = np.nan_to_num( rec_prec_score_iou_org[l][:,1:][ rec >= r ] )
-          psi = tmp.max(0).reshape([1,-1])
-          iou_mask = tmp[:,2] > iou_threshold
-          psi[0,2] = tmp[:,2][iou_mask].mean(0)
-          psi = np.concatenate([np.array(r).reshape([1,1]), psi], 1)
-        pass
-        psis.append(psi)
-    psis = np.concatenate(psis, 0)
+    psi = np.nan_to_num( rec_prec_score_iou_org[l][:,1:] )
+    suffix_max = np.maximum.accumulate(psi[::-1], 0)[::-1]
+    iou_mask = psi[:,2] > iou_threshold
+    iou_sum = np.cumsum((psi[:,2] * iou_mask)[::-1])[::-1]
+    iou_num = np.cumsum(iou_mask[::-1])[::-1]
+
+    i = np.searchsorted(rec, grid, side='left')
+    valid = (rec[-1] > grid) if len(rec) > 0 else np.zeros(grid.shape, dtype=np.bool)
+    iv = i[valid]
+    psis = np.zeros([grid.shape[0], 4])
+    psis[:,0] = grid
+    psis[valid,1:] = suffix_max[iv]
+    with np.errstate(invalid='ignore', divide='ignore'):
+      psis[valid,3] = iou_sum[iv] / iou_num[iv]
     new_rpsi.append(psis)
   return new_rpsi
 
@@ -1,9 +1,10 @@
 import logging
 
 from .suncg_eval import do_suncg_evaluation
+from .online_eval import SuncgOnlineEval
 
 
-def suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, box_only, epoch=None, is_train=None, eval_aug_thickness=None, **_):
+def suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, box_only, epoch=None, is_train=None, eval_aug_thickness=None, eval_sweep=None, **_):
     logger = logging.getLogger("maskrcnn_benchmark.inference")
     if box_only:
         logger.warning("evaluation with box_only / RPN_Only")
@@ -16,5 +17,6 @@ def suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, box_o
         logger=logger,
         epoch=epoch,
         is_train = is_train,
-        eval_aug_thickness = eval_aug_thickness
+        eval_aug_thickness = eval_aug_thickness,
+        eval_sweep = eval_sweep,
     )
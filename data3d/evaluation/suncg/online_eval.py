@@ -0,0 +1,96 @@
+import os
+import random
+import numpy as np
+import torch
+
+from .suncg_eval import calc_detection_suncg_ious, calc_detection_suncg_prec_rec, calc_detection_suncg_ap
+
+
+class SuncgOnlineEval():
+  '''
+  Accumulate the evaluation of training batches without keeping the
+  predictions. Each scene is reduced to the per class matching records of
+  calc_detection_suncg_ious right away (scores, max iou and matched gt index
+  of each prediction, gt number), so no gt is reloaded at the end of epoch.
+  At most max_scenes records are kept, reservoir sampled over all scenes.
+  The batches are kept on their device and reduced every flush_period
+  updates, so that the copy to the host and the ious run once per period.
+  '''
+  def __init__(self, dset_metas, iou_thresh, eval_aug_thickness, max_scenes=500, flush_period=1):
+    self.dset_metas = dset_metas
+    self.iou_thresh = iou_thresh
+    self.eval_aug_thickness = eval_aug_thickness
+    self.max_scenes = max_scenes
+    self.flush_period = flush_period
+    self.reset()
+
+  def reset(self):
+    self.records = []
+    self.scene_num = 0
+    self.pending_preds = []
+    self.pending_gts = []
+    self.pending_num = 0
+
+  def update(self, pred_boxlists, gt_boxlists):
+    self.pending_preds += list(pred_boxlists)
+    self.pending_gts += list(gt_boxlists)
+    self.pending_num += 1
+    if self.pending_num >= self.flush_period:
+      self.flush()
+
+  def flush(self):
+    if len(self.pending_preds) == 0:
+      return
+    cpu_device = torch.device('cpu')
+    pred_boxlists = [p.to(cpu_device) for p in self.pending_preds]
+    gt_boxlists = [g.to(cpu_device) for g in self.pending_gts]
+    self.pending_preds = []
+    self.pending_gts = []
+    self.pending_num = 0
+    records = calc_detection_suncg_ious(gt_boxlists, pred_boxlists, self.dset_metas, self.eval_aug_thickness)
+    for rec in records:
+      self.scene_num += 1
+      if len(self.records) < self.max_scenes:
+        self.records.append(rec)
+      else:
+        j = random.randrange(self.scene_num)
+        if j < self.max_scenes:
+          self.records[j] = rec
+
+  def summary(self):
+    '''
+    Returns:
+      dict: ap and max recall of each class, map; None if no gt and pred
+    '''
+    self.flush()
+    if sum([len(r) for r in self.records]) == 0:
+      return None
+    prec, rec, _, scores, predious = calc_detection_suncg_prec_rec(
+      None, None, self.iou_thresh, self.dset_metas, self.eval_aug_thickness,
+      ious=self.records, with_pred_for_each_gt=False)
+    ap, _ = calc_detection_suncg_ap(prec, rec, scores, predious, use_07_metric=True)
+    recall = np.array([np.nan if r is None or len(r)==0 else r[-1] for r in rec])
+    return {'ap': ap, 'recall': recall, 'map': np.nanmean(ap[1:]),
+            'scene_num': self.scene_num, 'scene_num_eval': len(self.records)}
+
+  def summary_str(self, summary=None):
+    if summary is None:
+      summary = self.summary()
+    if summary is None:
+      return '\nno gt and predictions to evaluate\n'
+    result_str = f"\nscenes: {summary['scene_num_eval']} / {summary['scene_num']}" + \
+                 f"  iou_thresh: {self.iou_thresh}  mAP: {summary['map']:.4f}\n"
+    result_str += '|{:^10}|{:^8}|{:^8}|\n'.format('class', 'ap', 'recall')
+    for l in range(1, len(summary['ap'])):
+      if np.isnan(summary['ap'][l]):
+        continue
+      clsn = self.dset_metas.label_2_class[l]
+      result_str += '|{:^10}|{:^8.3f}|{:^8.3f}|\n'.format(clsn, summary['ap'][l], summary['recall'][l])
+    return result_str
+
+  def save(self, output_folder, epoch):
+    result_str = f'\nepoch: {epoch}' + self.summary_str()
+    res_fn = os.path.join(output_folder, 'train_eval_result.txt')
+    with open(res_fn, 'a') as fid:
+      fid.write(result_str)
+    return result_str
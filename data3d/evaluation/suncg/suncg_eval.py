@@ -42,7 +42,13 @@ def get_obj_nums(gt_boxlists, dset_metas):
             obj_gt_cum_nums[obj].append( sum(labels<l) )
     return obj_gt_nums, obj_gt_cum_nums
 
-def do_suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, logger, epoch=None, is_train=None, eval_aug_thickness=None, score_threshold=0.7):
+def do_suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, logger, epoch=None, is_train=None, eval_aug_thickness=None, score_threshold=0.7, eval_sweep=None):
+    '''
+    eval_sweep: if set, dict(iou_threshs, eval_aug_thicknesses) of
+        do_suncg_evaluation_sweep, run in the same pass: the ground truth and
+        the ious of eval_aug_thickness are shared, and iou_thresh_eval /
+        eval_aug_thickness are points of the sweep
+    '''
     # TODO need to make the use_07_metric format available
     # for the user to choose
     logger.info(f'\n\nis_train: {is_train}\n')
@@ -77,6 +83,7 @@ def do_suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, lo
         print(f'\ngt_num_totally=0, abort evalution\n')
         return
 
+    ious = calc_detection_suncg_ious(gt_boxlists, pred_boxlists, dset_metas, eval_aug_thickness)
     result = eval_detection_suncg(
         pred_boxlists=pred_boxlists,
         gt_boxlists=gt_boxlists,
@@ -85,7 +92,18 @@ def do_suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, lo
         use_07_metric=True,
         eval_aug_thickness=eval_aug_thickness,
         score_threshold = score_threshold,
+        ious=ious,
     )
+    if eval_sweep is not None:
+        iou_threshs = list(eval_sweep['iou_threshs'])
+        eval_aug_thicknesses = list(eval_sweep['eval_aug_thicknesses'])
+        if iou_thresh_eval not in iou_threshs:
+            iou_threshs.insert(0, iou_thresh_eval)
+        if eval_aug_thickness is not None and eval_aug_thickness not in eval_aug_thicknesses:
+            eval_aug_thicknesses.insert(0, eval_aug_thickness)
+        do_suncg_evaluation_sweep(dataset, predictions, iou_threshs, eval_aug_thicknesses, output_folder, logger,
+                                  epoch=epoch, gt_boxlists=gt_boxlists,
+                                  cached=[(eval_aug_thickness, ious, {iou_thresh_eval: result['ap']})])
 
     obj_gt_nums, obj_gt_cum_nums = get_obj_nums(gt_boxlists, dset_metas)
     if len(result['pred_for_each_gt']) == 0:
@@ -125,6 +143,73 @@ def do_suncg_evaluation(dataset, predictions, iou_thresh_eval, output_folder, lo
     save_perform_res(result, output_folder)
     return result
 
+def do_suncg_evaluation_sweep(dataset, predictions, iou_threshs, eval_aug_thicknesses, output_folder, logger, epoch=None,
+                              gt_boxlists=None, cached=()):
+    """Evaluate the same predictions with several iou thresholds and aug thickness settings.
+    The ground truth is loaded once, the ious are computed once per aug thickness
+    setting and reused for every iou threshold. One table is written for all.
+    Args:
+        iou_threshs: list of iou thresholds
+        eval_aug_thicknesses: list of eval_aug_thickness dicts
+        gt_boxlists: the ground truth of the predictions, loaded if None
+        cached: list of (eval_aug_thickness, ious, {iou_thresh: ap}) already
+            computed, e.g. by do_suncg_evaluation
+    Returns:
+        list of dict: {'iou_thresh', 'aug_thickness', 'ap', 'map'}
+    """
+    if sum([len(p) for p in predictions]) == 0:
+      print('\n\n\tno predictions to evaluate\n\n')
+      return
+
+    dset_metas = dataset.dset_metas
+    if gt_boxlists is None:
+        gt_boxlists = [dataset.get_groundtruth(p.constants['data_id']) for p in predictions]
+    if sum([len(g) for g in gt_boxlists]) == 0:
+        print(f'\ngt_num_totally=0, abort evalution\n')
+        return
+
+    sweep = []
+    for eval_aug_thickness in eval_aug_thicknesses:
+        ious, aps = None, {}
+        for thickness, ious_c, aps_c in cached:
+            if thickness == eval_aug_thickness:
+                ious, aps = ious_c, aps_c
+        if ious is None:
+            ious = calc_detection_suncg_ious(gt_boxlists, predictions, dset_metas, eval_aug_thickness)
+        for iou_thresh in iou_threshs:
+            if iou_thresh in aps:
+                ap = aps[iou_thresh]
+            else:
+                prec, rec, _, scores, predious = calc_detection_suncg_prec_rec(
+                    gt_boxlists, predictions, iou_thresh, dset_metas, eval_aug_thickness,
+                    ious=ious, with_pred_for_each_gt=False)
+                ap, _ = calc_detection_suncg_ap(prec, rec, scores, predious, use_07_metric=True)
+            sweep.append({'iou_thresh': iou_thresh, 'aug_thickness': eval_aug_thickness['target_Y'],
+                          'ap': ap, 'map': np.nanmean(ap[1:])})
+
+    result_str = sweep_str(sweep, dset_metas)
+    logger.info(result_str)
+    if output_folder:
+        dn = len(predictions)
+        if epoch is not None:
+          result_str = f'\nepoch: {epoch}\ndata number: {dn}\n' +  result_str
+        res_fn = os.path.join(output_folder, f"sweep_result_{dn}.txt")
+        with open(res_fn, "a") as fid:
+            fid.write(result_str)
+            print('write ok:\n' + res_fn + '\n')
+    return sweep
+
+def sweep_str(sweep, dset_metas):
+    labels = [l for l in range(1, len(sweep[0]['ap'])) if not np.isnan(sweep[0]['ap'][l]) ]
+    class_names = [dset_metas.label_2_class[l] for l in labels]
+    result_str = '\n|{:^8}|{:^8}|{:^8}|'.format('iou', 'aug_th', 'mean') + \
+        ''.join(['{:^10}|'.format(c) for c in class_names]) + '\n'
+    for r in sweep:
+        result_str += '|{:^8.2f}|{:^8.2f}|{:^8.3f}|'.format(r['iou_thresh'], r['aug_thickness'], r['map'])
+        result_str += ''.join(['{:^10.3f}|'.format(r['ap'][l]) if l < len(r['ap']) else '{:^10}|'.format('-')
+                               for l in labels]) + '\n'
+    return result_str
+
 def save_preds(gt_boxlists_, pred_boxlists_, files, output_folder):
   if len(gt_boxlists_) > 10:
     return
@@ -577,10 +662,18 @@ def regression_res_str(regression_res):
     return reg_str
 
 def draw_recall_precision_score(result, output_folder, flag='', smoothed=False):
-    if flag != '10steps':
-      rec_prec_sco_iou_list = result['rec_prec_score_iou_org']
-    else:
+    '''
+    flag: '': the precision envelope on RECALL_CURVE_POINTS if available
+          'org': all the predictions
+          '10steps': the 11 points of the AP
+    '''
+    if flag == '10steps':
       rec_prec_sco_iou_list = result['recall_precision_score_iou_10steps']
+    elif flag == '' and 'recall_precision_score_iou_curve' in result:
+      rec_prec_sco_iou_list = result['recall_precision_score_iou_curve']
+      smoothed = True
+    else:
+      rec_prec_sco_iou_list = result['rec_prec_score_iou_org']
     label_2_class = result['label_2_class']
 
     num_classes = len(rec_prec_sco_iou_list)
@@ -711,13 +804,14 @@ def rm_bad_head(rp):
 #        obj_nums[dset_metas.label_2_class[l]] = sum(labels==l)
 #    return obj_nums
 
-def eval_detection_suncg(pred_boxlists, gt_boxlists, iou_thresh, dset_metas, use_07_metric=False, eval_aug_thickness=None, score_threshold=0.5):
+def eval_detection_suncg(pred_boxlists, gt_boxlists, iou_thresh, dset_metas, use_07_metric=False, eval_aug_thickness=None, score_threshold=0.5, ious=None):
     """Evaluate on suncg dataset.
     Args:
         pred_boxlists(list[BoxList3D]): pred boxlist, has labels and scores fields.
         gt_boxlists(list[BoxList3D]): ground truth boxlist, has labels field.
         iou_thresh: iou thresh
         use_07_metric: boolean
+        ious: cached output of calc_detection_suncg_ious for eval_aug_thickness
     Returns:
         dict represents the results
     """
@@ -725,7 +819,7 @@ def eval_detection_suncg(pred_boxlists, gt_boxlists, iou_thresh, dset_metas, use
         pred_boxlists
     ), "Length of gt and pred lists need to be same."
     prec, rec, pred_for_each_gt, scores, predious = calc_detection_suncg_prec_rec(
-        pred_boxlists=pred_boxlists, gt_boxlists=gt_boxlists, iou_thresh=iou_thresh, dset_metas=dset_metas, eval_aug_thickness=eval_aug_thickness
+        pred_boxlists=pred_boxlists, gt_boxlists=gt_boxlists, iou_thresh=iou_thresh, dset_metas=dset_metas, eval_aug_thickness=eval_aug_thickness, ious=ious
     )
     #mious = cal_mious(rec, predious, iou_thresh, dset_metas)
     rec_prec_score_iou_org = [np.concatenate([np.array(r).reshape([-1,1]), np.array(p).reshape([-1,1]), np.array(s).reshape([-1,1]), np.array(u).reshape([-1,1])],1) \
@@ -733,26 +827,79 @@ def eval_detection_suncg(pred_boxlists, gt_boxlists, iou_thresh, dset_metas, use
     pr_score_th5 = pr_of_score_threshold(prec, rec, scores, 0.5)
     pr_score_th7 = pr_of_score_threshold(prec, rec, scores, 0.7)
     ap, recall_precision_score_iou_10steps = calc_detection_suncg_ap(prec, rec, scores, predious, use_07_metric=use_07_metric)
+    recall_precision_score_iou_curve = recall_curves(prec, rec, scores, predious)
     return {"ap": ap, "map": np.nanmean(ap), "rec_prec_score_iou_org":rec_prec_score_iou_org, "recall_precision_score_iou_10steps":recall_precision_score_iou_10steps,
+            "recall_precision_score_iou_curve": recall_precision_score_iou_curve,
             "pred_for_each_gt":pred_for_each_gt, 'pr_score_th5': pr_score_th5, 'pr_score_th7': pr_score_th7 }
 
 def pr_of_score_threshold(prec, rec, scores, score_threshold):
     pr_score_th = [[np.nan, np.nan]]
     n = len(prec)
     for i in range(1,n):
-      k = np.sum(scores[i] > score_threshold) - 1
+      # scores are sorted descendingly: number of scores > score_threshold - 1
+      k = np.searchsorted(-scores[i], -score_threshold, side='left') - 1
       pr_score_th.append( [prec[i][k], rec[i][k]] )
     pr_score_th = np.array(pr_score_th)
     pr_score_th[0,:] = pr_score_th[1:,:].mean(0)
     return pr_score_th
 
-def calc_detection_suncg_prec_rec(gt_boxlists, pred_boxlists, iou_thresh, dset_metas, eval_aug_thickness):
+def calc_detection_suncg_ious(gt_boxlists, pred_boxlists, dset_metas, eval_aug_thickness):
+    """Compute the iou part of the matching once, it does not depend on the iou threshold.
+    For each scene and each label l, the predictions of l are sorted by score and
+    matched to the gt of l with max iou.
+    Returns:
+        list (one per scene) of dict: label -> {'pred_ids', 'scores', 'n_gt', 'gt_index', 'max_iou'}
+          pred_ids: index of the sorted predictions in the prediction boxlist
+          gt_index: gt index (inside the gts of l) with max iou for each pred, None if no gt
+          max_iou: the max iou for each pred
+    """
+    ious = []
+    for gt_boxlist, pred_boxlist in zip(gt_boxlists, pred_boxlists):
+        pred_bbox = pred_boxlist.bbox3d.numpy()
+        pred_label = pred_boxlist.get_field("labels").numpy()
+        pred_score = pred_boxlist.get_field("scores").numpy()
+        gt_bbox = gt_boxlist.bbox3d.numpy()
+        gt_label = gt_boxlist.get_field("labels").numpy()
+
+        ious_scene = {}
+        for l in np.unique(np.concatenate((pred_label, gt_label)).astype(int)):
+            pred_ids_l = np.where(pred_label == l)[0]
+            # sort by score
+            order = pred_score[pred_ids_l].argsort()[::-1]
+            pred_ids_l = pred_ids_l[order]
+            pred_bbox_l = pred_bbox[pred_ids_l]
+            # Extract gt only of current class, thus gt_index is the index
+            # inside of one signle class gts, not of all gts
+            # TAG: GT_MASK
+            gt_bbox_l = gt_bbox[gt_label == l]
+            rec = {'pred_ids': pred_ids_l, 'scores': pred_score[pred_ids_l],
+                   'n_gt': gt_bbox_l.shape[0], 'gt_index': None,
+                   'max_iou': np.zeros(pred_ids_l.shape[0])}
+            if len(pred_bbox_l) > 0 and len(gt_bbox_l) > 0:
+                iou = boxlist_iou_3d(
+                    BoxList3D(gt_bbox_l.copy(), gt_boxlist.size3d, gt_boxlist.mode, None, gt_boxlist.constants),
+                    BoxList3D(pred_bbox_l.copy(), pred_boxlist.size3d, pred_boxlist.mode, None, pred_boxlist.constants),
+                    aug_thickness = eval_aug_thickness,
+                    criterion = -1,
+                    flag='eval'
+                ).numpy()   # [gt_nm,pred_num]
+                rec['gt_index'] = iou.argmax(axis=0) # the gt index for each predicion
+                rec['max_iou'] = iou.max(axis=0)
+            ious_scene[l] = rec
+        ious.append(ious_scene)
+    return ious
+
+def calc_detection_suncg_prec_rec(gt_boxlists, pred_boxlists, iou_thresh, dset_metas, eval_aug_thickness, ious=None, with_pred_for_each_gt=True):
     """Calculate precision and recall based on evaluation code of PASCAL VOC.
     This function calculates precision and recall of
     predicted bounding boxes obtained from a dataset which has :math:`N`
     images.
     The code is based on the evaluation code used in PASCAL VOC Challenge.
+    ious: output of calc_detection_suncg_ious, computed if None. Pass it to
+        evaluate several iou_thresh with the same eval_aug_thickness.
    """
+    if ious is None:
+        ious = calc_detection_suncg_ious(gt_boxlists, pred_boxlists, dset_metas, eval_aug_thickness)
     n_pos = defaultdict(int)
     score = defaultdict(list)
     # The pred having maximum iou with a gt is matched with the gt.
@@ -763,89 +910,53 @@ def calc_detection_suncg_prec_rec(gt_boxlists, pred_boxlists, iou_thresh, dset_m
     predious = defaultdict(list)
 
     pred_for_each_gt = defaultdict(list)
-    batch_size = len(gt_boxlists)
+    batch_size = len(ious)
 
-    bi = -1
-    for gt_boxlist, pred_boxlist in zip(gt_boxlists, pred_boxlists):
-        bi += 1
-        pred_bbox = pred_boxlist.bbox3d.numpy()
-        pred_label = pred_boxlist.get_field("labels").numpy()
-        pred_score = pred_boxlist.get_field("scores").numpy()
-        gt_bbox = gt_boxlist.bbox3d.numpy()
-        gt_label = gt_boxlist.get_field("labels").numpy()
-
-        for l in np.unique(np.concatenate((pred_label, gt_label)).astype(int)):
+    for bi, ious_scene in enumerate(ious):
+        for l, rec in ious_scene.items():
             obj_name = dset_metas.label_2_class[l]
-            pred_mask_l = pred_label == l
-            pred_ids_l = np.where(pred_mask_l)[0]
-            pred_bbox_l = pred_bbox[pred_mask_l]
-            pred_score_l = pred_score[pred_mask_l]
-            # sort by score
-            order = pred_score_l.argsort()[::-1]
-            pred_bbox_l = pred_bbox_l[order]
-            pred_score_l = pred_score_l[order]
-
-            gt_mask_l = gt_label == l
-            # Extract gt only of current class, thus gt_index is the index
-            # inside of one signle class gts, not of all gts
-            # TAG: GT_MASK
-            gt_bbox_l = gt_bbox[gt_mask_l]
-
-            n_pos[l] += gt_bbox_l.shape[0]
+            pred_score_l = rec['scores']
+            n_pos[l] += rec['n_gt']
             score[l].extend(pred_score_l)
 
-            if len(pred_bbox_l) == 0:
+            pn = pred_score_l.shape[0]
+            if pn == 0:
                 continue
-            if len(gt_bbox_l) == 0:
-                match[l].extend((0,) * pred_bbox_l.shape[0])
-                predious[l].extend((0,) * pred_bbox_l.shape[0])
+            if rec['gt_index'] is None:
+                match[l].extend((0,) * pn)
+                predious[l].extend((0,) * pn)
                 continue
 
-            pred_bbox_l = pred_bbox_l.copy()
-            gt_bbox_l = gt_bbox_l.copy()
-            iou = boxlist_iou_3d(
-                BoxList3D(gt_bbox_l, gt_boxlist.size3d, gt_boxlist.mode, None, gt_boxlist.constants),
-                BoxList3D(pred_bbox_l, pred_boxlist.size3d, pred_boxlist.mode, None, pred_boxlist.constants),
-                aug_thickness = eval_aug_thickness,
-                criterion = -1,
-                flag='eval'
-            ).numpy()   # [gt_nm,pred_num]
-
-            gt_index = iou.argmax(axis=0) # the gt index for each predicion
+            gt_index = rec['gt_index'].copy()
+            max_iou = rec['max_iou']
             # set -1 if there is no matching ground truth
-            gt_index[iou.max(axis=0) < iou_thresh] = -1
-            pred_for_each_gt_l = defaultdict(list)
-            neg_count =  0
-            for pi in range(gt_index.shape[0]):
-                pis = {'pred_idx': pred_ids_l[pi], 'iou':iou[gt_index[pi], pi], 'score':score[l][pi]}
-                gt_idx = gt_index[pi]
-                if gt_idx<0:
-                    neg_count += 1
-                    gt_idx -= (gt_idx==-1) * neg_count
-                pred_for_each_gt_l[gt_idx].append(pis)
-
-            if obj_name not in pred_for_each_gt:
-                for iii in range(batch_size):
-                    pred_for_each_gt[obj_name].append(defaultdict(list))
-            pred_for_each_gt[obj_name][bi] = pred_for_each_gt_l
-
-            predious[l].extend( iou.max(0) )
-
-            selec = np.zeros(gt_bbox_l.shape[0], dtype=bool)
-            for gt_idx in gt_index:
-                if gt_idx >= 0:
-                    if not selec[gt_idx]:
-                        # gt_index is already sorted by scores,
-                        # thus the first pred match a gt box is set 1
-                        match[l].append(1)
-                    else:
-                        match[l].append(0)
-                    selec[gt_idx] = True
-                else:
-                    match[l].append(0)
-
-            del iou
-            pass
+            gt_index[max_iou < iou_thresh] = -1
+
+            if with_pred_for_each_gt:
+                pred_for_each_gt_l = defaultdict(list)
+                neg_count =  0
+                for pi in range(pn):
+                    pis = {'pred_idx': rec['pred_ids'][pi], 'iou':max_iou[pi], 'score':pred_score_l[pi]}
+                    gt_idx = gt_index[pi]
+                    if gt_idx<0:
+                        neg_count += 1
+                        gt_idx -= (gt_idx==-1) * neg_count
+                    pred_for_each_gt_l[gt_idx].append(pis)
+
+                if obj_name not in pred_for_each_gt:
+                    for iii in range(batch_size):
+                        pred_for_each_gt[obj_name].append(defaultdict(list))
+                pred_for_each_gt[obj_name][bi] = pred_for_each_gt_l
+
+            predious[l].extend( max_iou )
+
+            # gt_index is already sorted by scores, thus the first pred
+            # matching a gt box is set 1
+            match_l = np.zeros(pn, dtype=np.int8)
+            valid = np.where(gt_index >= 0)[0]
+            _, first = np.unique(gt_index[valid], return_index=True)
+            match_l[valid[first]] = 1
+            match[l].extend(match_l)
 
 
     n_fg_class = max(n_pos.keys()) + 1
@@ -864,9 +975,7 @@ def calc_detection_suncg_prec_rec(gt_boxlists, pred_boxlists, iou_thresh, dset_m
         scores[l] = score_l[order]
         match_l = match_l[order]
         predious[l] = np.array( predious[l], dtype=np.float)
-        if not predious[l].shape[0] == order.shape[0]:
-          import pdb; pdb.set_trace()  # XXX BREAKPOINT
-          pass
+        assert predious[l].shape[0] == order.shape[0]
         pred_ious[l] = predious[l][order]
 
         tp = np.cumsum(match_l == 1)
@@ -879,13 +988,57 @@ def calc_detection_suncg_prec_rec(gt_boxlists, pred_boxlists, iou_thresh, dset_m
         #if n_pos[l] > 0:
         rec[l] = tp / n_pos[l]
 
-    #plt.plot(rec[1], label='rec')
-    #plt.plot(prec[1], label='prec')
-    #plt.plot(scores[1], label='score')
-    #plt.legend()
-    #plt.show()
     return prec, rec, pred_for_each_gt, scores, pred_ious
 
+RECALL_11POINTS = np.arange(0.0, 1.1, 0.1)
+RECALL_CURVE_POINTS = np.arange(0.0, 1.001, 0.01)
+
+def recall_curve(prec_l, rec_l, scores_l, ious_l, recall_grid):
+    """Lookup table recall -> (precision, score threshold, iou) of one class.
+    The predictions are sorted by score, so rec_l is non decreasing and the
+    predictions with recall >= t are a suffix, found by searchsorted. The
+    suffix maxima are computed once, for any number of recall points.
+    Returns:
+        [len(recall_grid), 4]: recall t,
+            max precision of recall >= t (interpolated precision, 0 if none),
+            min score of recall <= t (max score + 0.01 if none),
+            max iou of recall >= t (0 if none)
+    """
+    m = len(recall_grid)
+    table = np.zeros([m, 4])
+    table[:,0] = recall_grid
+    if len(rec_l) == 0 or np.isnan(rec_l[0]):
+        # no gt: no recall reached
+        table[:,2] = (np.max(scores_l) if len(scores_l) > 0 else 0) + 0.01
+        return table
+    # precision envelope and suffix max of iou, with a 0 sentinel at the end
+    prec_env = np.maximum.accumulate(np.nan_to_num(prec_l)[::-1])[::-1]
+    iou_env = np.maximum.accumulate(np.nan_to_num(ious_l)[::-1])[::-1]
+    prec_env = np.append(prec_env, 0)
+    iou_env = np.append(iou_env, 0)
+    # first index with rec >= t
+    i = np.searchsorted(rec_l, recall_grid, side='left')
+    # number of predictions with rec <= t
+    j = np.searchsorted(rec_l, recall_grid, side='right')
+    table[:,1] = prec_env[i]
+    table[:,3] = iou_env[i]
+    table[:,2] = np.where(j > 0, scores_l[np.maximum(j-1, 0)], scores_l[0] + 0.01)
+    return table
+
+def recall_curves(prec, rec, scores, predious, recall_grid=RECALL_CURVE_POINTS):
+    """recall_curve of all classes, [n_class, len(recall_grid), 4].
+    Class 0 is the mean of the others, nan for missing classes.
+    """
+    n_fg_class = len(prec)
+    curves = np.full([n_fg_class, len(recall_grid), 4], np.nan)
+    for l in range(1, n_fg_class):
+        if prec[l] is None or rec[l] is None:
+            continue
+        curves[l] = recall_curve(prec[l], rec[l], scores[l], predious[l], recall_grid)
+    if n_fg_class > 1:
+        curves[0] = np.nanmean(curves[1:], 0)
+    return curves
+
 def calc_detection_suncg_ap(prec, rec, scores, predious, use_07_metric=False):
     """Calculate average precisions based on evaluation code of PASCAL VOC.
     This function calculates average precisions
@@ -920,30 +1073,11 @@ def calc_detection_suncg_ap(prec, rec, scores, predious, use_07_metric=False):
             recall_precision_score_iou_10steps[l] = np.nan
             continue
 
+        # [recall, precision, score_thres, iou]
+        recall_precision_score_iou_10steps[l] = recall_curve(prec[l], rec[l], scores[l], predious[l], RECALL_11POINTS)
         if use_07_metric:
             # 11 point metric
-            ap[l] = 0
-            rp = []
-            for t in np.arange(0.0, 1.1, 0.1):
-                if np.sum(rec[l] >= t) == 0:
-                    p = 0
-                else:
-                    p = np.max(np.nan_to_num(prec[l])[rec[l] >= t])
-                if np.sum(rec[l] >= t) == 0:
-                    iou = 0
-                else:
-                    iou = np.max(np.nan_to_num(predious[l])[rec[l] >= t])
-                if np.sum(rec[l] <= t) == 0:
-                    try:
-                      s = np.max(scores[l]) + 0.01
-                    except:
-                      import pdb; pdb.set_trace()  # XXX BREAKPOINT
-                      pass
-                else:
-                    s = np.min(scores[l][rec[l] <= t])
-                ap[l] += p / 11
-                rp.append([t, p, s, iou]) # [recall, precision, score_thres]
-            recall_precision_score_iou_10steps[l] = np.array(rp)
+            ap[l] = recall_precision_score_iou_10steps[l][:,1].sum() / 11
         else:
             # correct AP calculation
             # first append sentinel values at the end
@@ -8,6 +8,7 @@ from collections import defaultdict
 import pickle
 import torch
 from utils3d.geometric_util import cam2world_box, cam2world_pcl
+from data3d.ply_io import read_ply_points, write_ply
 from data3d.suncg_utils.scene_samples import SceneSamples
 #from suncg_utils.celing_floor_room_preprocessing import preprocess_cfr_standard
 
@@ -53,8 +54,8 @@ def points2pcd_open3d(points):
   return pcd
 
 def points_ply(points, plyfn):
-  pcd = points2pcd_open3d(points)
-  open3d.write_point_cloud(plyfn, pcd)
+  normals = points[:,3:6] if points.shape[1] == 6 else None
+  write_ply(plyfn, points[:,0:3], normals=normals)
 
 def random_sample_pcl(points0, num_points1, only_reduce=False):
   n0 = points0.shape[0]
@@ -93,6 +94,26 @@ def add_norm(pcd):
 #    f.write(f"{name}: {value}\n")
 #  print(f'write summary: {summary_fn}')
 
+def read_house_stats(scene_dir, splited_root):
+  '''
+  scene_size and level_num of a raw house, from the stats table next to
+  splited_root if it is built (suncg_stats.py), else from its summary.txt
+  '''
+  from data3d.suncg_utils.suncg_stats import SuncgStats, STATS_FN
+  from suncg_utils.suncg_preprocess import read_summary
+  stats_fn = os.path.join(os.path.dirname(os.path.abspath(splited_root)), STATS_FN)
+  house_name = os.path.basename(scene_dir)
+  if os.path.exists(stats_fn):
+    stats = SuncgStats.cached(stats_fn)
+    if house_name in stats:
+      house = stats.house(house_name)
+      summary = {'scene_size': house['scene_size']}
+      if house['level_num'] >= 0:
+        summary['level_num'] = house['level_num']
+      return summary
+  return read_summary(scene_dir)
+
+
 class IndoorData():
   _block_size0 = BLOCK_SIZE0
   #_block_size0 = np.array([16,16,3])
@@ -114,7 +135,7 @@ class IndoorData():
     #house_intact, intacts = check_house_intact(scene_dir)
     #if not house_intact:
     #  return
-    summary_raw = read_summary(scene_dir)
+    summary_raw = read_house_stats(scene_dir, os.path.dirname(splited_path))
     is_big_size = (summary_raw['scene_size'] > MAX_SCENE_SIZE).any()
     always_update = always_update or ( ALWAYS_BIG_SIZE and is_big_size )
 
@@ -164,10 +185,12 @@ class IndoorData():
     if not os.path.exists(splited_path):
       os.makedirs(splited_path)
 
+    block_points_num = [0] * n_block
     for i in range(n_block):
       boxes_num_all_classes = sum([bn[i] for bn in boxes_nums.values()])
       if n_block>1 and  boxes_num_all_classes < MIN_BOXES_NUM:
           continue
+      block_points_num[i] = points_splited[i].shape[0]
       fni = splited_path + '/pcl_%d.pth'%(i)
       pcl_i = points_splited[i].astype(np.float32)
 
@@ -192,6 +215,7 @@ class IndoorData():
         Bbox3D.save_bboxes_ply(boxfn_i, boxes_i['wall'], 'Z')
       print(f'save {fni}')
     write_summary(splited_path, 'split_num', n_block, 'w')
+    write_summary(splited_path, 'block_points_num', block_points_num, 'a')
 
   @staticmethod
   def adjust_box_for_thickness_crop(bboxes0):
@@ -336,13 +360,11 @@ class IndoorData():
       return  scene_name in ['0058113bdc8bee5f387bb5ad316d7b28']
 
   @staticmethod
-  def crop_special_scenes(scene_name, pcd):
+  def crop_special_scenes(scene_name, points, colors):
       '''
       some special scenes are two large, but contain a lot empty in the middle.
       Directly split by the pipeline is not good. Manually crop
       '''
-      points = np.asarray(pcd.points)
-      colors = np.asarray(pcd.colors)
       if not IndoorData.is_a_special_scene( scene_name ):
           return points, colors, False
       print(f'This is a special scene: \n\t{scene_name}')
@@ -366,6 +388,7 @@ class IndoorData():
       colors_new = colors[mask]
 
       if debuging:
+        pcd = points2pcd_open3d(points)
         open3d.draw_geometries([pcd])
         print(f'orignal min:{xyz_min0}, max:{xyz_max0}, scope:{scope0}')
 
@@ -381,16 +404,16 @@ class IndoorData():
   @staticmethod
   def split_pcl_plyf(pcl_fn):
     assert os.path.exists(pcl_fn)
-    pcd = open3d.read_point_cloud(pcl_fn)
+    points, colors, _ = read_ply_points(pcl_fn)
     scene_name = os.path.basename( os.path.dirname(pcl_fn))
-    points, colors, is_special_scene = IndoorData.crop_special_scenes(scene_name, pcd)
+    points, colors, is_special_scene = IndoorData.crop_special_scenes(scene_name, points, colors)
 
     points = cam2world_pcl(points)
-    pcd.points = open3d.Vector3dVector(points)
 
     points = np.concatenate([points, colors], -1)
     is_add_norm = True
     if is_add_norm:
+      pcd = points2pcd_open3d(points[:,0:3])
       add_norm(pcd)
       normals = np.asarray(pcd.normals)
       points = np.concatenate([points,  normals], -1)
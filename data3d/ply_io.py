@@ -0,0 +1,174 @@
+import numpy as np
+
+'''
+PLY reading without loading the whole file: the header gives the vertex
+number and layout, the binary vertex block is memory mapped as a structured
+array, or read chunk by chunk. Writing is binary, chunk by chunk.
+'''
+
+PLY_DTYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+              'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+              'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+              'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+PLY_FORMATS = {'binary_little_endian': '<', 'binary_big_endian': '>', 'ascii': '='}
+
+
+def read_ply_header(ply_fn):
+  '''
+  Returns: dict
+    format: 'ascii', 'binary_little_endian' or 'binary_big_endian'
+    elements: list of (name, count, properties), properties is a list of
+      (name, numpy type) or (name, (count type, item type)) for lists
+    header_size: bytes of the header, the data starts there
+  '''
+  elements = []
+  fmt = None
+  with open(ply_fn, 'rb') as f:
+    line = f.readline()
+    assert line.strip() == b'ply', f'not a ply file: {ply_fn}'
+    while True:
+      line = f.readline()
+      if len(line) == 0:
+        raise ValueError(f'no end_header in {ply_fn}')
+      items = line.decode('ascii').split()
+      if len(items) == 0:
+        continue
+      if items[0] == 'format':
+        fmt = items[1]
+      elif items[0] == 'element':
+        elements.append((items[1], int(items[2]), []))
+      elif items[0] == 'property':
+        if items[1] == 'list':
+          elements[-1][2].append((items[4], (PLY_DTYPES[items[2]], PLY_DTYPES[items[3]])))
+        else:
+          elements[-1][2].append((items[2], PLY_DTYPES[items[1]]))
+      elif items[0] == 'end_header':
+        break
+    header_size = f.tell()
+  assert fmt in PLY_FORMATS, f'unknown ply format {fmt}'
+  return {'format': fmt, 'elements': elements, 'header_size': header_size}
+
+
+def vertex_dtype(header):
+  '''
+  structured numpy dtype of one vertex
+  '''
+  name, _, properties = header['elements'][0]
+  assert name == 'vertex', 'the first ply element should be vertex'
+  byte_order = PLY_FORMATS[header['format']]
+  for p in properties:
+    assert not isinstance(p[1], tuple), 'list property in vertex is not supported'
+  return np.dtype([(p[0], byte_order + p[1]) for p in properties])
+
+
+def iter_ply_vertices(ply_fn, chunk_size=1<<20, header=None):
+  '''
+  Yield the vertices as structured arrays of at most chunk_size vertices.
+  '''
+  if header is None:
+    header = read_ply_header(ply_fn)
+  dtype = vertex_dtype(header)
+  vertex_num = header['elements'][0][1]
+  with open(ply_fn, 'rb') as f:
+    f.seek(header['header_size'])
+    if header['format'] == 'ascii':
+      names = dtype.names
+      for s in range(0, vertex_num, chunk_size):
+        n = min(chunk_size, vertex_num - s)
+        lines = [f.readline() for _ in range(n)]
+        values = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+        chunk = np.empty(n, dtype=dtype)
+        for i, name in enumerate(names):
+          chunk[name] = values[:, i]
+        yield chunk
+    else:
+      for s in range(0, vertex_num, chunk_size):
+        n = min(chunk_size, vertex_num - s)
+        yield np.fromfile(f, dtype=dtype, count=n)
+
+
+def read_ply_vertices(ply_fn, header=None):
+  '''
+  All the vertices as one structured array. For binary files it is a read
+  only memmap of the vertex block, nothing is read until it is accessed.
+  '''
+  if header is None:
+    header = read_ply_header(ply_fn)
+  dtype = vertex_dtype(header)
+  vertex_num = header['elements'][0][1]
+  if vertex_num == 0:
+    return np.zeros(0, dtype=dtype)
+  if header['format'] == 'ascii':
+    return np.concatenate(list(iter_ply_vertices(ply_fn, header=header)), 0)
+  return np.memmap(ply_fn, dtype=dtype, mode='r', offset=header['header_size'], shape=(vertex_num,))
+
+
+def ply_fields(vertices, names, dtype=np.float64):
+  '''
+  [N, len(names)] array of some properties of the structured vertices
+  '''
+  out = np.empty([vertices.shape[0], len(names)], dtype=dtype)
+  for i, name in enumerate(names):
+    out[:, i] = vertices[name]
+  return out
+
+
+def read_ply_points(ply_fn):
+  '''
+  Same content as open3d.read_point_cloud.
+  Returns:
+    points: [N,3] float64
+    colors: [N,3] float64 in [0,1], None if no color
+    normals: [N,3] float64, None if no normal
+  '''
+  vertices = read_ply_vertices(ply_fn)
+  names = vertices.dtype.names
+  points = ply_fields(vertices, ['x', 'y', 'z'])
+  colors = normals = None
+  if 'red' in names:
+    colors = ply_fields(vertices, ['red', 'green', 'blue'])
+    if vertices.dtype['red'].kind == 'u':
+      colors /= np.iinfo(vertices.dtype['red']).max
+  if 'nx' in names:
+    normals = ply_fields(vertices, ['nx', 'ny', 'nz'])
+  return points, colors, normals
+
+
+def write_ply(ply_fn, points, colors=None, normals=None, float_type='float', chunk_size=1<<20):
+  '''
+  Binary little endian ply, readable by open3d and plyfile.
+  points: [N,3]
+  colors: [N,3] float in [0,1] (saved as uchar) or uint8
+  normals: [N,3]
+  '''
+  n = points.shape[0]
+  ft = PLY_DTYPES[float_type]
+  properties = [('x', float_type), ('y', float_type), ('z', float_type)]
+  dtype = [('x', '<'+ft), ('y', '<'+ft), ('z', '<'+ft)]
+  if normals is not None:
+    properties += [('nx', float_type), ('ny', float_type), ('nz', float_type)]
+    dtype += [('nx', '<'+ft), ('ny', '<'+ft), ('nz', '<'+ft)]
+  if colors is not None:
+    properties += [('red', 'uchar'), ('green', 'uchar'), ('blue', 'uchar')]
+    dtype += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+    if colors.dtype != np.uint8:
+      colors = np.clip(np.round(colors * 255), 0, 255)
+  dtype = np.dtype(dtype)
+
+  header = ['ply', 'format binary_little_endian 1.0', f'element vertex {n}']
+  header += [f'property {t} {name}' for name, t in properties]
+  header += ['end_header']
+  with open(ply_fn, 'wb') as f:
+    f.write(('\n'.join(header) + '\n').encode('ascii'))
+    for s in range(0, n, chunk_size):
+      e = min(s + chunk_size, n)
+      chunk = np.empty(e - s, dtype=dtype)
+      for i, name in enumerate(['x', 'y', 'z']):
+        chunk[name] = points[s:e, i]
+      if normals is not None:
+        for i, name in enumerate(['nx', 'ny', 'nz']):
+          chunk[name] = normals[s:e, i]
+      if colors is not None:
+        for i, name in enumerate(['red', 'green', 'blue']):
+          chunk[name] = colors[s:e, i]
+      chunk.tofile(f)
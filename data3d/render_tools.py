@@ -4,6 +4,7 @@ import open3d, pymesh
 import numpy as np
 from utils3d.bbox3d_ops import Bbox3D
 from utils3d.geometric_util import cam2world_box, cam2world_pcl
+from data3d.ply_io import read_ply_points
 import torch
 from collections import defaultdict
 from suncg_utils.scene_samples import SceneSamples
@@ -99,10 +100,8 @@ def render_parsed_house_walls(parsed_dir, show_pcl=SHOW_PCL, show_by_class=0):
     if not os.path.exists(pcl_fn):
         return
 
-    pcd = open3d.read_point_cloud(pcl_fn)
-    points = np.asarray(pcd.points)
+    points, colors, _ = read_ply_points(pcl_fn)
     points = cam2world_pcl(points)
-    colors = np.asarray(pcd.colors)
     pcl = np.concatenate([points, colors], 1)
 
     scene_size = pcl_size(pcl)
@@ -290,64 +289,34 @@ def main():
             r_splited = 1
     )
 
-def summarize():
-  from suncg_utils.suncg_preprocess import read_summary, write_summary
+def summarize(rebuild=False, processes=8):
+  '''
+  The stats of all houses are built in parallel into one table
+  ({SPLITED_DIR}/suncg_stats.npz) from the ply headers and a streamed read
+  of the vertices, then summarized from the table.
+  '''
+  from suncg_utils.suncg_stats import build_suncg_stats, SuncgStats, STATS_FN
   with open(f'{SUNCG_V1_DIR}/house_names_1level.txt', 'r') as h1f:
-      house_names_1level = h1f.read().split('\n')
+      house_names_1level = [hn for hn in h1f.read().split('\n') if hn != '']
+
+  stats_fn = f'{SPLITED_DIR}/{STATS_FN}'
+  if rebuild or not os.path.exists(stats_fn):
+    build_suncg_stats(house_names_1level, PARSED_DIR, f'{SPLITED_DIR}/houses', stats_fn, processes)
+  houses = SuncgStats(stats_fn).houses
 
   show_big_size = True
-  num_points = []
-  xyareas = []
-  scene_sizes = []
-  i = 0
-  for hn in house_names_1level:
-    i += 1
-    #if i>10:
-    #  break
-
-    parsed_dir = f'{PARSED_DIR}/{hn}'
-    summary = read_summary(parsed_dir)
-
-    if 'xyarea' in summary and 'scene_size' in summary:
-      pn = summary['points_num']
-      xyarea = summary['xyarea']
-      scene_size = summary['scene_size']
-    else:
-      pcl_fn = f'{parsed_dir}/pcl_camref.ply'
-      pcd = open3d.read_point_cloud(pcl_fn)
-
-      points = np.asarray(pcd.points)
-      points = cam2world_pcl(points)
-      colors = np.asarray(pcd.colors)
-      pcl = np.concatenate([points, colors], 1)
-
-      scene_size = pcl_size(pcl)
-      xyarea = np.product(scene_size[0:2])
-      pn = pcl.shape[0]
-      #if 'pcl_size' not in summary:
-      #  write_summary(parsed_dir, 'pcl_size', scene_size, 'a')
-      if 'xyarea' not in summary or 'scene_size' not in summary:
-        write_summary(parsed_dir, 'xyarea', xyarea, 'a')
-        write_summary(parsed_dir, 'scene_size', scene_size, 'a')
-
-
-    scene_sizes.append(scene_size.reshape([1,-1]))
-    xyareas.append(xyarea)
-    num_points.append(pn)
-    print(f'{i} {hn}  point num: {pn}')
-
-    is_big_size = (scene_size > [80,80,10]).any()
-    if show_big_size and is_big_size:
-      print(f'\n\t\t{hn}\norg scene_size: {scene_size}')
-      files = glob.glob( f'{SPLITED_DIR}/houses/{hn}/*.pth')
-      for fl in files:
-        render_pth_file(fl)
-
-
-
-  num_points = np.array(num_points).astype(np.double)
-  xyareas = np.array(xyareas).astype(np.double)
-  scene_sizes = np.concatenate(scene_sizes, 0)
+  num_points = houses['points_num'].astype(np.double)
+  xyareas = houses['xyarea'].astype(np.double)
+  scene_sizes = houses['scene_size'].astype(np.double)
+
+  if show_big_size:
+    for hn, scene_size in zip(houses['name'], scene_sizes):
+      if (scene_size > [80,80,10]).any():
+        print(f'\n\t\t{hn}\norg scene_size: {scene_size}')
+        files = glob.glob( f'{SPLITED_DIR}/houses/{hn}/*.pth')
+        for fl in files:
+          render_pth_file(fl)
+
   mean_scene_size = scene_sizes.mean(axis=0)
 
   ave_np = np.mean(num_points).astype(np.int)
@@ -4,7 +4,9 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-import glob, plyfile, numpy as np, multiprocessing as mp, torch, os
+import glob, numpy as np, multiprocessing as mp, os
+from data3d.ply_io import read_ply_vertices, ply_fields
+from data3d.scanet_utils.data_Scannet import SCENE_DTYPE
 
 # Map relevant classes to {0,1,...,19}, and ignored classes to -100
 remapper=np.ones(150)*(-100)
@@ -19,19 +21,23 @@ assert len(files) == len(files2)
 
 def f(fn):
     fn2 = fn[:-3]+'labels.ply'
-    a=plyfile.PlyData().read(fn)
-    v=np.array([list(x) for x in a.elements[0]]) # (81369, 7)
-    coords=np.ascontiguousarray(v[:,:3]-v[:,:3].mean(0)) # (81369, 3)
-    colors=np.ascontiguousarray(v[:,3:6])/127.5-1 #  colors
-    a=plyfile.PlyData().read(fn2)
-    label = np.array(a.elements[0]['label'])
+    v=read_ply_vertices(fn) # memmap (81369,) x,y,z,red,green,blue,alpha
+    coords=ply_fields(v, ['x','y','z'])
+    coords-=coords.mean(0) # (81369, 3)
+    colors=ply_fields(v, ['red','green','blue'])/127.5-1 #  colors
+    label = np.array(read_ply_vertices(fn2)['label'])
     label = np.minimum(label, 149)
     w=remapper[label]
-    fn_3 = (fn[:-4]+'.pth').replace(root_path, save_path)
+    fn_3 = (fn[:-4]+'.npy').replace(root_path, save_path)
     dir_3 = os.path.dirname(fn_3)
     if not os.path.exists(dir_3):
       os.makedirs(dir_3)
-    torch.save((coords,colors,w),fn_3)
+    # one structured array, memory mapped by ScanNetDataset
+    scene = np.empty(coords.shape[0], dtype=SCENE_DTYPE)
+    scene['xyz'] = coords
+    scene['rgb'] = colors
+    scene['label'] = w
+    np.save(fn_3, scene)
     print(fn, fn2, fn_3)
 
 #f(files[0])
@@ -5,144 +5,189 @@
 # LICENSE file in the root directory of this source tree.
 
 
-import torch, numpy as np, glob, math, torch.utils.data, scipy.ndimage, multiprocessing as mp
+import os, math
+import torch, numpy as np, torch.utils.data, scipy.ndimage
+
+CUR_DIR = os.path.dirname(os.path.abspath(__file__))
+ScanNetTorch_PATH = os.path.join(CUR_DIR, 'ScanNetTorch')
+# VALID_CLAS_IDS have been mapped to the range {0,1,...,19}
+VALID_CLASS_IDS = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 16, 24, 28, 33, 34, 36, 39])
+# one scene saved by Scannet_prepare_data.py, loaded with np.load(mmap_mode='r')
+SCENE_DTYPE = np.dtype([('xyz', '<f4', (3,)), ('rgb', '<f4', (3,)), ('label', '<f4')])
+
+ELASTIC_PERIOD = 64
+ELASTIC_FIELDS = 4
+
+
+def get_files(split):
+  with open(f'{CUR_DIR}/Benchmark_Small/scannetv1_{split}.txt') as f:
+    scene_names = [l.strip() for l in f.readlines()]
+  files = [f'{ScanNetTorch_PATH}/{scene}/{scene}_vh_clean_2.npy' for scene in scene_names]
+  return files
+
+
+def load_scene(fn):
+  '''
+  xyz, rgb, label of one scene. The .npy scene is memory mapped, the legacy
+  .pth (coords, colors, labels) of the same name is loaded if no .npy.
+  '''
+  if os.path.exists(fn):
+    scene = np.load(fn, mmap_mode='r')
+    return scene['xyz'], scene['rgb'], scene['label']
+  return torch.load(fn[:-4] + '.pth')
+
+
+def scene_points_num(fn):
+  if os.path.exists(fn):
+    return np.load(fn, mmap_mode='r').shape[0]
+  return torch.load(fn[:-4] + '.pth')[2].size
+
+
+#Elastic distortion
+blur0=np.ones((3,1,1)).astype('float32')/3
+blur1=np.ones((1,3,1)).astype('float32')/3
+blur2=np.ones((1,1,3)).astype('float32')/3
+
+class ElasticNoise():
+  '''
+  Elastic distortion with precomputed noise fields. Each field is the
+  blurred gaussian noise of the original elastic(), but periodic (blurred
+  with mode='wrap') over ELASTIC_PERIOD grid steps, so one field of fixed
+  size serves scenes of any size. A call uses one random field of the
+  granularity with a random offset, and interpolates it trilinearly.
+  The fields are cached per granularity and shared by all datasets.
+  '''
+  _cache = {}
+
+  def __init__(self, gran, mag, period=ELASTIC_PERIOD, fields_num=ELASTIC_FIELDS):
+    self.gran = gran
+    self.mag = mag
+    self.period = period
+    key = (gran, period, fields_num)
+    if key not in ElasticNoise._cache:
+      ElasticNoise._cache[key] = np.stack([self.noise_field(period) for _ in range(fields_num)], 0)
+    self.fields = ElasticNoise._cache[key]
+
+  @staticmethod
+  def noise_field(period):
+    '''
+    [period, period, period, 3] float32
+    '''
+    noise=[np.random.randn(period,period,period).astype('float32') for _ in range(3)]
+    for blur in [blur0, blur1, blur2, blur0, blur1, blur2]:
+      noise=[scipy.ndimage.filters.convolve(n,blur,mode='wrap') for n in noise]
+    return np.stack(noise, -1)
+
+  def __call__(self, x):
+    field = self.fields[np.random.randint(self.fields.shape[0])]
+    # the grid step of the original interpolator is 2*gran
+    u = x / (2.0 * self.gran) + np.random.rand(3) * self.period
+    i0 = np.floor(u).astype(np.int64)
+    w1 = (u - i0).astype(np.float32)
+    w0 = 1 - w1
+    i0 %= self.period
+    i1 = (i0 + 1) % self.period
+    g = np.zeros([x.shape[0], 3], dtype=np.float32)
+    for dx in range(2):
+      ix, wx = (i1[:,0], w1[:,0]) if dx else (i0[:,0], w0[:,0])
+      for dy in range(2):
+        iy, wy = (i1[:,1], w1[:,1]) if dy else (i0[:,1], w0[:,1])
+        for dz in range(2):
+          iz, wz = (i1[:,2], w1[:,2]) if dz else (i0[:,2], w0[:,2])
+          g += (wx*wy*wz)[:,None] * field[ix, iy, iz]
+    return x + g * self.mag
+
+
+def rotation_flip(scale, distort):
+  m=np.eye(3)
+  if distort:
+    m+=np.random.randn(3,3)*0.1 # aug: position distortion
+  m[0][0]*=np.random.randint(0,2)*2-1  # aug: x flip
+  m*=scale
+  theta=np.random.rand()*2*math.pi # rotation aug
+  return np.matmul(m,[[math.cos(theta),math.sin(theta),0],[-math.sin(theta),math.cos(theta),0],[0,0,1]])
+
+
+class ScanNetDataset(torch.utils.data.Dataset):
+  '''
+  Scenes are opened lazily in __getitem__ (memory mapped), so construction
+  only reads the split file. The augmentation runs in __getitem__, i.e. in
+  the DataLoader workers.
+  '''
+  def __init__(self, split, cfg):
+    self.is_train = split == 'train'
+    self.scale = cfg.SPARSE3D.VOXEL_SCALE
+    self.full_scale = np.array(cfg.SPARSE3D.VOXEL_FULL_SCALE)
+    self.files = get_files(split)
+    self._point_offsets = None
+    if self.is_train:
+      scale = self.scale
+      self.elastics = [ElasticNoise(6*scale//50, 40*scale/50),
+                       ElasticNoise(20*scale//50, 160*scale/50)]
+
+  def __len__(self):
+    return len(self.files)
+
+  def point_offsets(self):
+    '''
+    Offset of the points of each scene in all the scenes of the split.
+    Computed at the first call, only the headers are read.
+    '''
+    if self._point_offsets is None:
+      nums = [scene_points_num(fn) for fn in self.files]
+      self._point_offsets = np.concatenate([[0], np.cumsum(nums)]).astype(np.int64)
+    return self._point_offsets
+
+  def __getitem__(self, index):
+    a,b,c = load_scene(self.files[index]) # a:xyz  b:color c:label
+    full_scale = self.full_scale
+    a=np.matmul(a, rotation_flip(self.scale, self.is_train))
+    if self.is_train:
+      for elastic in self.elastics:
+        a=elastic(a)
+    else:
+      a+=full_scale/2+np.random.uniform(-2,2,3)
+    m=a.min(0)
+    M=a.max(0)
+    # aug: the centroid between [0,full_scale]
+    offset = -m + np.clip(full_scale-M+m-0.001, 0, None) * np.random.rand(3)+np.clip(full_scale-M+m+0.001,None,0)*np.random.rand(3)
+    a+=offset
+    idxs=(a.min(1)>=0)*(a<full_scale).all(1)
+    assert np.all(idxs), "some points are missed"
+    a=torch.from_numpy(a).long()
+    b=torch.from_numpy(np.array(b[idxs], dtype=np.float32))
+    c=torch.from_numpy(np.array(c[idxs]))
+    if self.is_train:
+      b=b+torch.randn(3)*0.1
+    data = {'x': [a,b], 'y': c, 'id': index}
+    if not self.is_train:
+      data['point_ids'] = torch.from_numpy(np.nonzero(idxs)[0]+self.point_offsets()[index])
+    return data
+
+
+def scannet_merge(data_ls):
+  locs=torch.cat([torch.cat([d['x'][0],torch.LongTensor(d['x'][0].shape[0],1).fill_(idx)],1)
+                  for idx,d in enumerate(data_ls)],0)
+  feats=torch.cat([d['x'][1] for d in data_ls],0)
+  labels=torch.cat([d['y'] for d in data_ls],0)
+  batch = {'x': [locs,feats], 'y': labels.long(), 'id': [d['id'] for d in data_ls]}
+  if 'point_ids' in data_ls[0]:
+    batch['point_ids'] = torch.cat([d['point_ids'] for d in data_ls],0)
+  return batch
+
+
+def worker_init_fn(worker_id):
+  # the numpy random state is copied to each worker by fork
+  np.random.seed(torch.initial_seed() % 2**32)
+
 
 def make_data_loader(cfg, is_train, is_distributed=False, start_iter=0):
-  scale = cfg.SPARSE3D.VOXEL_SCALE
-  full_scale=cfg.SPARSE3D.VOXEL_FULL_SCALE
-  val_reps = cfg.SPARSE3D.VAL_REPS
   batch_size = cfg.SOLVER.IMS_PER_BATCH
-  dimension=3
-
-  # VALID_CLAS_IDS have been mapped to the range {0,1,...,19}
-  VALID_CLASS_IDS = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 16, 24, 28, 33, 34, 36, 39])
-
-  def get_files(split):
-    import os
-    cur_path = os.path.dirname(os.path.abspath(__file__))
-    dset_path = f'{cur_path}/ScanNetTorch'
-    with open(f'{cur_path}/Benchmark_Small/scannetv1_{split}.txt') as f:
-      scene_names = [l.strip() for l in f.readlines()]
-    files = [f'{dset_path}/{scene}/{scene}_vh_clean_2.pth' for scene in scene_names]
-    return files
-
-  train,val=[],[]
-  for x in torch.utils.data.DataLoader(
-        get_files('train'),
-          collate_fn=lambda x: torch.load(x[0]), num_workers=mp.cpu_count()):
-      train.append(x)
-  for x in torch.utils.data.DataLoader(
-        get_files('val'),
-          collate_fn=lambda x: torch.load(x[0]), num_workers=mp.cpu_count()):
-      val.append(x)
-  print('Training examples:', len(train))
-  print('Validation examples:', len(val))
-
-  #Elastic distortion
-  blur0=np.ones((3,1,1)).astype('float32')/3
-  blur1=np.ones((1,3,1)).astype('float32')/3
-  blur2=np.ones((1,1,3)).astype('float32')/3
-  def elastic(x,gran,mag):
-      bb=np.abs(x).max(0).astype(np.int32)//gran+3
-      noise=[np.random.randn(bb[0],bb[1],bb[2]).astype('float32') for _ in range(3)]
-      noise=[scipy.ndimage.filters.convolve(n,blur0,mode='constant',cval=0) for n in noise]
-      noise=[scipy.ndimage.filters.convolve(n,blur1,mode='constant',cval=0) for n in noise]
-      noise=[scipy.ndimage.filters.convolve(n,blur2,mode='constant',cval=0) for n in noise]
-      noise=[scipy.ndimage.filters.convolve(n,blur0,mode='constant',cval=0) for n in noise]
-      noise=[scipy.ndimage.filters.convolve(n,blur1,mode='constant',cval=0) for n in noise]
-      noise=[scipy.ndimage.filters.convolve(n,blur2,mode='constant',cval=0) for n in noise]
-      ax=[np.linspace(-(b-1)*gran,(b-1)*gran,b) for b in bb]
-      interp=[scipy.interpolate.RegularGridInterpolator(ax,n,bounds_error=0,fill_value=0) for n in noise]
-      def g(x_):
-          return np.hstack([i(x_)[:,None] for i in interp])
-      return x+g(x)*mag
-
-  def trainMerge(tbl):
-      locs=[]
-      feats=[]
-      labels=[]
-      for idx,i in enumerate(tbl):
-          a,b,c=train[i] # a:xyz  b:color c:label
-          m=np.eye(3)+np.random.randn(3,3)*0.1 # aug: position distortion
-          m[0][0]*=np.random.randint(0,2)*2-1  # aug: x flip
-          m*=scale
-          theta=np.random.rand()*2*math.pi # rotation aug
-          m=np.matmul(m,[[math.cos(theta),math.sin(theta),0],[-math.sin(theta),math.cos(theta),0],[0,0,1]])
-          a=np.matmul(a,m)
-          a=elastic(a,6*scale//50,40*scale/50)
-          a=elastic(a,20*scale//50,160*scale/50)
-          m=a.min(0)
-          M=a.max(0)
-          q=M-m
-          # aug: the centroid between [0,full_scale]
-          offset = -m + np.clip(full_scale-M+m-0.001, 0, None) * np.random.rand(3)+np.clip(full_scale-M+m+0.001,None,0)*np.random.rand(3)
-          a+=offset
-          idxs=(a.min(1)>=0)*(a.max(1)<full_scale)
-          assert np.all(idxs), "some points are missed in train"
-          a=a[idxs]
-          b=b[idxs]
-          c=c[idxs]
-          a=torch.from_numpy(a).long()
-          locs.append(torch.cat([a,torch.LongTensor(a.shape[0],1).fill_(idx)],1))
-          feats.append(torch.from_numpy(b)+torch.randn(3)*0.1)
-          labels.append(torch.from_numpy(c))
-      locs=torch.cat(locs,0)
-      feats=torch.cat(feats,0)
-      labels=torch.cat(labels,0)
-
-      #batch_scopes(locs, scale)
-      return {'x': [locs,feats], 'y': labels.long(), 'id': tbl}
-  train_data_loader = torch.utils.data.DataLoader(
-      list(range(len(train))),batch_size=batch_size, collate_fn=trainMerge, num_workers=20*0, shuffle=True)
-
-
-  valOffsets=[0]
-  valLabels=[]
-  for idx,x in enumerate(val):
-      valOffsets.append(valOffsets[-1]+x[2].size)
-      valLabels.append(x[2].astype(np.int32))
-  valLabels=np.hstack(valLabels)
-
-  def valMerge(tbl):
-      locs=[]
-      feats=[]
-      labels=[]
-      point_ids=[]
-      for idx,i in enumerate(tbl):
-          a,b,c=val[i]
-          m=np.eye(3)
-          m[0][0]*=np.random.randint(0,2)*2-1
-          m*=scale
-          theta=np.random.rand()*2*math.pi
-          m=np.matmul(m,[[math.cos(theta),math.sin(theta),0],[-math.sin(theta),math.cos(theta),0],[0,0,1]])
-          a=np.matmul(a,m)+full_scale/2+np.random.uniform(-2,2,3)
-          m=a.min(0)
-          M=a.max(0)
-          q=M-m
-          offset=-m+np.clip(full_scale-M+m-0.001,0,None)*np.random.rand(3)+np.clip(full_scale-M+m+0.001,None,0)*np.random.rand(3)
-          a+=offset
-          idxs=(a.min(1)>=0)*(a.max(1)<full_scale)
-          assert np.all(idxs), "some points are missed in val"
-          a=a[idxs]
-          b=b[idxs]
-          c=c[idxs]
-          a=torch.from_numpy(a).long()
-          locs.append(torch.cat([a,torch.LongTensor(a.shape[0],1).fill_(idx)],1))
-          feats.append(torch.from_numpy(b))
-          labels.append(torch.from_numpy(c))
-          point_ids.append(torch.from_numpy(np.nonzero(idxs)[0]+valOffsets[i]))
-      locs=torch.cat(locs,0)
-      feats=torch.cat(feats,0)
-      labels=torch.cat(labels,0)
-      point_ids=torch.cat(point_ids,0)
-      return {'x': [locs,feats], 'y': labels.long(), 'id': tbl, 'point_ids': point_ids}
-  val_data_loader = torch.utils.data.DataLoader(
-      list(range(len(val))),batch_size=batch_size, collate_fn=valMerge, num_workers=20,shuffle=True)
-
-  if is_train:
-    return train_data_loader
-  else:
-    return val_data_loader
+  dataset_ = ScanNetDataset('train' if is_train else 'val', cfg)
+  print(('Training' if is_train else 'Validation') + ' examples:', len(dataset_))
+  return torch.utils.data.DataLoader(
+      dataset_, batch_size=batch_size, collate_fn=scannet_merge,
+      num_workers=cfg.DATALOADER.NUM_WORKERS, shuffle=True, worker_init_fn=worker_init_fn)
 
 
 def locations_to_position(locations, voxel_scale):
@@ -7,9 +7,18 @@ import numpy as np
 PATH = '/DS/SUNCG/suncg_v1_torch_splited/houses'
 
 def cal_connection_label(corners, thres=0.1):
-  dif = corners.reshape([-1,1,3]) - corners.reshape([1,-1,3])
-  dis = np.linalg.norm(dif, axis=2)
-  connect_num = np.sum(dis < thres, axis=0)
+  '''
+  connect_num: the number of corners closer than thres to each corner,
+  itself included. By a kd-tree pair query instead of the dense distance
+  matrix, the largest float below thres keeps the comparison strict.
+  '''
+  from scipy.spatial import cKDTree
+  corners = corners.reshape([-1,3])
+  connect_num = np.ones(corners.shape[0], dtype=np.int64)
+  if corners.shape[0] < 2:
+    return connect_num
+  pairs = cKDTree(corners).query_pairs(np.nextafter(thres, 0), output_type='ndarray')
+  connect_num += np.bincount(pairs.reshape([-1]), minlength=corners.shape[0])
   return connect_num
 
 def gen_junction_labels(pth_fn):
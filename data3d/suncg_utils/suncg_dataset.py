@@ -2,6 +2,7 @@ import torch
 from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
 from .suncg_metas import SUNCG_METAS
 from .scene_samples import SceneSamples
+from .suncg_stats import SuncgStats, STATS_FN
 from utils3d.bbox3d_ops import Bbox3D
 import numpy as np
 import logging
@@ -20,9 +21,14 @@ ENABLE_POINTS_MISSED = DEBUG and True
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
 SuncgTorch_PATH = os.path.join(CUR_DIR, 'SuncgTorch')
 ELEMENTS_IDS = {'xyz':[0,1,2], 'color':[3,4,5], 'normal':[6,7,8]}
+BYTES_PER_POINT = 4 * 9
 
 class SUNCGDataset(torch.utils.data.Dataset):
-  def __init__(self, split, cfg):
+  def __init__(self, split, cfg, dset_path=SuncgTorch_PATH):
+    '''
+    dset_path: root of houses/ and train_test_splited/, e.g. a synthetic
+      dataset of synthetic_scenes.py
+    '''
     logger = logging.getLogger("maskrcnn_benchmark.input")
     self.is_train = is_train = split == 'train'
     self.scale = cfg.SPARSE3D.VOXEL_SCALE
@@ -38,8 +44,10 @@ class SUNCGDataset(torch.utils.data.Dataset):
 
     self.full_scale = np.array(full_scale)
     assert self.full_scale.shape == (3,)
+    # with tiled inference, the scene is cut to full_scale later
+    self.keep_all_points = (not is_train) and cfg.TEST.TILED
 
-    dset_path = SuncgTorch_PATH
+    self.dset_path = dset_path
     with open(f'{dset_path}/train_test_splited/{split}.txt') as f:
       scene_names = [l.strip() for l in f.readlines()]
     scene_names = rm_bad_samples( scene_names )
@@ -62,6 +70,33 @@ class SUNCGDataset(torch.utils.data.Dataset):
     info = f"{scene}/{basename}"
     return info
 
+  def get_points_nums(self):
+    '''
+    Point number of each file. Read from the stats table (suncg_stats.py) if
+    built, else from block_points_num in the summary of each splited house
+    (written by IndoorData.split_scene). For houses splited before it was
+    recorded, the file size is used as an estimation.
+    '''
+    stats_fn = os.path.join(self.dset_path, STATS_FN)
+    stats = SuncgStats.cached(stats_fn) if os.path.exists(stats_fn) else None
+    block_points_num = {}
+    points_nums = []
+    for fn in self.files:
+      house_dir = os.path.dirname(fn)
+      if house_dir not in block_points_num:
+        house_name = os.path.basename(house_dir)
+        if stats is not None and house_name in stats:
+          block_points_num[house_dir] = stats.block_points_num(house_name)
+        else:
+          block_points_num[house_dir] = dict(enumerate(read_block_points_num(house_dir)))
+      bpn = block_points_num[house_dir]
+      block_id = int(os.path.splitext(os.path.basename(fn))[0].split('_')[-1])
+      if bpn.get(block_id, -1) > 0:
+        points_nums.append(bpn[block_id])
+      else:
+        points_nums.append(os.path.getsize(fn) // BYTES_PER_POINT)
+    return points_nums
+
   def sampling(self, indices):
     self.files_org = self.files.copy()
     self.files =  [self.files[i] for i in indices]
@@ -156,6 +191,8 @@ class SUNCGDataset(torch.utils.data.Dataset):
         #---------------------------------------------------------------------
         assert a.min() >= 0, f"point location should not < 0: {a.min()}"
         up_check = np.all(a < full_scale[np.newaxis,:], 1)
+        if self.keep_all_points:
+            up_check[:] = True
         if not np.all(up_check):
             max_scale = a.max(0)
             print(f'file: {self.files[index]}')
@@ -266,6 +303,18 @@ def batch_scopes(location, voxel_scale):
   return scopes
 
 
+def read_block_points_num(house_dir):
+  summary_fn = os.path.join(house_dir, 'summary.txt')
+  if not os.path.exists(summary_fn):
+    return []
+  with open(summary_fn, 'r') as f:
+    for line in f:
+      items = line.split()
+      if len(items)>0 and items[0] == 'block_points_num:':
+        return [int(float(v)) for v in items[1:]]
+  return []
+
+
 def rm_bad_samples(scene_names):
   scene_names_new = []
   for sn in scene_names:
@@ -7,6 +7,7 @@ import numpy as np
 import open3d
 from collections import defaultdict
 from data3d.indoor_data_util import random_sample_pcl
+from data3d.ply_io import write_ply
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -737,10 +738,10 @@ def gen_pcl(house_fn):
 
       if gen_ply_each_image:
         pcd = open3d.PointCloud()
-        pcd.points = open3d.Vector3dVector(pcl_i)
+        pcd.points = open3d.Vector3dVector(pcl_i[:,0:3])
         base_name = os.path.basename(depth_fns[i]).replace('depth.png','pcl.ply')
         pcl_fn = os.path.join(pcl_path, base_name)
-        open3d.write_point_cloud(pcl_fn, pcd)
+        write_ply(pcl_fn, pcl_i[:,0:3], pcl_i[:,3:6])
         open3d.draw_geometries([pcd])
         import pdb; pdb.set_trace()  # XXX BREAKPOINT
         pass
@@ -764,7 +765,7 @@ def gen_pcl(house_fn):
     pcd = open3d.voxel_down_sample(pcd, voxel_size=0.02)
     new_num = np.asarray(pcd.points).shape[0]
     print(f'new point num: {new_num/1000.0} K')
-    open3d.write_point_cloud(pcl_fn, pcd)
+    write_ply(pcl_fn, np.asarray(pcd.points), np.asarray(pcd.colors))
     #open3d.draw_geometries([pcd])
 
     write_summary(parsed_dir, 'points_num', new_num, 'a')
@@ -1171,10 +1172,8 @@ def save_cam_ply(cam_fn=None, show=False, with_walls=True, with_pcl=True):
       open3d.draw_geometries(cam_cen_box + [cam_lines] + bboxes_lineset_ls)
 
   # save cam pos as ply
-  pcd = open3d.PointCloud()
-  pcd.points = open3d.Vector3dVector(cam_pos[:,0:3])
   cam_ply_fn = cam_fn+'_pos.ply'
-  open3d.write_point_cloud(cam_ply_fn, pcd)
+  write_ply(cam_ply_fn, cam_pos[:,0:3])
   #open3d.draw_geometries([pcd])
 
 
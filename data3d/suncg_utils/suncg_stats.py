@@ -0,0 +1,166 @@
+import os, glob
+import numpy as np
+from multiprocessing import Pool
+
+from data3d.ply_io import read_ply_header, iter_ply_vertices
+from utils3d.geometric_util import cam2world_pcl
+
+'''
+One stats table for all SUNCG houses, instead of the summary.txt of each house.
+Built in parallel from the ply headers and a streamed read of the vertices.
+  houses: one row per house, HOUSE_DTYPE
+  blocks: one row per splited block (pcl_{block_id}.pth), BLOCK_DTYPE, the
+          blocks of house i are blocks[block_start[i]: block_start[i]+block_num[i]]
+'''
+
+STATS_FN = 'suncg_stats.npz'
+STATS_CLASSES = ['wall', 'window', 'door', 'ceiling', 'floor', 'room']
+
+HOUSE_DTYPE = np.dtype([('name', 'U40'), ('level_num', np.int32), ('points_num', np.int64),
+                        ('xyz_min', np.float32, (3,)), ('xyz_max', np.float32, (3,)),
+                        ('scene_size', np.float32, (3,)), ('xyarea', np.float32),
+                        ('box_nums', np.int32, (len(STATS_CLASSES),)),
+                        ('block_start', np.int64), ('block_num', np.int64)])
+BLOCK_DTYPE = np.dtype([('house', np.int64), ('block_id', np.int32), ('points_num', np.int64)])
+
+
+def read_summary_items(base_dir, names):
+  '''
+  Only parse the needed items of summary.txt, as list of float
+  '''
+  summary_fn = os.path.join(base_dir, 'summary.txt')
+  items = {}
+  if not os.path.exists(summary_fn):
+    return items
+  with open(summary_fn, 'r') as f:
+    for line in f:
+      values = line.split()
+      if len(values) > 0 and values[0][:-1] in names:
+        items[values[0][:-1]] = [float(v) for v in values[1:]]
+  return items
+
+
+def ply_aabb(ply_fn, chunk_size=1<<20):
+  '''
+  point number and axis aligned bounding box in world frame, streamed
+  '''
+  header = read_ply_header(ply_fn)
+  points_num = header['elements'][0][1]
+  xyz_min = np.full(3, np.inf)
+  xyz_max = np.full(3, -np.inf)
+  for chunk in iter_ply_vertices(ply_fn, chunk_size, header):
+    if chunk.shape[0] == 0:
+      continue
+    xyz = np.stack([chunk['x'], chunk['y'], chunk['z']], 1)
+    xyz_min = np.minimum(xyz_min, xyz.min(0))
+    xyz_max = np.maximum(xyz_max, xyz.max(0))
+  if points_num == 0:
+    return 0, np.zeros(3), np.zeros(3)
+  # transform the 8 corners of the camera frame box to world frame
+  corners = np.array([[xyz_min[0] if i & 1 == 0 else xyz_max[0],
+                       xyz_min[1] if i & 2 == 0 else xyz_max[1],
+                       xyz_min[2] if i & 4 == 0 else xyz_max[2]] for i in range(8)])
+  corners = cam2world_pcl(corners)
+  return points_num, corners.min(0), corners.max(0)
+
+
+def count_lines(fn):
+  with open(fn, 'r') as f:
+    return sum(1 for line in f if line.strip() != '')
+
+
+def house_stats(args):
+  '''
+  Stats of one house.
+  Returns: (house row without block_start, list of (block_id, points_num))
+  '''
+  house_name, parsed_dir, splited_dir = args
+  summary = read_summary_items(parsed_dir, ['level_num'])
+  level_num = int(summary['level_num'][0]) if 'level_num' in summary else -1
+
+  pcl_fn = os.path.join(parsed_dir, 'pcl_camref.ply')
+  if os.path.exists(pcl_fn):
+    points_num, xyz_min, xyz_max = ply_aabb(pcl_fn)
+  else:
+    points_num, xyz_min, xyz_max = 0, np.zeros(3), np.zeros(3)
+  scene_size = xyz_max - xyz_min
+  xyarea = scene_size[0] * scene_size[1]
+
+  box_nums = []
+  for obj in STATS_CLASSES:
+    bbox_fn = os.path.join(parsed_dir, f'object_bbox/{obj}.txt')
+    box_nums.append(count_lines(bbox_fn) if os.path.exists(bbox_fn) else 0)
+
+  blocks = []
+  if splited_dir is not None:
+    bpn = read_summary_items(splited_dir, ['block_points_num']).get('block_points_num', [])
+    for fn in glob.glob(os.path.join(splited_dir, 'pcl_*.pth')):
+      block_id = int(os.path.splitext(os.path.basename(fn))[0].split('_')[-1])
+      pn = int(bpn[block_id]) if block_id < len(bpn) else -1
+      blocks.append((block_id, pn))
+    blocks.sort()
+  house = (house_name, level_num, points_num, xyz_min, xyz_max, scene_size, xyarea, box_nums)
+  return house, blocks
+
+
+def build_suncg_stats(house_names, parsed_root, splited_root=None, out_fn=None, processes=8):
+  '''
+  parsed_root: {parsed_root}/{house_name}/pcl_camref.ply, object_bbox/, summary.txt
+  splited_root: {splited_root}/{house_name}/pcl_*.pth, summary.txt (optional)
+  out_fn: default {splited_root}/../suncg_stats.npz
+  '''
+  args = [(hn, os.path.join(parsed_root, hn),
+           None if splited_root is None else os.path.join(splited_root, hn))
+          for hn in house_names]
+  houses = np.zeros(len(args), dtype=HOUSE_DTYPE)
+  blocks = []
+  with Pool(processes) as pool:
+    for i, (house, blocks_i) in enumerate(pool.imap(house_stats, args, chunksize=8)):
+      houses[i] = house + (len(blocks), len(blocks_i))
+      blocks += [(i, b, pn) for b, pn in blocks_i]
+      if i % 500 == 0:
+        print(f'stats {i} / {len(args)}')
+  blocks = np.array(blocks, dtype=BLOCK_DTYPE)
+
+  if out_fn is None:
+    out_fn = os.path.join(os.path.dirname(os.path.abspath(splited_root)), STATS_FN)
+  np.savez(out_fn, houses=houses, blocks=blocks, classes=np.array(STATS_CLASSES))
+  print(f'save {out_fn}')
+  return out_fn
+
+
+class SuncgStats():
+  '''
+  Query the stats table of build_suncg_stats by house name in O(1).
+  '''
+  _cache = {}
+
+  def __init__(self, stats_fn):
+    data = np.load(stats_fn)
+    self.houses = data['houses']
+    self.blocks = data['blocks']
+    self.classes = list(data['classes'])
+    self.house_ids = {n: i for i, n in enumerate(self.houses['name'])}
+
+  @classmethod
+  def cached(cls, stats_fn):
+    if stats_fn not in cls._cache:
+      cls._cache[stats_fn] = cls(stats_fn)
+    return cls._cache[stats_fn]
+
+  def __contains__(self, house_name):
+    return house_name in self.house_ids
+
+  def house(self, house_name):
+    return self.houses[self.house_ids[house_name]]
+
+  def box_num(self, house_name, obj):
+    return self.house(house_name)['box_nums'][self.classes.index(obj)]
+
+  def block_points_num(self, house_name):
+    '''
+    dict block_id -> point number (-1 unknown)
+    '''
+    h = self.house(house_name)
+    blocks = self.blocks[h['block_start']: h['block_start'] + h['block_num']]
+    return dict(zip(blocks['block_id'].tolist(), blocks['points_num'].tolist()))
@@ -0,0 +1,203 @@
+'''
+Deterministic synthetic houses in the format of SuncgTorch (SUNCGDataset),
+to test and benchmark without the SUNCG data.
+
+A house is a grid of rectangular rooms, with walls, a floor, a ceiling and
+a room box per room, doors in the interior walls, windows in the exterior
+walls, and some furniture. The furniture has points but no boxes, as in
+SUNCG. Points are sampled on the box surfaces: [xyz, color, normal] float32.
+Boxes are standard: [xc, yc, zc, x_size, y_size, z_size, yaw], up_axis='Z'.
+
+python data3d/suncg_utils/synthetic_scenes.py --out /tmp/SynthTorch --houses 8
+'''
+import os
+import numpy as np
+import torch
+
+WALL_HEIGHT = 2.8
+WALL_THICKNESS = 0.12
+DOOR_SIZE = (0.9, 2.1)
+WINDOW_SIZE = (1.2, 1.2)
+WINDOW_BOTTOM = 0.9
+OBJ_COLORS = {'wall':[0.8,0.8,0.75], 'floor':[0.55,0.4,0.3], 'ceiling':[0.95,0.95,0.95],
+              'door':[0.6,0.45,0.25], 'window':[0.5,0.7,0.9], 'furniture':[0.4,0.4,0.5]}
+
+
+def box_surface_points(box, density, rng, faces=(0,1,2,3,4,5)):
+  '''
+  box: standard [7], yaw of 0 or pi/2 keeps the sampling independent of the
+    yaw direction convention
+  faces: 0,1: -x,+x  2,3: -y,+y  4,5: -z,+z of the box frame
+  Returns points [n,3], normals [n,3]
+  '''
+  center = box[0:3]
+  size = box[3:6]
+  c, s = np.cos(box[6]), np.sin(box[6])
+  rot = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+  points, normals = [], []
+  for f in faces:
+    axis, sign = f // 2, f % 2 * 2 - 1
+    others = [a for a in range(3) if a != axis]
+    n = int(round(size[others[0]] * size[others[1]] * density))
+    if n == 0:
+      continue
+    local = (rng.rand(n, 3) - 0.5) * size
+    local[:, axis] = sign * size[axis] * 0.5
+    normal = np.zeros((n, 3))
+    normal[:, axis] = sign
+    points.append(local.dot(rot.T) + center)
+    normals.append(normal.dot(rot.T))
+  if len(points) == 0:
+    return np.zeros((0,3)), np.zeros((0,3))
+  return np.concatenate(points, 0), np.concatenate(normals, 0)
+
+
+def points_in_aligned_boxes(points, boxes, margin):
+  # boxes with yaw 0 or pi/2 only
+  mask = np.zeros(points.shape[0], dtype=np.bool_)
+  for b in boxes:
+    size = b[3:6].copy()
+    if abs(np.sin(b[6])) > 0.5:
+      size[0:2] = size[[1,0]]
+    mask |= np.all(np.abs(points - b[0:3]) <= size * 0.5 + margin, 1)
+  return mask
+
+
+def wall_segments(xs, ys):
+  '''
+  The walls of a grid of rooms, between the grid nodes.
+  Returns [(box, is_exterior)]
+  '''
+  t, h = WALL_THICKNESS, WALL_HEIGHT
+  walls = []
+  for i, x in enumerate(xs):
+    for j in range(len(ys) - 1):
+      y0, y1 = ys[j], ys[j+1]
+      box = np.array([x, (y0+y1)/2, h/2, y1-y0+t, t, h, np.pi/2])
+      walls.append((box, i in (0, len(xs)-1)))
+  for j, y in enumerate(ys):
+    for i in range(len(xs) - 1):
+      x0, x1 = xs[i], xs[i+1]
+      box = np.array([(x0+x1)/2, y, h/2, x1-x0+t, t, h, 0])
+      walls.append((box, j in (0, len(ys)-1)))
+  return walls
+
+
+def opening_in_wall(wall, width, height, bottom, rng):
+  # a box of the wall thickness, at a random position along the wall
+  length = wall[3] - 2 * WALL_THICKNESS
+  if length < width + 0.4:
+    return None
+  along = (rng.rand() - 0.5) * (length - width - 0.4)
+  box = wall.copy()
+  box[0] += along * np.cos(wall[6])
+  box[1] += along * np.sin(wall[6])
+  box[2] = bottom + height / 2
+  box[3:6] = [width, WALL_THICKNESS, height]
+  return box
+
+
+def gen_synthetic_house(seed, rooms_xy=(2,2), room_size=(3.0,6.0), density=200.0,
+                        furniture_per_room=3, door_rate=0.8, window_rate=0.6):
+  '''
+  density: points per square meter of surface
+  Returns:
+    pcl: [n,9] float32, [xyz, color, normal]
+    bboxes: dict of standard boxes [k,7] float32, for wall, window, door,
+      floor, ceiling and room
+  '''
+  rng = np.random.RandomState(seed)
+  xs = np.concatenate([[0], np.cumsum(rng.uniform(*room_size, size=rooms_xy[0]))])
+  ys = np.concatenate([[0], np.cumsum(rng.uniform(*room_size, size=rooms_xy[1]))])
+  h = WALL_HEIGHT
+
+  bboxes = {k: [] for k in ['wall', 'window', 'door', 'floor', 'ceiling', 'room']}
+  for wall, exterior in wall_segments(xs, ys):
+    bboxes['wall'].append(wall)
+    if exterior and rng.rand() < window_rate:
+      opening = opening_in_wall(wall, WINDOW_SIZE[0], WINDOW_SIZE[1], WINDOW_BOTTOM, rng)
+      if opening is not None:
+        bboxes['window'].append(opening)
+    elif not exterior and rng.rand() < door_rate:
+      opening = opening_in_wall(wall, DOOR_SIZE[0], DOOR_SIZE[1], 0, rng)
+      if opening is not None:
+        bboxes['door'].append(opening)
+
+  furnitures = []
+  for i in range(rooms_xy[0]):
+    for j in range(rooms_xy[1]):
+      x0, x1, y0, y1 = xs[i], xs[i+1], ys[j], ys[j+1]
+      ctr = [(x0+x1)/2, (y0+y1)/2]
+      bboxes['floor'].append(np.array(ctr + [-0.05, x1-x0, y1-y0, 0.1, 0]))
+      bboxes['ceiling'].append(np.array(ctr + [h+0.05, x1-x0, y1-y0, 0.1, 0]))
+      bboxes['room'].append(np.array(ctr + [h/2, x1-x0, y1-y0, h, 0]))
+      for _ in range(furniture_per_room):
+        size = rng.uniform([0.4, 0.4, 0.4], [1.8, 1.0, 1.2])
+        margin = size[0:2].max() / 2 + WALL_THICKNESS
+        fx = rng.uniform(x0 + margin, x1 - margin)
+        fy = rng.uniform(y0 + margin, y1 - margin)
+        yaw = rng.randint(2) * np.pi / 2
+        furnitures.append(np.array([fx, fy, size[2]/2, size[0], size[1], size[2], yaw]))
+  bboxes = {k: np.array(v, dtype=np.float32).reshape([-1,7]) for k, v in bboxes.items()}
+
+  openings = np.concatenate([bboxes['window'], bboxes['door']], 0)
+  parts = []
+  def add(points, normals, color):
+    colors = np.clip(np.array(color) + rng.randn(points.shape[0], 3) * 0.03, 0, 1)
+    parts.append(np.concatenate([points, colors, normals], 1))
+
+  for wall in bboxes['wall']:
+    points, normals = box_surface_points(wall, density, rng, faces=(2,3))
+    keep = ~points_in_aligned_boxes(points, openings, 0.01)
+    add(points[keep], normals[keep], OBJ_COLORS['wall'])
+  for obj in ['door', 'window']:
+    for box in bboxes[obj]:
+      add(*box_surface_points(box, density, rng, faces=(2,3)), OBJ_COLORS[obj])
+  for box in bboxes['floor']:
+    add(*box_surface_points(box, density, rng, faces=(5,)), OBJ_COLORS['floor'])
+  for box in bboxes['ceiling']:
+    add(*box_surface_points(box, density, rng, faces=(4,)), OBJ_COLORS['ceiling'])
+  for box in furnitures:
+    add(*box_surface_points(box, density, rng, faces=(0,1,2,3,5)), OBJ_COLORS['furniture'])
+  pcl = np.concatenate(parts, 0).astype(np.float32)
+  return pcl, bboxes
+
+
+def write_synthetic_dataset(out_dir, houses_num, split='val', seed=0, **kwargs):
+  '''
+  Write houses_num houses in the format of SuncgTorch:
+    out_dir/houses/<house>/pcl_0.pth: (pcl, bboxes)
+    out_dir/houses/<house>/summary.txt: split_num, block_points_num
+    out_dir/train_test_splited/<split>.txt
+  House i is gen_synthetic_house(seed + i, **kwargs).
+  Returns the house names.
+  '''
+  names = []
+  for i in range(houses_num):
+    name = f'synthetic_{seed + i:06d}'
+    house_dir = os.path.join(out_dir, 'houses', name)
+    os.makedirs(house_dir, exist_ok=True)
+    pcl, bboxes = gen_synthetic_house(seed + i, **kwargs)
+    torch.save((pcl, bboxes), os.path.join(house_dir, 'pcl_0.pth'))
+    with open(os.path.join(house_dir, 'summary.txt'), 'w') as f:
+      f.write('split_num: 1\n')
+      f.write(f'block_points_num: {pcl.shape[0]}\n')
+    names.append(name)
+  split_dir = os.path.join(out_dir, 'train_test_splited')
+  os.makedirs(split_dir, exist_ok=True)
+  with open(os.path.join(split_dir, f'{split}.txt'), 'w') as f:
+    f.write('\n'.join(names) + '\n')
+  return names
+
+
+if __name__ == '__main__':
+  import argparse
+  parser = argparse.ArgumentParser(description="write synthetic houses in the SuncgTorch format")
+  parser.add_argument("--out", required=True)
+  parser.add_argument("--houses", type=int, default=8)
+  parser.add_argument("--split", default='val')
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--density", type=float, default=200.0)
+  args = parser.parse_args()
+  names = write_synthetic_dataset(args.out, args.houses, args.split, args.seed, density=args.density)
+  print(f'{len(names)} houses written in {args.out}')
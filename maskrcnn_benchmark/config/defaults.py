@@ -23,6 +23,19 @@ _C = CN()
 _C.DEBUG = CN()
 _C.DEBUG.eval_in_train = 10
 _C.DEBUG.eval_in_train_per_iter = -1
+# max number of scenes kept (reservoir sampled) for the evaluation in training
+_C.DEBUG.eval_in_train_max_scenes = 500
+# autograd anomaly detection in backward, very slow
+_C.DEBUG.DETECT_ANOMALY = False
+# Check the losses for nan at each iteration (a synchronization) and stop in
+# pdb. If off, the gradients of a non-finite loss iteration are zeroed on the
+# device before the optimizer step, and these iterations are counted and logged
+_C.DEBUG.CHECK_NAN = False
+# time and peak memory of the stages of each training iteration, logged as
+# prof_<stage>_ms / prof_<stage>_mb. The first PROFILE_TRACE_ITERS iterations
+# are written to OUTPUT_DIR/profile_trace_rank<r>.json (chrome trace).
+_C.DEBUG.PROFILE = False
+_C.DEBUG.PROFILE_TRACE_ITERS = 20
 
 _C.MODEL = CN()
 _C.MODEL.RPN_ONLY = False
@@ -44,6 +57,7 @@ _C.MODEL.SEPARATE_RPN = True
 _C.SPARSE3D = CN()
 _C.SPARSE3D.VOXEL_SCALE = 50
 _C.SPARSE3D.VOXEL_FULL_SCALE = [1536, 1536, 320]
+# number of augmented copies of TEST.TTA, at most 8
 _C.SPARSE3D.VAL_REPS = 3
 _C.SPARSE3D.RESIDUAL_BLOCK = True
 _C.SPARSE3D.BLOCK_REPS = 1
@@ -51,6 +65,12 @@ _C.SPARSE3D.nPlaneMap = 128
 _C.SPARSE3D.nPlanesFront = [32, 64, 64, 128, 128, 128, 256, 256, 256, 256]
 _C.SPARSE3D.KERNEL = [[2,2,4], [2,2,4], [2,2,4], [1,1,4], [2,2,4], [2,2,1], [2,2,1],[2,2,1],[2,2,1]]
 _C.SPARSE3D.STRIDE = [[2,2,2], [2,2,4], [2,2,4], [1,1,4], [2,2,1], [2,2,1], [2,2,1],[2,2,1],[2,2,1]]
+# Recompute backbone activations in backward to save memory:
+# 'none', 'fine', 'downs', 'all', 'custom' (see sparseconvnet/fpn_net.py checkpoint_stages)
+_C.SPARSE3D.ACTIVATION_CHECKPOINT = 'none'
+# ids of m_downs and m_ups to checkpoint, only used by 'custom'
+_C.SPARSE3D.CHECKPOINT_DOWNS = []
+_C.SPARSE3D.CHECKPOINT_UPS = []
 # -----------------------------------------------------------------------------
 # INPUT
 # -----------------------------------------------------------------------------
@@ -95,6 +115,11 @@ _C.DATALOADER.SIZE_DIVISIBILITY = 0
 # is compatible. This groups portrait images together, and landscape images
 # are not batched with portrait images.
 _C.DATALOADER.ASPECT_RATIO_GROUPING = True
+# Balance the point number of the batches between ranks and put scenes of
+# similar point number in the same step. Always used when distributed.
+_C.DATALOADER.SIZE_BALANCED = False
+# The scenes of BUCKET_STEPS steps are sorted by point number together
+_C.DATALOADER.BUCKET_STEPS = 50
 
 # ---------------------------------------------------------------------------- #
 # Backbone options
@@ -205,6 +230,14 @@ _C.MODEL.ROI_HEADS.SCORE_THRESH = 0.05
 # IoU >= this threshold)
 _C.MODEL.ROI_HEADS.NMS = 0.45 # 0.5
 _C.MODEL.ROI_HEADS.NMS_AUG_THICKNESS_Y_Z = [0.2,0.2]
+# Suppression of the final boxes, by class: "nms", "soft_linear",
+# "soft_gaussian" (soft-nms decay of the scores instead of removal) or "wbf"
+# (weighted box fusion of the clusters). NMS is the iou threshold of all of
+# them, except soft_gaussian that uses SOFT_NMS_SIGMA
+_C.MODEL.ROI_HEADS.NMS_METHOD = "nms"
+_C.MODEL.ROI_HEADS.SOFT_NMS_SIGMA = 0.5
+# Boxes with a soft-nms decayed score below are removed
+_C.MODEL.ROI_HEADS.SOFT_NMS_SCORE_THRESH = 0.001
 # Maximum number of detections to return per image (100 is based on the limit
 # established for the COCO dataset)
 _C.MODEL.ROI_HEADS.DETECTIONS_PER_IMG = 200
@@ -283,6 +316,10 @@ _C.SOLVER.MOMENTUM = 0.9
 _C.SOLVER.BN_MOMENTUM = 0.95
 _C.SOLVER.TRACK_RUNNING_STATS = True
 
+# Mixed precision for the dense heads: AMP_DTYPE 'float16' (with dynamic loss scaling) or 'bfloat16'
+_C.SOLVER.AMP = False
+_C.SOLVER.AMP_DTYPE = "float16"
+
 _C.SOLVER.WEIGHT_DECAY = 0.0005
 _C.SOLVER.WEIGHT_DECAY_BIAS = 0
 
@@ -294,6 +331,15 @@ _C.SOLVER.WARMUP_EPOCHS = 0.5
 _C.SOLVER.WARMUP_METHOD = "linear"
 
 _C.SOLVER.CHECKPOINT_PERIOD_EPOCHS = 20
+# Write checkpoints from a background thread, training is only blocked by
+# copying the state to cpu, and when CHECKPOINT_MAX_IN_FLIGHT saves are pending
+_C.SOLVER.ASYNC_CHECKPOINT = False
+_C.SOLVER.CHECKPOINT_MAX_IN_FLIGHT = 1
+# If > 0, only keep the last CHECKPOINT_KEEP_LAST periodic model_xxxxxxx.pth
+_C.SOLVER.CHECKPOINT_KEEP_LAST = 0
+# Log every LOG_PERIOD iterations, the losses are only read from the device
+# (a synchronization) when logged
+_C.SOLVER.LOG_PERIOD = 20
 
 # Number of images per batch
 # This is global, so if we have 8 GPUs and IMS_PER_BATCH = 16, each GPU will
@@ -318,6 +364,25 @@ _C.TEST.IMS_PER_BATCH = 8
 _C.TEST.IOU_THRESHOLD = 0.2
 _C.TEST.EVAL_AUG_THICKNESS_Y_TAR_ANC = [0.2,0.2]
 _C.TEST.EVAL_AUG_THICKNESS_Z_TAR_ANC = [0.2,0.2]
+# Extra evaluation of the same predictions for every (iou threshold, aug
+# thickness) pair. The ious are computed once per aug thickness. Each aug
+# thickness value is used for target and anchor, Y and Z. Empty: disabled.
+_C.TEST.SWEEP_IOU_THRESHOLDS = []
+_C.TEST.SWEEP_EVAL_AUG_THICKNESS = []
+# Tiled inference of whole scenes: the points beyond SPARSE3D.VOXEL_FULL_SCALE
+# are kept, each scene is cut into overlapping tiles of at most
+# VOXEL_FULL_SCALE voxels, TILES_PER_BATCH tiles are run in one batch and the
+# detections of all the tiles are merged by rotated nms of each label.
+_C.TEST.TILED = False
+# overlap of neighbouring tiles (meter), should cover the largest object
+_C.TEST.TILE_OVERLAP = 2.0
+_C.TEST.TILES_PER_BATCH = 4
+_C.TEST.TILE_NMS_THRESH = 0.5
+# Test time augmentation: SPARSE3D.VAL_REPS flipped / rotated copies of each
+# scene are run in one batch, the boxes of the copies are mapped back and
+# fused by rotated weighted box fusion of each label. Not used with TILED.
+_C.TEST.TTA = False
+_C.TEST.TTA_FUSION_IOU = 0.55
 # ---------------------------------------------------------------------------- #
 # Misc options
 # ---------------------------------------------------------------------------- #
@@ -21,8 +21,7 @@ at::Tensor ROIAlignRotated_forward(const at::Tensor& input,
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  //return ROIAlignRotated_forward_cpu(input, rois, spatial_scale, pooled_height, pooled_width, sampling_ratio);
-  AT_ERROR("Not implemented on the CPU");
+  return ROIAlignRotated_forward_cpu(input, rois, spatial_scale, pooled_height, pooled_width, sampling_ratio);
 }
 
 at::Tensor ROIAlignRotated_backward(const at::Tensor& grad,
@@ -42,6 +41,6 @@ at::Tensor ROIAlignRotated_backward(const at::Tensor& grad,
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return ROIAlignRotated_backward_cpu(grad, rois, spatial_scale, pooled_height, pooled_width, batch_size, channels, height, width, sampling_ratio);
 }
 
@@ -22,7 +22,7 @@ at::Tensor ROIAlignRotated3D_forward(const at::Tensor& input,
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return ROIAlignRotated3D_forward_cpu(input, rois, spatial_scale, pooled_height, pooled_width, pooled_zsize, sampling_ratio);
 }
 
 at::Tensor ROIAlignRotated3D_backward(const at::Tensor& grad,
@@ -44,6 +44,6 @@ at::Tensor ROIAlignRotated3D_backward(const at::Tensor& grad,
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return ROIAlignRotated3D_backward_cpu(grad, rois, spatial_scale, pooled_height, pooled_width, pooled_zsize, batch_size, channels, height, width, zsize, sampling_ratio);
 }
 
@@ -20,7 +20,7 @@ at::Tensor SigmoidFocalLoss_forward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return SigmoidFocalLoss_forward_cpu(logits, targets, num_classes, gamma, alpha);
 }
 
 at::Tensor SigmoidFocalLoss_backward(
@@ -37,5 +37,5 @@ at::Tensor SigmoidFocalLoss_backward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return SigmoidFocalLoss_backward_cpu(logits, targets, d_losses, num_classes, gamma, alpha);
 }
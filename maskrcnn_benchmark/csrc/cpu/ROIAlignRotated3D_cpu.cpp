@@ -0,0 +1,373 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+#include "cpu/vision.h"
+#include <cmath>
+
+// same sampling as cuda/ROIAlignRotated3D_cuda.cu, with the indices and
+// weights of the sampling points precalculated once per roi, as in
+// ROIAlign_cpu.cpp, and shared by all the channels
+template <typename T>
+struct PreCalc3D {
+  int pos[8];
+  T w[8];
+};
+
+template <typename T>
+void pre_calc_for_trilinear_interpolate(
+    const int height,
+    const int width,
+    const int zsize,
+    const int pooled_height,
+    const int pooled_width,
+    const int pooled_zsize,
+    const int roi_bin_grid_h,
+    const int roi_bin_grid_w,
+    const int roi_bin_grid_z,
+    T roi_start_h,
+    T roi_start_w,
+    T roi_start_z,
+    T bin_size_h,
+    T bin_size_w,
+    T bin_size_z,
+    T roi_center_h,
+    T roi_center_w,
+    T roi_center_z,
+    T cosTheta,
+    T sinTheta,
+    std::vector<PreCalc3D<T>>& pre_calc) {
+  int pre_calc_index = 0;
+  for (int ph = 0; ph < pooled_height; ph++) {
+    for (int pw = 0; pw < pooled_width; pw++) {
+      for (int pz = 0; pz < pooled_zsize; pz++) {
+        for (int iy = 0; iy < roi_bin_grid_h; iy++) {
+          const T yy = roi_start_h + ph * bin_size_h +
+              static_cast<T>(iy + .5f) * bin_size_h / static_cast<T>(roi_bin_grid_h);
+          for (int ix = 0; ix < roi_bin_grid_w; ix++) {
+            const T xx = roi_start_w + pw * bin_size_w +
+                static_cast<T>(ix + .5f) * bin_size_w / static_cast<T>(roi_bin_grid_w);
+            for (int iz = 0; iz < roi_bin_grid_z; iz++) {
+              const T zz = roi_start_z + pz * bin_size_z +
+                  static_cast<T>(iz + .5f) * bin_size_z / static_cast<T>(roi_bin_grid_z);
+
+              // Rotate by theta around the center and translate
+              T x = xx * cosTheta + yy * sinTheta + roi_center_w;
+              T y = yy * cosTheta - xx * sinTheta + roi_center_h;
+              T z = zz + roi_center_z;
+
+              PreCalc3D<T>& pc = pre_calc[pre_calc_index];
+              pre_calc_index += 1;
+
+              // deal with: inverse elements are out of feature map boundary
+              if (y < -1.0 || y > height || x < -1.0 || x > width || z < -1.0 || z > zsize) {
+                // empty
+                for (int k = 0; k < 8; k++) {
+                  pc.pos[k] = 0;
+                  pc.w[k] = 0;
+                }
+                continue;
+              }
+
+              if (y <= 0) y = 0;
+              if (x <= 0) x = 0;
+              if (z <= 0) z = 0;
+
+              int y_low = (int)y;
+              int x_low = (int)x;
+              int z_low = (int)z;
+              int y_high;
+              int x_high;
+              int z_high;
+
+              if (y_low >= height - 1) {
+                y_high = y_low = height - 1;
+                y = (T)y_low;
+              } else {
+                y_high = y_low + 1;
+              }
+
+              if (x_low >= width - 1) {
+                x_high = x_low = width - 1;
+                x = (T)x_low;
+              } else {
+                x_high = x_low + 1;
+              }
+
+              if (z_low >= zsize - 1) {
+                z_high = z_low = zsize - 1;
+                z = (T)z_low;
+              } else {
+                z_high = z_low + 1;
+              }
+
+              T ly = y - y_low;
+              T lx = x - x_low;
+              T lz = z - z_low;
+              T hy = 1. - ly, hx = 1. - lx, hz = 1. - lz;
+
+              // save weights and indeces
+              pc.pos[0] = y_low  * width * zsize + x_low  * zsize + z_low;
+              pc.pos[1] = y_low  * width * zsize + x_high * zsize + z_low;
+              pc.pos[2] = y_high * width * zsize + x_low  * zsize + z_low;
+              pc.pos[3] = y_high * width * zsize + x_high * zsize + z_low;
+              pc.pos[4] = y_low  * width * zsize + x_low  * zsize + z_high;
+              pc.pos[5] = y_low  * width * zsize + x_high * zsize + z_high;
+              pc.pos[6] = y_high * width * zsize + x_low  * zsize + z_high;
+              pc.pos[7] = y_high * width * zsize + x_high * zsize + z_high;
+              pc.w[0] = hy * hx * hz;
+              pc.w[1] = hy * lx * hz;
+              pc.w[2] = ly * hx * hz;
+              pc.w[3] = ly * lx * hz;
+              pc.w[4] = hy * hx * lz;
+              pc.w[5] = hy * lx * lz;
+              pc.w[6] = ly * hx * lz;
+              pc.w[7] = ly * lx * lz;
+            }
+          }
+        }
+      }
+    }
+  }
+}
+
+// roi geometry shared by forward and backward
+template <typename T>
+struct RoIRotated3D {
+  int batch_ind;
+  int roi_bin_grid_h;
+  int roi_bin_grid_w;
+  int roi_bin_grid_z;
+  T count;
+};
+
+template <typename T>
+RoIRotated3D<T> pre_calc_roi(
+    const T* offset_bottom_rois,
+    const T spatial_scale,
+    const int height,
+    const int width,
+    const int zsize,
+    const int pooled_height,
+    const int pooled_width,
+    const int pooled_zsize,
+    const int sampling_ratio,
+    std::vector<PreCalc3D<T>>& pre_calc) {
+  RoIRotated3D<T> roi;
+  roi.batch_ind = offset_bottom_rois[0];
+
+  // Do not round
+  T roi_center_w = offset_bottom_rois[1] * spatial_scale;
+  T roi_center_h = offset_bottom_rois[2] * spatial_scale;
+  T roi_center_z = offset_bottom_rois[3] * spatial_scale;
+  T roi_width = offset_bottom_rois[4] * spatial_scale;
+  T roi_height = offset_bottom_rois[5] * spatial_scale;
+  T roi_zsize = offset_bottom_rois[6] * spatial_scale;
+  T theta = offset_bottom_rois[7] * M_PI / 180.0;
+
+  // Force malformed ROIs to be 1x1
+  roi_width = std::max(roi_width, (T)1.);
+  roi_height = std::max(roi_height, (T)1.);
+  roi_zsize = std::max(roi_zsize, (T)1.);
+  T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+  T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+  T bin_size_z = static_cast<T>(roi_zsize) / static_cast<T>(pooled_zsize);
+
+  // We use roi_bin_grid to sample the grid and mimic integral
+  roi.roi_bin_grid_h = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_height / pooled_height);
+  roi.roi_bin_grid_w = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
+  roi.roi_bin_grid_z = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_zsize / pooled_zsize);
+
+  // We do average (integral) pooling inside a bin
+  roi.count = roi.roi_bin_grid_h * roi.roi_bin_grid_w * roi.roi_bin_grid_z;
+
+  pre_calc.resize(roi.roi_bin_grid_h * roi.roi_bin_grid_w * roi.roi_bin_grid_z *
+                  pooled_height * pooled_width * pooled_zsize);
+  // roi_start_h and roi_start_w are computed wrt the center of RoI (x, y).
+  pre_calc_for_trilinear_interpolate(
+      height, width, zsize,
+      pooled_height, pooled_width, pooled_zsize,
+      roi.roi_bin_grid_h, roi.roi_bin_grid_w, roi.roi_bin_grid_z,
+      -roi_height / 2, -roi_width / 2, -roi_zsize / 2,
+      bin_size_h, bin_size_w, bin_size_z,
+      roi_center_h, roi_center_w, roi_center_z,
+      (T)cos(theta), (T)sin(theta),
+      pre_calc);
+  return roi;
+}
+
+template <typename T>
+void ROIAlignRotated3DForward_cpu_kernel(
+    const int num_rois,
+    const T* bottom_data,
+    const T& spatial_scale,
+    const int channels,
+    const int height,
+    const int width,
+    const int zsize,
+    const int pooled_height,
+    const int pooled_width,
+    const int pooled_zsize,
+    const int sampling_ratio,
+    const T* bottom_rois,
+    T* top_data) {
+  const int pooled_size = pooled_height * pooled_width * pooled_zsize;
+  const int64_t map_size = (int64_t)height * width * zsize;
+
+  // each roi writes its own outputs
+  #pragma omp parallel for schedule(dynamic)
+  for (int n = 0; n < num_rois; n++) {
+    std::vector<PreCalc3D<T>> pre_calc;
+    RoIRotated3D<T> roi = pre_calc_roi(
+        bottom_rois + n * 8, spatial_scale, height, width, zsize,
+        pooled_height, pooled_width, pooled_zsize, sampling_ratio, pre_calc);
+    const int samples = roi.roi_bin_grid_h * roi.roi_bin_grid_w * roi.roi_bin_grid_z;
+
+    for (int c = 0; c < channels; c++) {
+      const T* offset_bottom_data =
+          bottom_data + (roi.batch_ind * channels + c) * map_size;
+      T* offset_top_data = top_data + ((int64_t)n * channels + c) * pooled_size;
+      const PreCalc3D<T>* pc = pre_calc.data();
+
+      for (int index = 0; index < pooled_size; index++) {
+        T output_val = 0.;
+        for (int s = 0; s < samples; s++, pc++) {
+          for (int k = 0; k < 8; k++) {
+            output_val += pc->w[k] * offset_bottom_data[pc->pos[k]];
+          }
+        }
+        offset_top_data[index] = output_val / roi.count;
+      }
+    }
+  }
+}
+
+template <typename T>
+void ROIAlignRotated3DBackward_cpu_kernel(
+    const int num_rois,
+    const T* top_diff,
+    const T& spatial_scale,
+    const int channels,
+    const int height,
+    const int width,
+    const int zsize,
+    const int pooled_height,
+    const int pooled_width,
+    const int pooled_zsize,
+    const int sampling_ratio,
+    T* bottom_diff,
+    const T* bottom_rois) {
+  const int pooled_size = pooled_height * pooled_width * pooled_zsize;
+  const int64_t map_size = (int64_t)height * width * zsize;
+  std::vector<PreCalc3D<T>> pre_calc;
+
+  // rois of one batch overlap in bottom_diff, while the channels do not:
+  // the rois are looped over, the channels of each roi run in parallel
+  for (int n = 0; n < num_rois; n++) {
+    RoIRotated3D<T> roi = pre_calc_roi(
+        bottom_rois + n * 8, spatial_scale, height, width, zsize,
+        pooled_height, pooled_width, pooled_zsize, sampling_ratio, pre_calc);
+    const int samples = roi.roi_bin_grid_h * roi.roi_bin_grid_w * roi.roi_bin_grid_z;
+
+    #pragma omp parallel for
+    for (int c = 0; c < channels; c++) {
+      T* offset_bottom_diff =
+          bottom_diff + (roi.batch_ind * channels + c) * map_size;
+      const T* offset_top_diff = top_diff + ((int64_t)n * channels + c) * pooled_size;
+      const PreCalc3D<T>* pc = pre_calc.data();
+
+      for (int index = 0; index < pooled_size; index++) {
+        const T top_diff_this_bin = offset_top_diff[index] / roi.count;
+        for (int s = 0; s < samples; s++, pc++) {
+          for (int k = 0; k < 8; k++) {
+            offset_bottom_diff[pc->pos[k]] += top_diff_this_bin * pc->w[k];
+          }
+        }
+      }
+    }
+  }
+}
+
+at::Tensor ROIAlignRotated3D_forward_cpu(const at::Tensor& input,
+                                         const at::Tensor& rois,
+                                         const float spatial_scale,
+                                         const int pooled_height,
+                                         const int pooled_width,
+                                         const int pooled_zsize,
+                                         const int sampling_ratio) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto channels = input.size(1);
+  auto height = input.size(2);
+  auto width = input.size(3);
+  auto zsize = input.size(4);
+
+  auto output = at::empty({num_rois, channels, pooled_height, pooled_width, pooled_zsize}, input.options());
+
+  if (output.numel() == 0) {
+    return output;
+  }
+
+  auto input_ = input.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(input.type(), "ROIAlignRotated3D_forward", [&] {
+    ROIAlignRotated3DForward_cpu_kernel<scalar_t>(
+         num_rois,
+         input_.data<scalar_t>(),
+         spatial_scale,
+         channels,
+         height,
+         width,
+         zsize,
+         pooled_height,
+         pooled_width,
+         pooled_zsize,
+         sampling_ratio,
+         rois_.data<scalar_t>(),
+         output.data<scalar_t>());
+  });
+  return output;
+}
+
+at::Tensor ROIAlignRotated3D_backward_cpu(const at::Tensor& grad,
+                                          const at::Tensor& rois,
+                                          const float spatial_scale,
+                                          const int pooled_height,
+                                          const int pooled_width,
+                                          const int pooled_zsize,
+                                          const int batch_size,
+                                          const int channels,
+                                          const int height,
+                                          const int width,
+                                          const int zsize,
+                                          const int sampling_ratio) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto grad_input = at::zeros({batch_size, channels, height, width, zsize}, grad.options());
+
+  // handle possibly empty gradients
+  if (grad.numel() == 0) {
+    return grad_input;
+  }
+
+  auto grad_ = grad.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "ROIAlignRotated3D_backward", [&] {
+    ROIAlignRotated3DBackward_cpu_kernel<scalar_t>(
+         num_rois,
+         grad_.data<scalar_t>(),
+         spatial_scale,
+         channels,
+         height,
+         width,
+         zsize,
+         pooled_height,
+         pooled_width,
+         pooled_zsize,
+         sampling_ratio,
+         grad_input.data<scalar_t>(),
+         rois_.data<scalar_t>());
+  });
+  return grad_input;
+}
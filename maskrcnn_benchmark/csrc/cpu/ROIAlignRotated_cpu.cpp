@@ -0,0 +1,319 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+#include "cpu/vision.h"
+#include <cmath>
+
+// same sampling as cuda/ROIAlignRotated_cuda.cu, with the indices and
+// weights of the sampling points precalculated once per roi, as in
+// ROIAlign_cpu.cpp, and shared by all the channels
+template <typename T>
+struct PreCalcRotated {
+  int pos[4];
+  T w[4];
+};
+
+template <typename T>
+void pre_calc_for_bilinear_interpolate_rotated(
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    const int roi_bin_grid_h,
+    const int roi_bin_grid_w,
+    T roi_start_h,
+    T roi_start_w,
+    T bin_size_h,
+    T bin_size_w,
+    T roi_center_h,
+    T roi_center_w,
+    T cosTheta,
+    T sinTheta,
+    std::vector<PreCalcRotated<T>>& pre_calc) {
+  int pre_calc_index = 0;
+  for (int ph = 0; ph < pooled_height; ph++) {
+    for (int pw = 0; pw < pooled_width; pw++) {
+      for (int iy = 0; iy < roi_bin_grid_h; iy++) {
+        const T yy = roi_start_h + ph * bin_size_h +
+            static_cast<T>(iy + .5f) * bin_size_h / static_cast<T>(roi_bin_grid_h);
+        for (int ix = 0; ix < roi_bin_grid_w; ix++) {
+          const T xx = roi_start_w + pw * bin_size_w +
+              static_cast<T>(ix + .5f) * bin_size_w / static_cast<T>(roi_bin_grid_w);
+
+          // Rotate by theta around the center and translate
+          T x = xx * cosTheta + yy * sinTheta + roi_center_w;
+          T y = yy * cosTheta - xx * sinTheta + roi_center_h;
+
+          PreCalcRotated<T>& pc = pre_calc[pre_calc_index];
+          pre_calc_index += 1;
+
+          // deal with: inverse elements are out of feature map boundary
+          if (y < -1.0 || y > height || x < -1.0 || x > width) {
+            // empty
+            for (int k = 0; k < 4; k++) {
+              pc.pos[k] = 0;
+              pc.w[k] = 0;
+            }
+            continue;
+          }
+
+          if (y <= 0) y = 0;
+          if (x <= 0) x = 0;
+
+          int y_low = (int)y;
+          int x_low = (int)x;
+          int y_high;
+          int x_high;
+
+          if (y_low >= height - 1) {
+            y_high = y_low = height - 1;
+            y = (T)y_low;
+          } else {
+            y_high = y_low + 1;
+          }
+
+          if (x_low >= width - 1) {
+            x_high = x_low = width - 1;
+            x = (T)x_low;
+          } else {
+            x_high = x_low + 1;
+          }
+
+          T ly = y - y_low;
+          T lx = x - x_low;
+          T hy = 1. - ly, hx = 1. - lx;
+
+          // save weights and indeces
+          pc.pos[0] = y_low * width + x_low;
+          pc.pos[1] = y_low * width + x_high;
+          pc.pos[2] = y_high * width + x_low;
+          pc.pos[3] = y_high * width + x_high;
+          pc.w[0] = hy * hx;
+          pc.w[1] = hy * lx;
+          pc.w[2] = ly * hx;
+          pc.w[3] = ly * lx;
+        }
+      }
+    }
+  }
+}
+
+// roi geometry shared by forward and backward
+template <typename T>
+struct RoIRotated {
+  int batch_ind;
+  int samples;
+  T count;
+};
+
+template <typename T>
+RoIRotated<T> pre_calc_roi_rotated(
+    const T* offset_bottom_rois,
+    const T spatial_scale,
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    const int sampling_ratio,
+    std::vector<PreCalcRotated<T>>& pre_calc) {
+  RoIRotated<T> roi;
+  roi.batch_ind = offset_bottom_rois[0];
+
+  // Do not round
+  T roi_center_w = offset_bottom_rois[1] * spatial_scale;
+  T roi_center_h = offset_bottom_rois[2] * spatial_scale;
+  T roi_width = offset_bottom_rois[3] * spatial_scale;
+  T roi_height = offset_bottom_rois[4] * spatial_scale;
+  T theta = offset_bottom_rois[5] * M_PI / 180.0;
+
+  // Force malformed ROIs to be 1x1
+  roi_width = std::max(roi_width, (T)1.);
+  roi_height = std::max(roi_height, (T)1.);
+  T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+  T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+
+  // We use roi_bin_grid to sample the grid and mimic integral
+  int roi_bin_grid_h = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_height / pooled_height);
+  int roi_bin_grid_w = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
+
+  // We do average (integral) pooling inside a bin
+  roi.samples = roi_bin_grid_h * roi_bin_grid_w;
+  roi.count = roi.samples;
+
+  pre_calc.resize(roi.samples * pooled_height * pooled_width);
+  // roi_start_h and roi_start_w are computed wrt the center of RoI (x, y).
+  pre_calc_for_bilinear_interpolate_rotated(
+      height, width, pooled_height, pooled_width,
+      roi_bin_grid_h, roi_bin_grid_w,
+      -roi_height / 2, -roi_width / 2,
+      bin_size_h, bin_size_w,
+      roi_center_h, roi_center_w,
+      (T)cos(theta), (T)sin(theta),
+      pre_calc);
+  return roi;
+}
+
+template <typename T>
+void ROIAlignRotatedForward_cpu_kernel(
+    const int num_rois,
+    const T* bottom_data,
+    const T& spatial_scale,
+    const int channels,
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    const int sampling_ratio,
+    const T* bottom_rois,
+    T* top_data) {
+  const int pooled_size = pooled_height * pooled_width;
+  const int64_t map_size = (int64_t)height * width;
+
+  // each roi writes its own outputs
+  #pragma omp parallel for schedule(dynamic)
+  for (int n = 0; n < num_rois; n++) {
+    std::vector<PreCalcRotated<T>> pre_calc;
+    RoIRotated<T> roi = pre_calc_roi_rotated(
+        bottom_rois + n * 6, spatial_scale, height, width,
+        pooled_height, pooled_width, sampling_ratio, pre_calc);
+
+    for (int c = 0; c < channels; c++) {
+      const T* offset_bottom_data =
+          bottom_data + (roi.batch_ind * channels + c) * map_size;
+      T* offset_top_data = top_data + ((int64_t)n * channels + c) * pooled_size;
+      const PreCalcRotated<T>* pc = pre_calc.data();
+
+      for (int index = 0; index < pooled_size; index++) {
+        T output_val = 0.;
+        for (int s = 0; s < roi.samples; s++, pc++) {
+          output_val += pc->w[0] * offset_bottom_data[pc->pos[0]] +
+              pc->w[1] * offset_bottom_data[pc->pos[1]] +
+              pc->w[2] * offset_bottom_data[pc->pos[2]] +
+              pc->w[3] * offset_bottom_data[pc->pos[3]];
+        }
+        offset_top_data[index] = output_val / roi.count;
+      }
+    }
+  }
+}
+
+template <typename T>
+void ROIAlignRotatedBackward_cpu_kernel(
+    const int num_rois,
+    const T* top_diff,
+    const T& spatial_scale,
+    const int channels,
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    const int sampling_ratio,
+    T* bottom_diff,
+    const T* bottom_rois) {
+  const int pooled_size = pooled_height * pooled_width;
+  const int64_t map_size = (int64_t)height * width;
+  std::vector<PreCalcRotated<T>> pre_calc;
+
+  // rois of one batch overlap in bottom_diff, while the channels do not:
+  // the rois are looped over, the channels of each roi run in parallel
+  for (int n = 0; n < num_rois; n++) {
+    RoIRotated<T> roi = pre_calc_roi_rotated(
+        bottom_rois + n * 6, spatial_scale, height, width,
+        pooled_height, pooled_width, sampling_ratio, pre_calc);
+
+    #pragma omp parallel for
+    for (int c = 0; c < channels; c++) {
+      T* offset_bottom_diff =
+          bottom_diff + (roi.batch_ind * channels + c) * map_size;
+      const T* offset_top_diff = top_diff + ((int64_t)n * channels + c) * pooled_size;
+      const PreCalcRotated<T>* pc = pre_calc.data();
+
+      for (int index = 0; index < pooled_size; index++) {
+        const T top_diff_this_bin = offset_top_diff[index] / roi.count;
+        for (int s = 0; s < roi.samples; s++, pc++) {
+          offset_bottom_diff[pc->pos[0]] += top_diff_this_bin * pc->w[0];
+          offset_bottom_diff[pc->pos[1]] += top_diff_this_bin * pc->w[1];
+          offset_bottom_diff[pc->pos[2]] += top_diff_this_bin * pc->w[2];
+          offset_bottom_diff[pc->pos[3]] += top_diff_this_bin * pc->w[3];
+        }
+      }
+    }
+  }
+}
+
+at::Tensor ROIAlignRotated_forward_cpu(const at::Tensor& input,
+                                       const at::Tensor& rois,
+                                       const float spatial_scale,
+                                       const int pooled_height,
+                                       const int pooled_width,
+                                       const int sampling_ratio) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto channels = input.size(1);
+  auto height = input.size(2);
+  auto width = input.size(3);
+
+  auto output = at::empty({num_rois, channels, pooled_height, pooled_width}, input.options());
+
+  if (output.numel() == 0) {
+    return output;
+  }
+
+  auto input_ = input.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(input.type(), "ROIAlignRotated_forward", [&] {
+    ROIAlignRotatedForward_cpu_kernel<scalar_t>(
+         num_rois,
+         input_.data<scalar_t>(),
+         spatial_scale,
+         channels,
+         height,
+         width,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois_.data<scalar_t>(),
+         output.data<scalar_t>());
+  });
+  return output;
+}
+
+at::Tensor ROIAlignRotated_backward_cpu(const at::Tensor& grad,
+                                        const at::Tensor& rois,
+                                        const float spatial_scale,
+                                        const int pooled_height,
+                                        const int pooled_width,
+                                        const int batch_size,
+                                        const int channels,
+                                        const int height,
+                                        const int width,
+                                        const int sampling_ratio) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto grad_input = at::zeros({batch_size, channels, height, width}, grad.options());
+
+  // handle possibly empty gradients
+  if (grad.numel() == 0) {
+    return grad_input;
+  }
+
+  auto grad_ = grad.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "ROIAlignRotated_backward", [&] {
+    ROIAlignRotatedBackward_cpu_kernel<scalar_t>(
+         num_rois,
+         grad_.data<scalar_t>(),
+         spatial_scale,
+         channels,
+         height,
+         width,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         grad_input.data<scalar_t>(),
+         rois_.data<scalar_t>());
+  });
+  return grad_input;
+}
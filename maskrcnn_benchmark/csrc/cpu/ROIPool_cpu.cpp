@@ -0,0 +1,191 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+#include "cpu/vision.h"
+#include <cfloat>
+#include <cmath>
+
+// same pooling as cuda/ROIPool_cuda.cu, the bins of one roi are computed
+// once and shared by all the channels
+template <typename T>
+void ROIPoolForward_cpu_kernel(
+    const int num_rois,
+    const T* bottom_data,
+    const T spatial_scale,
+    const int channels,
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    const T* bottom_rois,
+    T* top_data,
+    int* argmax_data) {
+  const int pooled_size = pooled_height * pooled_width;
+  const int64_t map_size = (int64_t)height * width;
+
+  // each roi writes its own outputs
+  #pragma omp parallel for schedule(dynamic)
+  for (int n = 0; n < num_rois; n++) {
+    const T* offset_bottom_rois = bottom_rois + n * 5;
+    int roi_batch_ind = offset_bottom_rois[0];
+    int roi_start_w = round(offset_bottom_rois[1] * spatial_scale);
+    int roi_start_h = round(offset_bottom_rois[2] * spatial_scale);
+    int roi_end_w = round(offset_bottom_rois[3] * spatial_scale);
+    int roi_end_h = round(offset_bottom_rois[4] * spatial_scale);
+
+    // Force malformed ROIs to be 1x1
+    int roi_width = std::max(roi_end_w - roi_start_w + 1, 1);
+    int roi_height = std::max(roi_end_h - roi_start_h + 1, 1);
+    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+
+    // bin bounds, with roi offsets and clipped to input boundaries
+    std::vector<int> hstart(pooled_height), hend(pooled_height);
+    std::vector<int> wstart(pooled_width), wend(pooled_width);
+    for (int ph = 0; ph < pooled_height; ph++) {
+      hstart[ph] = std::min(std::max(static_cast<int>(floor(static_cast<T>(ph) * bin_size_h)) + roi_start_h, 0), height);
+      hend[ph] = std::min(std::max(static_cast<int>(ceil(static_cast<T>(ph + 1) * bin_size_h)) + roi_start_h, 0), height);
+    }
+    for (int pw = 0; pw < pooled_width; pw++) {
+      wstart[pw] = std::min(std::max(static_cast<int>(floor(static_cast<T>(pw) * bin_size_w)) + roi_start_w, 0), width);
+      wend[pw] = std::min(std::max(static_cast<int>(ceil(static_cast<T>(pw + 1) * bin_size_w)) + roi_start_w, 0), width);
+    }
+
+    for (int c = 0; c < channels; c++) {
+      const T* offset_bottom_data =
+          bottom_data + (roi_batch_ind * channels + c) * map_size;
+      const int64_t top_offset = ((int64_t)n * channels + c) * pooled_size;
+
+      for (int ph = 0; ph < pooled_height; ph++) {
+        for (int pw = 0; pw < pooled_width; pw++) {
+          bool is_empty = (hend[ph] <= hstart[ph]) || (wend[pw] <= wstart[pw]);
+          // Define an empty pooling region to be zero
+          T maxval = is_empty ? 0 : -FLT_MAX;
+          // If nothing is pooled, argmax = -1 causes nothing to be backprop'd
+          int maxidx = -1;
+          for (int h = hstart[ph]; h < hend[ph]; ++h) {
+            for (int w = wstart[pw]; w < wend[pw]; ++w) {
+              int bottom_index = h * width + w;
+              if (offset_bottom_data[bottom_index] > maxval) {
+                maxval = offset_bottom_data[bottom_index];
+                maxidx = bottom_index;
+              }
+            }
+          }
+          top_data[top_offset + ph * pooled_width + pw] = maxval;
+          argmax_data[top_offset + ph * pooled_width + pw] = maxidx;
+        }
+      }
+    }
+  }
+}
+
+template <typename T>
+void ROIPoolBackward_cpu_kernel(
+    const int num_rois,
+    const T* top_diff,
+    const int* argmax_data,
+    const int channels,
+    const int height,
+    const int width,
+    const int pooled_height,
+    const int pooled_width,
+    T* bottom_diff,
+    const T* bottom_rois) {
+  const int pooled_size = pooled_height * pooled_width;
+  const int64_t map_size = (int64_t)height * width;
+
+  // rois of one batch overlap in bottom_diff, while the channels do not
+  #pragma omp parallel for
+  for (int c = 0; c < channels; c++) {
+    for (int n = 0; n < num_rois; n++) {
+      int roi_batch_ind = bottom_rois[n * 5];
+      T* offset_bottom_diff = bottom_diff + (roi_batch_ind * channels + c) * map_size;
+      const int64_t top_offset = ((int64_t)n * channels + c) * pooled_size;
+      for (int index = 0; index < pooled_size; index++) {
+        int argmax = argmax_data[top_offset + index];
+        if (argmax != -1) {
+          offset_bottom_diff[argmax] += top_diff[top_offset + index];
+        }
+      }
+    }
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor> ROIPool_forward_cpu(const at::Tensor& input,
+                                                       const at::Tensor& rois,
+                                                       const float spatial_scale,
+                                                       const int pooled_height,
+                                                       const int pooled_width) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto channels = input.size(1);
+  auto height = input.size(2);
+  auto width = input.size(3);
+
+  auto output = at::empty({num_rois, channels, pooled_height, pooled_width}, input.options());
+  auto argmax = at::zeros({num_rois, channels, pooled_height, pooled_width}, input.options().dtype(at::kInt));
+
+  if (output.numel() == 0) {
+    return std::make_tuple(output, argmax);
+  }
+
+  auto input_ = input.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(input.type(), "ROIPool_forward", [&] {
+    ROIPoolForward_cpu_kernel<scalar_t>(
+         num_rois,
+         input_.data<scalar_t>(),
+         spatial_scale,
+         channels,
+         height,
+         width,
+         pooled_height,
+         pooled_width,
+         rois_.data<scalar_t>(),
+         output.data<scalar_t>(),
+         argmax.data<int>());
+  });
+  return std::make_tuple(output, argmax);
+}
+
+at::Tensor ROIPool_backward_cpu(const at::Tensor& grad,
+                                const at::Tensor& input,
+                                const at::Tensor& rois,
+                                const at::Tensor& argmax,
+                                const float spatial_scale,
+                                const int pooled_height,
+                                const int pooled_width,
+                                const int batch_size,
+                                const int channels,
+                                const int height,
+                                const int width) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto grad_input = at::zeros({batch_size, channels, height, width}, grad.options());
+
+  // handle possibly empty gradients
+  if (grad.numel() == 0) {
+    return grad_input;
+  }
+
+  auto grad_ = grad.contiguous();
+  auto rois_ = rois.contiguous();
+  auto argmax_ = argmax.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "ROIPool_backward", [&] {
+    ROIPoolBackward_cpu_kernel<scalar_t>(
+         num_rois,
+         grad_.data<scalar_t>(),
+         argmax_.data<int>(),
+         channels,
+         height,
+         width,
+         pooled_height,
+         pooled_width,
+         grad_input.data<scalar_t>(),
+         rois_.data<scalar_t>());
+  });
+  return grad_input;
+}
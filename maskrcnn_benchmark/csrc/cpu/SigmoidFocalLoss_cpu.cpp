@@ -0,0 +1,156 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+// Same formulas as cuda/SigmoidFocalLoss_cuda.cu, one element per iteration
+#include "cpu/vision.h"
+#include <cfloat>
+#include <cmath>
+
+template <typename T>
+void SigmoidFocalLossForward_cpu_kernel(
+    const int64_t nthreads,
+    const T* logits,
+    const int* targets,
+    const int num_classes,
+    const float gamma,
+    const float alpha,
+    T* losses) {
+  const T zn = (1.0 - alpha);
+  const T zp = (alpha);
+
+  #pragma omp parallel for
+  for (int64_t i = 0; i < nthreads; i++) {
+    int64_t n = i / num_classes;
+    int d = i % num_classes; // current class[0~79];
+    int t = targets[n]; // target class [1~80];
+
+    // Decide it is positive or negative case.
+    T c1 = (t == (d+1));
+    T c2 = ((t >= 0) & (t != (d+1)));
+
+    const T x = logits[i];
+    // p = 1. / 1. + expf(-x); p = sigmoid(x)
+    T p = 1. / (1. + std::exp(-x));
+
+    // (1-p)**gamma * log(p) where
+    T term1 = std::pow((1. - p), gamma) * std::log(std::max(p, (T)FLT_MIN));
+
+    // p**gamma * log(1-p)
+    T term2 = std::pow(p, gamma) *
+            (-1. * x * (x >= 0) - std::log(1. + std::exp(x - 2. * x * (x >= 0))));
+
+    losses[i] = -c1 * term1 * zp - c2 * term2 * zn;
+  }
+}
+
+template <typename T>
+void SigmoidFocalLossBackward_cpu_kernel(
+    const int64_t nthreads,
+    const T* logits,
+    const int* targets,
+    const T* d_losses,
+    const int num_classes,
+    const float gamma,
+    const float alpha,
+    T* d_logits) {
+  const T zn = (1.0 - alpha);
+  const T zp = (alpha);
+
+  #pragma omp parallel for
+  for (int64_t i = 0; i < nthreads; i++) {
+    int64_t n = i / num_classes;
+    int d = i % num_classes; // current class[0~79];
+    int t = targets[n]; // target class [1~80], 0 is background;
+
+    // Decide it is positive or negative case.
+    T c1 = (t == (d+1));
+    T c2 = ((t >= 0) & (t != (d+1)));
+
+    const T x = logits[i];
+    // p = 1. / 1. + expf(-x); p = sigmoid(x)
+    T p = 1. / (1. + std::exp(-x));
+
+    // (1-p)**g * (1 - p - g*p*log(p)
+    T term1 = std::pow((1. - p), gamma) *
+                      (1. - p - (p * gamma * std::log(std::max(p, (T)FLT_MIN))));
+
+    // (p**g) * (g*(1-p)*log(1-p) - p)
+    T term2 = std::pow(p, gamma) *
+                  ((-1. * x * (x >= 0) - std::log(1. + std::exp(x - 2. * x * (x >= 0)))) *
+                      (1. - p) * gamma - p);
+    d_logits[i] = (-c1 * term1 * zp - c2 * term2 * zn) * d_losses[i];
+  }
+}
+
+at::Tensor SigmoidFocalLoss_forward_cpu(
+		const at::Tensor& logits,
+                const at::Tensor& targets,
+		const int num_classes,
+		const float gamma,
+		const float alpha) {
+  AT_ASSERTM(!logits.type().is_cuda(), "logits must be a CPU tensor");
+  AT_ASSERTM(!targets.type().is_cuda(), "targets must be a CPU tensor");
+  AT_ASSERTM(logits.dim() == 2, "logits should be NxClass");
+
+  const int num_samples = logits.size(0);
+
+  auto losses = at::empty({num_samples, logits.size(1)}, logits.options());
+  auto losses_size = num_samples * logits.size(1);
+
+  if (losses.numel() == 0) {
+    return losses;
+  }
+
+  auto logits_ = logits.contiguous();
+  auto targets_ = targets.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(logits.type(), "SigmoidFocalLoss_forward", [&] {
+    SigmoidFocalLossForward_cpu_kernel<scalar_t>(
+         losses_size,
+         logits_.data<scalar_t>(),
+	 targets_.data<int>(),
+         num_classes,
+	 gamma,
+	 alpha,
+         losses.data<scalar_t>());
+  });
+  return losses;
+}
+
+
+at::Tensor SigmoidFocalLoss_backward_cpu(
+		const at::Tensor& logits,
+                const at::Tensor& targets,
+		const at::Tensor& d_losses,
+		const int num_classes,
+		const float gamma,
+		const float alpha) {
+  AT_ASSERTM(!logits.type().is_cuda(), "logits must be a CPU tensor");
+  AT_ASSERTM(!targets.type().is_cuda(), "targets must be a CPU tensor");
+  AT_ASSERTM(!d_losses.type().is_cuda(), "d_losses must be a CPU tensor");
+
+  AT_ASSERTM(logits.dim() == 2, "logits should be NxClass");
+
+  const int num_samples = logits.size(0);
+  AT_ASSERTM(logits.size(1) == num_classes, "logits.size(1) should be num_classes");
+
+  auto d_logits = at::zeros({num_samples, num_classes}, logits.options());
+  auto d_logits_size = num_samples * logits.size(1);
+
+  if (d_logits.numel() == 0) {
+    return d_logits;
+  }
+
+  auto logits_ = logits.contiguous();
+  auto targets_ = targets.contiguous();
+  auto d_losses_ = d_losses.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(logits.type(), "SigmoidFocalLoss_backward", [&] {
+    SigmoidFocalLossBackward_cpu_kernel<scalar_t>(
+         d_logits_size,
+         logits_.data<scalar_t>(),
+	 targets_.data<int>(),
+	 d_losses_.data<scalar_t>(),
+         num_classes,
+	 gamma,
+	 alpha,
+         d_logits.data<scalar_t>());
+  });
+  return d_logits;
+}
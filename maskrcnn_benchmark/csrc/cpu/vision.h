@@ -11,6 +11,80 @@ at::Tensor ROIAlign_forward_cpu(const at::Tensor& input,
                                 const int sampling_ratio);
 
 
+at::Tensor ROIAlignRotated3D_forward_cpu(const at::Tensor& input,
+                                         const at::Tensor& rois,
+                                         const float spatial_scale,
+                                         const int pooled_height,
+                                         const int pooled_width,
+                                         const int pooled_zsize,
+                                         const int sampling_ratio);
+
+at::Tensor ROIAlignRotated3D_backward_cpu(const at::Tensor& grad,
+                                          const at::Tensor& rois,
+                                          const float spatial_scale,
+                                          const int pooled_height,
+                                          const int pooled_width,
+                                          const int pooled_zsize,
+                                          const int batch_size,
+                                          const int channels,
+                                          const int height,
+                                          const int width,
+                                          const int zsize,
+                                          const int sampling_ratio);
+
+
+at::Tensor ROIAlignRotated_forward_cpu(const at::Tensor& input,
+                                       const at::Tensor& rois,
+                                       const float spatial_scale,
+                                       const int pooled_height,
+                                       const int pooled_width,
+                                       const int sampling_ratio);
+
+at::Tensor ROIAlignRotated_backward_cpu(const at::Tensor& grad,
+                                        const at::Tensor& rois,
+                                        const float spatial_scale,
+                                        const int pooled_height,
+                                        const int pooled_width,
+                                        const int batch_size,
+                                        const int channels,
+                                        const int height,
+                                        const int width,
+                                        const int sampling_ratio);
+
+
+std::tuple<at::Tensor, at::Tensor> ROIPool_forward_cpu(const at::Tensor& input,
+                                                       const at::Tensor& rois,
+                                                       const float spatial_scale,
+                                                       const int pooled_height,
+                                                       const int pooled_width);
+
+at::Tensor ROIPool_backward_cpu(const at::Tensor& grad,
+                                const at::Tensor& input,
+                                const at::Tensor& rois,
+                                const at::Tensor& argmax,
+                                const float spatial_scale,
+                                const int pooled_height,
+                                const int pooled_width,
+                                const int batch_size,
+                                const int channels,
+                                const int height,
+                                const int width);
+
+
+at::Tensor SigmoidFocalLoss_forward_cpu(const at::Tensor& logits,
+                                        const at::Tensor& targets,
+                                        const int num_classes,
+                                        const float gamma,
+                                        const float alpha);
+
+at::Tensor SigmoidFocalLoss_backward_cpu(const at::Tensor& logits,
+                                         const at::Tensor& targets,
+                                         const at::Tensor& d_losses,
+                                         const int num_classes,
+                                         const float gamma,
+                                         const float alpha);
+
+
 at::Tensor nms_cpu(const at::Tensor& dets,
                    const at::Tensor& scores,
                    const float threshold);
@@ -24,7 +24,7 @@ __device__ T bilinear_interpolate(
         const int index /* index for debug only*/) {
 
   // deal with cases that inverse elements are out of feature map boundary
-  if (y < -1.0 || y > height || x < -1.0 || x > width || z < -1.0 || zsize> zsize) {
+  if (y < -1.0 || y > height || x < -1.0 || x > width || z < -1.0 || z > zsize) {
     //empty
     return 0;
   }
@@ -0,0 +1,127 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import math
+
+import torch
+import torch.distributed as dist
+from torch.utils.data.sampler import Sampler
+
+
+class SizeBalancedBatchSampler(Sampler):
+    """
+    Distributed batch sampler for examples with very different sizes.
+    Every step takes num_replicas * batch_size examples of similar size and
+    splits them between the ranks, so that the total size (point number) of
+    the batches of all ranks in one step is balanced.
+    Only the batches of the current rank are yielded.
+
+    Arguments:
+        sizes (list[int]): size of each example, i.e. point number
+        batch_size (int): batch size of one rank
+        num_replicas (optional): Number of processes participating in
+            distributed training.
+        rank (optional): Rank of the current process within num_replicas.
+        shuffle (bool): shuffle the examples and the steps, based on epoch
+        bucket_steps (int): the examples of bucket_steps steps are sorted by
+            size together. Larger: more similar sizes in one step, but less
+            randomness in the combination of examples.
+    """
+
+    def __init__(self, sizes, batch_size, num_replicas=None, rank=None, shuffle=True, bucket_steps=50):
+        if num_replicas is None:
+            num_replicas = dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+        if rank is None:
+            rank = dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+        self.sizes = torch.as_tensor(sizes, dtype=torch.float64)
+        assert self.sizes.dim() == 1
+        self.batch_size = batch_size
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.shuffle = shuffle
+        self.bucket_steps = bucket_steps
+        self.epoch = 0
+
+        self.step_size = batch_size * num_replicas
+        self.num_steps = int(math.ceil(len(self.sizes) * 1.0 / self.step_size))
+        self.total_size = self.num_steps * self.step_size
+
+        self._can_reuse_batches = False
+
+    def _split_step(self, step_ids):
+        """
+        step_ids are sorted by size descendingly. Greedily put the largest
+        remaining example to the rank with least points which is not full.
+        """
+        loads = [0.0] * self.num_replicas
+        members = [[] for _ in range(self.num_replicas)]
+        sizes = self.sizes[step_ids].tolist()
+        for idx, s in zip(step_ids.tolist(), sizes):
+            r = min((r for r in range(self.num_replicas) if len(members[r]) < self.batch_size),
+                    key=lambda r: loads[r])
+            members[r].append(idx)
+            loads[r] += s
+        return members, loads
+
+    def _prepare_batches(self):
+        n = len(self.sizes)
+        if self.shuffle:
+            # deterministically shuffle based on epoch, same on all ranks
+            g = torch.Generator()
+            g.manual_seed(self.epoch)
+            indices = torch.randperm(n, generator=g)
+        else:
+            indices = torch.arange(n)
+
+        # add extra samples to make it evenly divisible
+        indices = indices.repeat(int(math.ceil(self.total_size * 1.0 / n)))[: self.total_size]
+
+        # sort inside each bucket, so that one step gets similar sizes
+        bucket = self.bucket_steps * self.step_size
+        buckets = []
+        for s in range(0, self.total_size, bucket):
+            b = indices[s : s + bucket]
+            buckets.append(b[self.sizes[b].sort(descending=True)[1]])
+        steps = torch.cat(buckets).view(self.num_steps, self.step_size)
+        if self.shuffle:
+            steps = steps[torch.randperm(self.num_steps, generator=g)]
+
+        batches = []
+        step_loads = []
+        for step_ids in steps:
+            members, loads = self._split_step(step_ids)
+            batches.append(members[self.rank])
+            step_loads.append(loads)
+        self.step_loads = torch.tensor(step_loads, dtype=torch.float64)
+        return batches
+
+    def balance_stats(self):
+        """
+        Planned size per rank of the current epoch.
+        Returns dict:
+            rank_sizes: total size of each rank
+            imbalance: mean over steps of max / mean size across ranks
+        """
+        if not hasattr(self, "_batches"):
+            self._batches = self._prepare_batches()
+            self._can_reuse_batches = True
+        loads = self.step_loads
+        imbalance = loads.max(1)[0] / loads.mean(1).clamp(min=1)
+        return {"rank_sizes": loads.sum(0).tolist(), "imbalance": imbalance.mean().item()}
+
+    def __iter__(self):
+        if self._can_reuse_batches:
+            batches = self._batches
+            self._can_reuse_batches = False
+        else:
+            batches = self._prepare_batches()
+        self._batches = batches
+        return iter(batches)
+
+    def __len__(self):
+        return self.num_steps
+
+    def set_epoch(self, epoch):
+        if epoch != self.epoch:
+            self._can_reuse_batches = False
+            if hasattr(self, "_batches"):
+                del self._batches
+        self.epoch = epoch
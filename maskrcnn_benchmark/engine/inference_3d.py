@@ -1,24 +1,248 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 import datetime
 import logging
+import math
 import time
 import os
 
+import numpy as np
 import torch
 from tqdm import tqdm
 
 from data3d.evaluation import evaluate
+from data3d.evaluation.prediction_store import PredictionStore, PredictionStoreWriter, clear_store
 from ..utils.comm import is_main_process
-from ..utils.comm import scatter_gather
+from ..utils.comm import all_gather, all_gather_tensor, get_world_size, get_rank
 from ..utils.comm import synchronize
+from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D, cat_boxlist_3d
+from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_nms_3d, boxlist_wbf_3d
+from utils3d.geometric_torch import limit_period
 
 
-def compute_on_dataset(model, data_loader, device):
+def _tile_starts(extent, size, overlap):
+  # first voxel of each tile along one axis, the last tile ends at extent
+  if extent <= size:
+    return [0]
+  stride = size - overlap
+  n = int(math.ceil((extent - size) / stride)) + 1
+  return [min(i * stride, extent - size) for i in range(n)]
+
+
+def split_tiles(locs, feats, tile_size, overlap, voxel_scale, xyz_feat=True):
+  """
+  Cut the points of one scene into overlapping tiles.
+  locs: [n,3] voxel locations
+  feats: [n,c]
+  tile_size: [3] max voxel number of one tile along each axis
+  overlap: voxel number shared by neighbouring tiles
+  xyz_feat: feats[:,0:3] are the locations (meter), moved to the tile frame too
+
+  Returns:
+    tiles: list of (origin [3], locs [m,3], feats [m,c]), in the tile frame.
+      The tiles without points are skipped.
+  """
+  extent = (locs.max(0)[0] + 1).tolist()
+  axis_masks = []
+  for d in range(3):
+    size = int(tile_size[d])
+    assert overlap < size, f"tile overlap {overlap} >= tile size {size}"
+    axis_masks.append([(s, (locs[:,d] >= s) & (locs[:,d] < s + size))
+                       for s in _tile_starts(extent[d], size, overlap)])
+  tiles = []
+  for x0, mx in axis_masks[0]:
+    for y0, my in axis_masks[1]:
+      for z0, mz in axis_masks[2]:
+        idx = (mx & my & mz).nonzero().squeeze(1)
+        if idx.numel() == 0:
+          continue
+        origin = locs.new_tensor([x0, y0, z0])
+        tile_feats = feats[idx].clone()
+        if xyz_feat:
+          tile_feats[:,0:3] -= origin.to(feats.dtype) / voxel_scale
+        tiles.append((origin, locs[idx] - origin, tile_feats))
+  return tiles
+
+
+def merge_tiles(boxlists, nms_thresh, nms_aug_thickness=None):
+  """
+  Merge the detections of all the tiles of one scene, already in the scene
+  frame. The duplicates of the objects across the tile seams are removed by
+  rotated nms of each label.
+  """
+  merged = cat_boxlist_3d(boxlists, per_example=False, use_constants0=True)
+  if len(boxlists) == 1 or len(merged) == 0:
+    return merged
+  score_field = 'scores' if merged.has_field('scores') else 'objectness'
+  if not merged.has_field('labels'):
+    return boxlist_nms_3d(merged, nms_thresh, nms_aug_thickness,
+                          score_field=score_field, flag='roi_post')
+  labels = merged.get_field('labels')
+  result = []
+  for l in torch.unique(labels).tolist():
+    inds = (labels == l).nonzero().squeeze(1)
+    result.append(boxlist_nms_3d(merged[inds], nms_thresh, nms_aug_thickness,
+                                 score_field=score_field, flag='roi_post'))
+  return cat_boxlist_3d(result, per_example=False, use_constants0=True)
+
+
+def tiled_forward(model, locs, feats, tile_size, overlap, voxel_scale, tiles_per_batch,
+                  nms_thresh, nms_aug_thickness=None, xyz_feat=True):
+  """
+  Detect in one scene of any size with bounded memory: the overlapping tiles
+  of split_tiles are run in batches of tiles_per_batch, the boxes of each
+  tile are moved back to the scene frame and merged by merge_tiles.
+  locs: [n,3], feats: [n,c] of one scene
+  """
+  tiles = split_tiles(locs, feats, tile_size, overlap, voxel_scale, xyz_feat)
+  results = []
+  for i in range(0, len(tiles), tiles_per_batch):
+    batch = tiles[i:i+tiles_per_batch]
+    # batch id column as trainMerge
+    tile_locs = torch.cat([torch.cat([t_locs, t_locs.new_full((t_locs.shape[0], 1), j)], 1)
+                           for j, (_, t_locs, _) in enumerate(batch)], 0)
+    tile_feats = torch.cat([t_feats for _, _, t_feats in batch], 0)
+    output = model([tile_locs, tile_feats])
+    for (origin, _, _), o in zip(batch, output):
+      shift = o.bbox3d.new_zeros(7)
+      shift[0:3] = origin.to(shift.dtype) / voxel_scale
+      o.bbox3d = o.bbox3d + shift
+      results.append(o)
+  return merge_tiles(results, nms_thresh, nms_aug_thickness)
+
+
+# test time augmentations in the xy plane: (swap x and y, flip x, flip y),
+# applied in this order. Identity, flips, rotations by 90, 180, 270 and the
+# two transposes.
+TTA_AUGS = [(False, False, False), (False, True, False), (False, False, True),
+            (True, True, False), (False, True, True), (True, False, True),
+            (True, False, False), (True, True, True)]
+
+
+def augment_points(locs, feats, extent, aug, voxel_scale, xyz_cols=None, normal_cols=None):
+  """
+  locs: [n,3] voxel locations in [0, extent)
+  feats: [n,c], xyz_cols / normal_cols: the columns of the locations (meter)
+    and normals in feats, None if not in feats
+  aug: one of TTA_AUGS
+  A voxel location l covers [l, l+1), flipping along an axis maps the
+  continuous coordinate u to extent - u and l to extent - 1 - l.
+  """
+  swap, flip_x, flip_y = aug
+  locs = locs.clone()
+  feats = feats.clone()
+  extent = list(extent)
+  if swap:
+    locs = locs[:,[1,0,2]]
+    for cols in [xyz_cols, normal_cols]:
+      if cols is not None:
+        feats[:,[cols[0], cols[1]]] = feats[:,[cols[1], cols[0]]]
+    extent = [extent[1], extent[0], extent[2]]
+  for d, flip in [(0, flip_x), (1, flip_y)]:
+    if not flip:
+      continue
+    locs[:,d] = extent[d] - 1 - locs[:,d]
+    if xyz_cols is not None:
+      feats[:,xyz_cols[d]] = extent[d] / voxel_scale - feats[:,xyz_cols[d]]
+    if normal_cols is not None:
+      feats[:,normal_cols[d]] = -feats[:,normal_cols[d]]
+  return locs, feats, extent
+
+
+def unaugment_boxes(boxlist, extent, aug, voxel_scale):
+  """
+  Map the yx_zb boxes predicted on the points of augment_points back to the
+  original frame. extent is the one returned by augment_points.
+  The yaw is mirrored by each flip, and by the swap around pi/4.
+  """
+  swap, flip_x, flip_y = aug
+  bbox3d = boxlist.bbox3d.clone()
+  for d, flip in [(0, flip_x), (1, flip_y)]:
+    if flip:
+      bbox3d[:,d] = extent[d] / voxel_scale - bbox3d[:,d]
+      bbox3d[:,6] = -bbox3d[:,6]
+  if swap:
+    bbox3d[:,[0,1]] = bbox3d[:,[1,0]]
+    bbox3d[:,6] = np.pi * 0.5 - bbox3d[:,6]
+  bbox3d[:,6] = limit_period(bbox3d[:,6], 0.5, np.pi)
+  boxlist.bbox3d = bbox3d
+  return boxlist
+
+
+def fuse_boxlists(boxlists, iou_thresh, nms_aug_thickness=None):
+  """
+  Fuse the predictions of the same scene by rotated weighted box fusion of
+  each label.
+  """
+  merged = cat_boxlist_3d(boxlists, per_example=False, use_constants0=True)
+  if len(merged) == 0:
+    return merged
+  score_field = 'scores' if merged.has_field('scores') else 'objectness'
+  if not merged.has_field('labels'):
+    return boxlist_wbf_3d(merged, iou_thresh, nms_aug_thickness,
+                          score_field=score_field, models_num=len(boxlists))
+  labels = merged.get_field('labels')
+  result = []
+  for l in torch.unique(labels).tolist():
+    inds = (labels == l).nonzero().squeeze(1)
+    result.append(boxlist_wbf_3d(merged[inds], iou_thresh, nms_aug_thickness,
+                                 score_field=score_field, models_num=len(boxlists)))
+  return cat_boxlist_3d(result, per_example=False, use_constants0=True)
+
+
+def tta_forward(model, pcl, reps, voxel_scale, iou_thresh, nms_aug_thickness=None,
+                xyz_cols=None, normal_cols=None):
+  """
+  Test time augmentation: reps augmented copies of every scene of the batch
+  are packed into one batch as trainMerge, and run by one forward. The boxes
+  of each copy are mapped back and the copies of a scene are fused by
+  fuse_boxlists.
+  pcl: [locs [n,4], feats [n,c]] of a batch
+  """
+  assert 0 < reps <= len(TTA_AUGS), f"VAL_REPS should be in [1, {len(TTA_AUGS)}]"
+  locs, feats = pcl
+  batch_size = int(locs[:,3].max()) + 1
+  aug_locs, aug_feats, extents = [], [], []
+  for bi in range(batch_size):
+    idx = (locs[:,3] == bi).nonzero().squeeze(1)
+    locs_i = locs[idx,0:3]
+    extent_i = (locs_i.max(0)[0] + 1).tolist()
+    for r in range(reps):
+      l, f, e = augment_points(locs_i, feats[idx], extent_i, TTA_AUGS[r], voxel_scale,
+                               xyz_cols, normal_cols)
+      aug_locs.append(torch.cat([l, l.new_full((l.shape[0], 1), bi * reps + r)], 1))
+      aug_feats.append(f)
+      extents.append(e)
+  output = model([torch.cat(aug_locs, 0), torch.cat(aug_feats, 0)])
+  results = []
+  for bi in range(batch_size):
+    copies = [unaugment_boxes(output[bi * reps + r], extents[bi * reps + r], TTA_AUGS[r], voxel_scale)
+              for r in range(reps)]
+    results.append(fuse_boxlists(copies, iou_thresh, nms_aug_thickness))
+  return results
+
+
+def compute_on_dataset(model, data_loader, device, store_path=None, tiling=None, tta=None):
+    """
+    store_path: if set, the predictions of each batch are also appended to
+        the prediction store in store_path (one part per rank), the store
+        of a previous run is removed first
+    tiling: if set, the keyword arguments of tiled_forward, each scene is
+        detected tile by tile
+    tta: if set, the keyword arguments of tta_forward, used if tiling is None
+    """
     model.eval()
     results_dict = {}
     cpu_device = torch.device("cpu")
+    store = None
+    if store_path:
+        # the parts of a previous run with more ranks would survive
+        if get_rank() == 0:
+            clear_store(store_path)
+        synchronize()
+        store = PredictionStoreWriter(store_path, part=get_rank())
     for i, batch in enumerate(tqdm(data_loader)):
         pcl = batch['x']
+        pcl[0] = pcl[0].to(device)
         pcl[1] = pcl[1].to(device)
         targets = batch['y']
         pcl_ids = batch['id']
@@ -26,18 +250,89 @@ def compute_on_dataset(model, data_loader, device):
         #images, targets, image_ids = batch
         #images = images.to(device)
         with torch.no_grad():
-            output = model(pcl, targets)
+            if tiling is not None:
+                output = []
+                for bi in range(len(pcl_ids)):
+                    idx = (pcl[0][:,3] == bi).nonzero().squeeze(1)
+                    output.append(tiled_forward(model, pcl[0][idx,0:3], pcl[1][idx], **tiling))
+            elif tta is not None:
+                output = tta_forward(model, pcl, **tta)
+            else:
+                output = model(pcl, targets)
             output =[o.to(cpu_device) for o in output]
             for i in range(len(output)):
                 output[i].constants['data_id'] = pcl_ids[i]
+                if store is not None:
+                    store.add(output[i])
         results_dict.update(
             {img_id: result for img_id, result in zip(pcl_ids, output)}
         )
+    if store is not None:
+        store.close()
     return results_dict
 
 
+def _pack_boxlists(predictions):
+    """
+    Pack the boxes and fields of all BoxList3D into one flat float tensor,
+    one row per box: [bbox3d, fields]. The small meta data (data id, box
+    number, mode, size3d, constants of each example and the field layout)
+    is returned separately.
+    """
+    ids = list(predictions.keys())
+    fields = []
+    if len(ids) > 0:
+        b0 = predictions[ids[0]]
+        fields = [(k, tuple(b0.get_field(k).shape[1:]), b0.get_field(k).dtype) for k in b0.fields()]
+    widths = [int(np.prod(shape)) for _, shape, _ in fields]
+    columns = []
+    examples = []
+    for i in ids:
+        b = predictions[i]
+        n = len(b)
+        cols = [b.bbox3d.float()]
+        cols += [b.get_field(k).reshape(n, w).float() for (k, _, _), w in zip(fields, widths)]
+        columns.append(torch.cat(cols, 1))
+        examples.append((i, n, b.mode, b.size3d, b.constants))
+    packed = torch.cat(columns, 0) if len(columns) > 0 else torch.zeros(0, 7 + sum(widths))
+    meta = {'fields': fields, 'examples': examples}
+    return packed, meta
+
+
+def _unpack_boxlists(packed, meta):
+    predictions = {}
+    s = 0
+    for data_id, n, mode, size3d, constants in meta['examples']:
+        rows = packed[s:s+n]
+        s += n
+        b = BoxList3D(rows[:, 0:7], size3d, mode, None, constants)
+        c = 7
+        for k, shape, dtype in meta['fields']:
+            w = int(np.prod(shape))
+            b.add_field(k, rows[:, c:c+w].to(dtype).reshape((n,) + shape))
+            c += w
+        predictions[data_id] = b
+    return predictions
+
+
+def _gather_boxlists(predictions_per_gpu):
+    """
+    Gather the predictions of all ranks with tensor collectives: one
+    all_gather for the small meta data and one for the packed boxes.
+    """
+    packed, meta = _pack_boxlists(predictions_per_gpu)
+    metas = all_gather(meta)
+    packeds = all_gather_tensor(packed)
+    if not is_main_process():
+        return
+    return [_unpack_boxlists(p, m) for p, m in zip(packeds, metas)]
+
+
 def _accumulate_predictions_from_multiple_gpus(predictions_per_gpu):
-    all_predictions = scatter_gather(predictions_per_gpu)
+    if get_world_size() == 1:
+        all_predictions = [predictions_per_gpu]
+    else:
+        all_predictions = _gather_boxlists(predictions_per_gpu)
     if not is_main_process():
         return
     # merge the list of dicts
@@ -59,15 +354,19 @@ def _accumulate_predictions_from_multiple_gpus(predictions_per_gpu):
 
 
 def load_prediction(output_folder, data_loader):
+    store_path = os.path.join(output_folder, "predictions")
     fn = os.path.join(output_folder, f"predictions.pth")
-    print(fn)
-    if not os.path.exists (fn):
-      print('file not exist:\n'+fn)
+    if PredictionStore.exists(store_path):
+      store = PredictionStore(store_path)
+      # only the scenes used are read
+      predictions = store.boxlists(store.data_ids()[0:len(data_loader)])
+    elif os.path.exists(fn):
+      # old format
+      predictions = torch.load(fn)
+      predictions = predictions[0:len(data_loader)]
+    else:
+      print('file not exist:\n'+store_path)
       return None
-    import pdb; pdb.set_trace()  # XXX BREAKPOINT
-    predictions = torch.load(fn)
-    #assert len(predictions) == len(data_loader)
-    predictions = predictions[0:len(data_loader)]
     print(f'\nload {len(predictions)} predictions OK\n')
     return predictions
 
@@ -86,6 +385,9 @@ def inference_3d(
         epoch = None,
         eval_aug_thickness = None,
         load_pred = 0,
+        eval_sweep = None,
+        tiling = None,
+        tta = None,
 ):
     # convert to a torch.device for efficiency
     device = torch.device(device)
@@ -108,7 +410,8 @@ def inference_3d(
     if load_pred:
       predictions = predictions_load
     else:
-      predictions = compute_on_dataset(model, data_loader, device)
+      store_path = os.path.join(output_folder, "predictions") if output_folder else None
+      predictions = compute_on_dataset(model, data_loader, device, store_path, tiling, tta)
       # wait for all processes to complete before measuring the time
       synchronize()
       total_time = time.time() - start_time
@@ -123,18 +426,17 @@ def inference_3d(
       if not is_main_process():
           return
 
-      if output_folder:
-          torch.save(predictions, os.path.join(output_folder, f"predictions.pth"))
-
 
+    # the sweep runs in the same pass as the evaluation
     extra_args = dict(
         box_only=box_only,
+        eval_sweep=eval_sweep,
         #iou_types=iou_types,
         #expected_results=expected_results,
         #expected_results_sigma_tol=expected_results_sigma_tol,
     )
 
-    return evaluate(dataset=dataset,
+    result = evaluate(dataset=dataset,
                     predictions=predictions,
                     iou_thresh_eval = iou_thresh_eval,
                     output_folder=output_folder,
@@ -142,4 +444,5 @@ def inference_3d(
                     is_train = False,
                     eval_aug_thickness=eval_aug_thickness,
                     **extra_args)
+    return result
 
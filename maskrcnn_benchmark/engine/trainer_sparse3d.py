@@ -7,12 +7,13 @@ import torch
 from torch import autograd
 import torch.distributed as dist
 
-from maskrcnn_benchmark.utils.comm import get_world_size
+from maskrcnn_benchmark.utils.comm import get_world_size, get_rank, all_gather
 from maskrcnn_benchmark.utils.metric_logger import MetricLogger
-from data3d.evaluation import evaluate
+from maskrcnn_benchmark.utils.profiler import profile_stage
+from maskrcnn_benchmark.solver import loss_is_finite, mask_nonfinite_grads
+from data3d.evaluation import SuncgOnlineEval
 
 SHOW_FN = True
-CHECK_NAN = True
 
 def reduce_loss_dict(loss_dict):
     """
@@ -39,6 +40,18 @@ def reduce_loss_dict(loss_dict):
     return reduced_losses
 
 
+def log_rank_throughput(logger, points_num, seconds):
+    """
+    Gather the processed points and time of all ranks and log the point
+    throughput of each rank.
+    """
+    stats_all = all_gather((points_num, seconds))
+    if get_rank() != 0:
+        return
+    for r, (pn, t) in enumerate(stats_all):
+        logger.info(f"rank {r}: {pn/1e6:.2f} M points in {t:.1f} s, {pn/1e3/max(t,1e-6):.1f} K points/s")
+
+
 def do_train(
     model,
     data_loader,
@@ -54,18 +67,45 @@ def do_train(
     eval_in_train_per_iter,
     iou_thresh_eval,
     min_loss,
-    eval_aug_thickness
+    eval_aug_thickness,
+    scaler=None,
+    detect_anomaly=False,
+    eval_max_scenes=500,
+    profiler=None,
+    log_period=20,
+    check_nan=False,
 ):
+    """
+    profiler: StageProfiler, if set the stages of each iteration are timed
+        and logged in meters as prof_<stage>_ms and prof_<stage>_mb
+    log_period: the losses stay on the device between two logs, they are
+        only read (synchronizing the device) every log_period iterations.
+        The online evaluation is also updated and logged every log_period
+        iterations
+    check_nan: stop at the first nan loss, reading the losses at each
+        iteration. If not, the gradients of an iteration with non-finite loss
+        are zeroed on the device before the optimizer step (the scaler skips
+        the step by itself), and these iterations are counted and reported
+        every log_period iterations
+    """
     logger = logging.getLogger("maskrcnn_benchmark.trainer")
     logger.info(f"Start training {epoch_id}")
     meters = MetricLogger(delimiter="  ")
     max_iter = len(data_loader)
     start_iter = arguments["iteration"]
     model.train()
+    if hasattr(data_loader.batch_sampler, 'set_epoch'):
+        data_loader.batch_sampler.set_epoch(epoch_id)
     start_training_time = time.time()
     end = time.time()
-    predictions_all = []
+    points_num = 0
+    eval_in_epoch = eval_in_train>0 and epoch_id % eval_in_train == 0
+    if eval_in_epoch:
+      online_eval = SuncgOnlineEval(data_loader.dataset.dset_metas, iou_thresh_eval,
+                                    eval_aug_thickness, max_scenes=eval_max_scenes,
+                                    flush_period=log_period)
     losses_last = 100
+    nonfinite_iters = torch.zeros((), device=device)
     for iteration, batch in enumerate(data_loader, start_iter):
         fn = [os.path.basename(os.path.dirname(nm)) for nm in batch['fn']]
         if SHOW_FN:
@@ -77,13 +117,17 @@ def do_train(
 
         scheduler.step()
 
-        batch['x'][1] = batch['x'][1].to(device)
-        batch['y'] = [b.to(device) for b in batch['y']]
+        points_num += batch['x'][0].shape[0]
+        with profile_stage(profiler, 'to_device'):
+          batch['x'][0] = batch['x'][0].to(device)
+          batch['x'][1] = batch['x'][1].to(device)
+          batch['y'] = [b.to(device) for b in batch['y']]
 
-        loss_dict, predictions_i = model(batch['x'], batch['y'])
+        with profile_stage(profiler, 'forward'):
+          loss_dict, predictions_i = model(batch['x'], batch['y'])
 
 
-        if CHECK_NAN:
+        if check_nan:
           any_nan = sum(torch.isnan(v.data) for v in loss_dict.values())
           if any_nan:
             print(f'\nGot nan loss:\n{fn}\n')
@@ -91,39 +135,57 @@ def do_train(
             continue
 
         losses = sum(loss for loss in loss_dict.values())
+        finite = None
+        if not check_nan:
+          finite = loss_is_finite(losses)
+          nonfinite_iters = nonfinite_iters + (1 - finite)
 
-        if eval_in_train>0 and epoch_id % eval_in_train == 0:
-          data_id = batch['id']
-          for k in range(len(data_id)):
-            predictions_i[k].constants['data_id'] = data_id[k]
+        if eval_in_epoch:
+          for p in predictions_i:
+            p.detach()
+          online_eval.update(predictions_i, batch['y'])
 
-          predictions_i = [p.to(torch.device('cpu')) for p in predictions_i]
-          [p.detach() for p in predictions_i]
-          predictions_all += predictions_i
-
-          if eval_in_train_per_iter>0 and epoch_id % eval_in_train_per_iter == 0:
-            logger.info(f'\nepoch {epoch_id}, data_id:{data_id}\n')
-            eval_res_i = evaluate(dataset=data_loader.dataset, predictions=predictions_i,
-                                 iou_thresh_eval=iou_thresh_eval,  output_folder=eval_out_dir, box_only=False)
+          if eval_in_train_per_iter>0 and epoch_id % eval_in_train_per_iter == 0 and \
+              (iteration % log_period == 0 or iteration == max_iter):
+            logger.info(f'\nepoch {epoch_id}, data_id:{batch["id"]}' + online_eval.summary_str())
 
         # reduce losses over all GPUs for logging purposes
         loss_dict_reduced = reduce_loss_dict(loss_dict)
         losses_reduced = sum(loss for loss in loss_dict_reduced.values())
         meters.update(loss=losses_reduced, **loss_dict_reduced)
 
-        with autograd.detect_anomaly():
+        with autograd.set_detect_anomaly(detect_anomaly):
           optimizer.zero_grad()
-          losses.backward()
-          optimizer.step()
-
+          if scaler is None:
+            with profile_stage(profiler, 'backward'):
+              losses.backward()
+            with profile_stage(profiler, 'optimizer'):
+              if finite is not None:
+                mask_nonfinite_grads(optimizer, finite)
+              optimizer.step()
+          else:
+            with profile_stage(profiler, 'backward'):
+              scaler.scale(losses).backward()
+            with profile_stage(profiler, 'optimizer'):
+              scaler.step(optimizer)
+              scaler.update()
+
+        if profiler is not None:
+          profiler.step(meters)
         batch_time = time.time() - end
         end = time.time()
         meters.update(time=batch_time, data=data_time)
 
-        eta_seconds = meters.time.global_avg * (max_iter - iteration)
-        eta_string = str(datetime.timedelta(seconds=int(eta_seconds)))
-
-        if iteration % 1 == 0 or iteration == max_iter:
+        if iteration % log_period == 0 or iteration == max_iter:
+            if not check_nan:
+              nonfinite_num = int(nonfinite_iters.item())
+              if nonfinite_num > 0:
+                logger.warning(f'{nonfinite_num} iterations with non-finite loss since the last log, last files: {fn}')
+              nonfinite_iters.zero_()
+            eta_seconds = meters.time.global_avg * (max_iter - iteration)
+            eta_string = str(datetime.timedelta(seconds=int(eta_seconds)))
+            # the profiler resets the peak of torch at each stage
+            max_memory = profiler.max_memory if profiler is not None else torch.cuda.max_memory_allocated()
             logger.info(
                 meters.delimiter.join(
                     [
@@ -138,13 +200,13 @@ def do_train(
                     iter=iteration,
                     meters=str(meters),
                     lr=optimizer.param_groups[0]["lr"],
-                    memory=torch.cuda.max_memory_allocated() / 1024.0 / 1024.0,
+                    memory=max_memory / 1024.0 / 1024.0,
                 )
             )
 
-        avg_loss = meters.loss.avg
         tmp_p = max(int(checkpoint_period//10), 20 )
-        if iteration % tmp_p == 0 and avg_loss < min_loss:
+        if iteration % tmp_p == 0 and meters.loss.avg < min_loss:
+            avg_loss = meters.loss.avg
             checkpointer.save("model_min_loss", **arguments)
             logger.info(f'\nmin loss: {avg_loss} at {iteration}\n')
             min_loss = avg_loss
@@ -153,7 +215,12 @@ def do_train(
             checkpointer.save("model_{:07d}".format(iteration), **arguments)
         if iteration == max_iter:
             checkpointer.save("model_final", **arguments)
+        for name, blocked, write_time in checkpointer.pop_save_times():
+            meters.update(save_blocked=blocked, save_write=write_time)
 
+    checkpointer.wait()
+    if profiler is not None:
+        profiler.dump_trace()
     total_training_time = time.time() - start_training_time
     total_time_str = str(datetime.timedelta(seconds=total_training_time))
     logger.info(
@@ -161,24 +228,9 @@ def do_train(
             total_time_str, total_training_time / (max_iter)
         )
     )
+    log_rank_throughput(logger, points_num, total_training_time)
 
-    if eval_in_train>0 and epoch_id % eval_in_train == 0:
-      logger.info(f'\nepoch {epoch_id}\n')
-      preds = down_sample_for_eval_training(predictions_all)
-      eval_res = evaluate(dataset=data_loader.dataset, predictions=preds,
-                          iou_thresh_eval=iou_thresh_eval,
-                          output_folder=eval_out_dir, box_only=False, epoch=epoch_id, is_train=True, eval_aug_thickness=eval_aug_thickness)
-      pass
+    if eval_in_epoch:
+      logger.info(online_eval.save(eval_out_dir, epoch_id))
     return min_loss
 
-
-def down_sample_for_eval_training(predictions):
-  import numpy as np
-  n = len(predictions)
-  max_eval = 500
-  if n < max_eval:
-    return predictions
-  indices = np.sort(np.random.choice(n, max_eval, replace=False)).tolist()
-  predictions = [predictions[i] for i in indices]
-  return predictions
-
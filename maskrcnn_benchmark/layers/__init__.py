@@ -14,7 +14,8 @@ from .roi_align_rotated_3d import ROIAlignRotated3D
 from .roi_align_rotated_3d import roi_align_rotated_3d
 from .roi_pool import ROIPool
 from .roi_pool import roi_pool
+from .sigmoid_focal_loss import SigmoidFocalLoss
 from .smooth_l1_loss import smooth_l1_loss
 from .yaw_direction_loss import yaw_direction_loss
 
-__all__ = ["nms", "ROIAlignRotated3D", "roi_align", "ROIAlign", "roi_pool", "ROIPool", "smooth_l1_loss", "Conv2d", "ConvTranspose2d", "interpolate", "FrozenBatchNorm2d"]
+__all__ = ["nms", "ROIAlignRotated3D", "roi_align", "ROIAlign", "roi_pool", "ROIPool", "smooth_l1_loss", "SigmoidFocalLoss", "Conv2d", "ConvTranspose2d", "interpolate", "FrozenBatchNorm2d"]
@@ -79,6 +79,8 @@ class ROIAlignRotated3D(nn.Module):
         Note: the order of w and h inside of input and rois is different.
         '''
         input_d3d = sparse_3d_to_dense_2d(input_s3d)
+        # the cuda or cpu kernel is selected by the device of input
+        rois_3d = rois_3d.to(device=input_d3d.device, dtype=input_d3d.dtype)
         output = roi_align_rotated_3d(
             input_d3d, rois_3d, self.output_size, self.spatial_scale, self.sampling_ratio
         )
@@ -65,6 +65,9 @@ def build_sparse_resnet_fpn_backbone(cfg):
                     rpn_3d_2d_selector = rpn_3d_2d_selector,
                     bn_momentum=bn_momentum,
                     track_running_stats=track_running_stats,
+                    checkpoint_mode=cfg.SPARSE3D.ACTIVATION_CHECKPOINT,
+                    checkpoint_downs=cfg.SPARSE3D.CHECKPOINT_DOWNS,
+                    checkpoint_ups=cfg.SPARSE3D.CHECKPOINT_UPS,
                     )
   return fpn
 
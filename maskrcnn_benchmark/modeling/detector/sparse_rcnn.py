@@ -12,9 +12,24 @@ from ..backbone import build_backbone
 from ..rpn.rpn_sparse3d import build_rpn
 from ..roi_heads.roi_heads_3d import build_roi_heads
 from maskrcnn_benchmark.modeling.seperate_classifier import SeperateClassifier
+from maskrcnn_benchmark.utils.profiler import attach_stage
 
 DEBUG = False
 
+# (stage name, attribute path from SparseRCNN) timed by enable_profiler
+PROFILE_STAGES = [
+    ('backbone', 'backbone'),
+    ('rpn_head', 'rpn.head'),
+    ('rpn_anchor', 'rpn.anchor_generator'),
+    ('rpn_nms', 'rpn.box_selector_train'),
+    ('rpn_nms', 'rpn.box_selector_test'),
+    ('rpn_loss', 'rpn.loss_evaluator'),
+    ('roi_pool', 'roi_heads.box.feature_extractor'),
+    ('roi_predictor', 'roi_heads.box.predictor'),
+    ('roi_post', 'roi_heads.box.post_processor_'),
+    ('roi_loss', 'roi_heads.box.loss_evaluator'),
+]
+
 class SparseRCNN(nn.Module):
     """
     Main class for Generalized R-CNN. Currently supports boxes and masks.
@@ -33,6 +48,28 @@ class SparseRCNN(nn.Module):
         self.roi_heads = build_roi_heads(cfg)
         self.add_gt_proposals = cfg.MODEL.RPN.ADD_GT_PROPOSALS
         self.seperate_classifier = SeperateClassifier(cfg.MODEL.SEPARATE_CLASSES_ID, len(cfg.INPUT.CLASSES))
+        self._profile_handles = []
+
+    def enable_profiler(self, profiler):
+        """
+        Time the stages of PROFILE_STAGES with profiler (StageProfiler).
+        The hooks only exist while enabled, the model without profiler is
+        unchanged.
+        """
+        self.disable_profiler()
+        for name, path in PROFILE_STAGES:
+            parent = self
+            attrs = path.split('.')
+            for a in attrs[:-1]:
+                parent = getattr(parent, a, None)
+            if parent is None or getattr(parent, attrs[-1], None) is None:
+                continue
+            self._profile_handles.append(attach_stage(profiler, parent, attrs[-1], name))
+
+    def disable_profiler(self):
+        for h in self._profile_handles:
+            h.remove()
+        self._profile_handles = []
 
     def forward(self, points, targets=None):
         """
@@ -6,6 +6,7 @@ from .roi_box_feature_extractors import make_roi_box_feature_extractor
 from .roi_box_predictors import make_roi_box_predictor
 from .inference import make_roi_box_post_processor
 from .loss import make_roi_box_loss_evaluator
+from maskrcnn_benchmark.utils.amp import get_amp_dtype, autocast
 
 DEBUG = True
 SHOW_ROI_INPUT = DEBUG and False
@@ -47,6 +48,7 @@ class ROIBoxHead3D(torch.nn.Module):
         self.eval_in_train = cfg.DEBUG.eval_in_train
         self.add_gt_proposals = cfg.MODEL.RPN.ADD_GT_PROPOSALS
         self.detections_per_img = cfg.MODEL.ROI_HEADS.DETECTIONS_PER_IMG
+        self.amp_dtype = get_amp_dtype(cfg)
 
     def post_processor(self, log_reg, proposals):
         class_logits, box_regression = log_reg
@@ -105,9 +107,13 @@ class ROIBoxHead3D(torch.nn.Module):
 
         # extract features that will be fed to the final classifier. The
         # feature_extractor generally corresponds to the pooler + heads
-        x = self.feature_extractor(features, proposals)
-        # final classifier that converts the features into predictions
-        class_logits, box_regression = self.predictor(x)
+        with autocast(self.amp_dtype):
+          x = self.feature_extractor(features, proposals)
+          # final classifier that converts the features into predictions
+          class_logits, box_regression = self.predictor(x)
+        # box coding, loss and nms in float32
+        class_logits = class_logits.float()
+        box_regression = box_regression.float()
 
         if not self.training:
             result = self.post_processor((class_logits, box_regression), proposals)
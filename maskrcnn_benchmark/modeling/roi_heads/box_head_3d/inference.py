@@ -5,11 +5,14 @@ from torch import nn
 
 from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
 from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_nms_3d
+from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_soft_nms_3d
+from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_wbf_3d
 from maskrcnn_benchmark.structures.boxlist_ops_3d import cat_boxlist_3d
 from maskrcnn_benchmark.modeling.box_coder_3d import BoxCoder3D
 
 
 DEBUG = False
+NMS_METHODS = ("nms", "soft_linear", "soft_gaussian", "wbf")
 
 class PostProcessor(nn.Module):
     """
@@ -19,14 +22,20 @@ class PostProcessor(nn.Module):
     """
 
     def __init__(
-        self, score_thresh=0.05, nms=0.5, nms_aug_thickness=None, detections_per_img=100, box_coder=None
+        self, score_thresh=0.05, nms=0.5, nms_aug_thickness=None, detections_per_img=100, box_coder=None,
+        nms_method="nms", soft_nms_sigma=0.5, soft_nms_score_thresh=1e-3
     ):
         """
         Arguments:
             score_thresh (float)
-            nms (float)
+            nms (float): iou threshold of nms, of the linear soft-nms decay and
+                of the wbf clusters
             detections_per_img (int)
             box_coder (BoxCoder3D)
+            nms_method (str): one of NMS_METHODS
+            soft_nms_sigma (float): of the gaussian soft-nms decay
+            soft_nms_score_thresh (float): boxes decayed below by soft-nms
+                are removed
         """
         super(PostProcessor, self).__init__()
         self.score_thresh = score_thresh
@@ -36,6 +45,10 @@ class PostProcessor(nn.Module):
             box_coder = BoxCoder3D(weights=(10., 10., 5., 5.))
         self.box_coder = box_coder
         self.nms_aug_thickness = nms_aug_thickness
+        assert nms_method in NMS_METHODS, nms_method
+        self.nms_method = nms_method
+        self.soft_nms_sigma = soft_nms_sigma
+        self.soft_nms_score_thresh = soft_nms_score_thresh
 
     def forward(self, x, boxes):
         """
@@ -98,7 +111,8 @@ class PostProcessor(nn.Module):
 
     def filter_results(self, boxlist, num_classes):
         """Returns bounding-box detection results by thresholding on scores and
-        applying non-maximum suppression (NMS).
+        applying non-maximum suppression (NMS), by class. With soft-nms, all
+        the classes are processed in one batch.
         """
         # unwrap the boxlist to avoid additional overhead.
         # if we had multi-class NMS, we could perform this directly on the boxlist
@@ -117,10 +131,16 @@ class PostProcessor(nn.Module):
             boxlist_for_class = BoxList3D(boxes_j, boxlist.size3d, mode="yx_zb",
               examples_idxscope=None, constants={'prediction':True})
             boxlist_for_class.add_field("scores", scores_j)
-            boxlist_for_class = boxlist_nms_3d(
-              boxlist_for_class, nms_thresh=self.nms,
-              nms_aug_thickness=self.nms_aug_thickness, score_field="scores", flag='roi_post'
-            )
+            if self.nms_method == "nms":
+              boxlist_for_class = boxlist_nms_3d(
+                boxlist_for_class, nms_thresh=self.nms,
+                nms_aug_thickness=self.nms_aug_thickness, score_field="scores", flag='roi_post'
+              )
+            elif self.nms_method == "wbf":
+              boxlist_for_class = boxlist_wbf_3d(
+                boxlist_for_class, self.nms,
+                nms_aug_thickness=self.nms_aug_thickness, score_field="scores"
+              )
             num_labels = len(boxlist_for_class)
             boxlist_for_class.add_field(
                 "labels", torch.full((num_labels,), j, dtype=torch.int64, device=device)
@@ -135,6 +155,13 @@ class PostProcessor(nn.Module):
                 print(f'max_score_abandoned: {max_score_abandoned}')
 
         result = cat_boxlist_3d(result, per_example=False)
+        if self.nms_method.startswith("soft_"):
+            result = boxlist_soft_nms_3d(
+              result, self.nms, method=self.nms_method[len("soft_"):],
+              sigma=self.soft_nms_sigma, score_thresh=self.soft_nms_score_thresh,
+              nms_aug_thickness=self.nms_aug_thickness, score_field="scores",
+              label_field="labels"
+            )
         number_of_detections = len(result)
 
         # Limit to max_per_image detections **over all classes**
@@ -164,6 +191,9 @@ def make_roi_box_post_processor(cfg):
         score_thresh, nms_thresh,
       nms_aug_thickness=nms_aug_thickness,
       detections_per_img=detections_per_img,
-      box_coder=box_coder
+      box_coder=box_coder,
+      nms_method=cfg.MODEL.ROI_HEADS.NMS_METHOD,
+      soft_nms_sigma=cfg.MODEL.ROI_HEADS.SOFT_NMS_SIGMA,
+      soft_nms_score_thresh=cfg.MODEL.ROI_HEADS.SOFT_NMS_SCORE_THRESH,
     )
     return postprocessor
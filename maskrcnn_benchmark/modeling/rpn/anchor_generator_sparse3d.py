@@ -169,15 +169,10 @@ class AnchorGenerator(nn.Module):
 
 
 def examples_bidx_2_sizes(examples_bidx):
-  batch_size = examples_bidx[-1]+1
-  s = torch.tensor(0)
-  e = torch.tensor(0)
-  examples_idxscope = []
-  for bi in range(batch_size):
-    e += torch.sum(examples_bidx==bi)
-    examples_idxscope.append(torch.stack([s,e]).view(1,2))
-    s = e.clone()
-  examples_idxscope = torch.cat(examples_idxscope, 0)
+  batch_size = int(examples_bidx[-1])+1
+  e = torch.cumsum(torch.bincount(examples_bidx.long(), minlength=batch_size), 0)
+  s = torch.cat([e.new_zeros(1), e[:-1]])
+  examples_idxscope = torch.stack([s,e], 1)
   return examples_idxscope
 
 
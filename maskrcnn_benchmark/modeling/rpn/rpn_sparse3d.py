@@ -8,72 +8,41 @@ from maskrcnn_benchmark.modeling.box_coder_3d import BoxCoder3D
 from .loss_3d import make_rpn_loss_evaluator
 from .anchor_generator_sparse3d import make_anchor_generator
 from .inference_3d import make_rpn_postprocessor
-from maskrcnn_benchmark.structures.bounding_box_3d import cat_scales_anchor, cat_boxlist_3d
+from maskrcnn_benchmark.structures.bounding_box_3d import cat_scales_anchor, cat_boxlist_3d, scales_to_examples_order
 from maskrcnn_benchmark.modeling.seperate_classifier import SeperateClassifier
+from maskrcnn_benchmark.utils.amp import get_amp_dtype, autocast
 
 DEBUG = True
 SHOW_TARGETS_ANCHORS = DEBUG and 0
 SHOW_PRED_GT = DEBUG and 0
 SHOW_ANCHORS_PER_LOC = DEBUG and False
 
-def cat_scales_obj_reg(objectness, rpn_box_regression, anchors):
+def cat_scales_obj_reg(objectness, rpn_box_regression, anchors, order=None):
   '''
      len(objectness) = len(rpn_box_regression) = scale num
-     objectness[i].shape: [1,yaws_num,sparse_feature_num,1]
-     rpn_box_regression[i].shape: [1,yaws_num*7,sparse_feature_num,1]
+     objectness[i].shape: [1,sparse_feature_num,yaws_num,seperate_rpn]
+     rpn_box_regression[i].shape: [1,sparse_feature_num,yaws_num,7*seperate_rpn]
      anchors.batch_size() = batch size
+     order: from scales_to_examples_order, computed if None
 
-     flatten order: [batch_size, scale_num, yaws_num, sparse_feature_num]
+     flatten order: [batch_size, scale_num, sparse_feature_num, yaws_num]
 
-     rpn_box_regression_new: [yaws_num*sparse_feature_num of all scales,7]
-     objectness_new: [yaws_num*sparse_feature_num of all scales]
+     rpn_box_regression_new: [yaws_num*sparse_feature_num of all scales,7*seperate_rpn]
+     objectness_new: [yaws_num*sparse_feature_num of all scales, seperate_rpn]
   '''
   scale_num = len(objectness)
   assert scale_num == len(rpn_box_regression) == len(anchors)
-  batch_size = anchors[0].batch_size()
-  objectness_new = []
-  rpn_box_regression_new = []
-  for b in range(batch_size):
-    objectness_new.append([])
-    rpn_box_regression_new.append([])
-
-  for s in range(scale_num):
-    assert objectness[s].shape[0] == 1
-    seperate_rpn = objectness[s].shape[-1]
-    assert rpn_box_regression[s].shape[0] == 1
-    assert rpn_box_regression[s].shape[-1] == 7 * seperate_rpn
-
-    yaws_num = objectness[s].shape[2]
-    examples_idxscope = anchors[s].examples_idxscope
-
-    objectness_s = objectness[s].reshape(-1, seperate_rpn)
-    rpn_box_regression_s = rpn_box_regression[s].reshape(-1,7*seperate_rpn)
-    regression_flag = 'yaws_num_first'
-    for b in range(batch_size):
-      begin,end = examples_idxscope[b]
-      obj = objectness_s[begin:end] # [yaws_num, sparse_feature_num]
-      objectness_new[b].append( obj )
-      reg = rpn_box_regression_s[begin:end] # [yaws_num*7, sparse_feature_num]
-
-      #if regression_flag == 'yaws_num_first':
-      #  reg = reg.view(yaws_num, 7, -1)
-      #  reg = reg.permute(0,2,1)
-      #elif regression_flag == 'boxreg_first':
-      #  reg = reg.view(7, yaws_num, -1)
-      #  reg = reg.permute(1,2,0)
-      #else:
-      #  raise NotImplementedError
-      #reg = reg.reshape(-1,7)
-
-      rpn_box_regression_new[b].append( reg )
-
-  for b in range(batch_size):
-    objectness_new[b] = torch.cat(objectness_new[b], 0)
-    rpn_box_regression_new[b] = torch.cat(rpn_box_regression_new[b], 0)
-
-  objectness_new = torch.cat(objectness_new, 0)
-  rpn_box_regression_new = torch.cat(rpn_box_regression_new, 0)
-
+  if order is None:
+    order, _ = scales_to_examples_order([a.examples_idxscope for a in anchors])
+  seperate_rpn = objectness[0].shape[-1]
+  assert all(o.shape[0] == 1 and o.shape[-1] == seperate_rpn for o in objectness)
+  assert all(r.shape[0] == 1 and r.shape[-1] == 7*seperate_rpn for r in rpn_box_regression)
+
+  objectness_new = torch.cat([o.reshape(-1, seperate_rpn) for o in objectness], 0)
+  rpn_box_regression_new = torch.cat([r.reshape(-1, 7*seperate_rpn) for r in rpn_box_regression], 0)
+  order = order.to(objectness_new.device)
+  objectness_new = objectness_new.index_select(0, order)
+  rpn_box_regression_new = rpn_box_regression_new.index_select(0, order)
   return objectness_new, rpn_box_regression_new
 
 
@@ -164,6 +133,7 @@ class RPNModule(torch.nn.Module):
         self.box_selector_test = box_selector_test
         self.loss_evaluator = loss_evaluator
         self.add_gt_proposals = cfg.MODEL.RPN.ADD_GT_PROPOSALS
+        self.amp_dtype = get_amp_dtype(cfg)
 
     def forward(self, inputs_sparse, features_sparse, targets=None):
         """
@@ -189,11 +159,16 @@ class RPNModule(torch.nn.Module):
         # features[l]: [1,channels_num, n, 1]
         # n is a flatten of all the locations of all examples in a batch.
         # Because the feature map size in a batch may be diff for each example
-        objectness, rpn_box_regression = self.head(features)
+        with autocast(self.amp_dtype):
+          objectness, rpn_box_regression = self.head(features)
+        # box coding and nms in float32
+        objectness = [o.float() for o in objectness]
+        rpn_box_regression = [r.float() for r in rpn_box_regression]
         anchors = self.anchor_generator(inputs_sparse, features_sparse, targets)
-        objectness, rpn_box_regression = cat_scales_obj_reg(objectness, rpn_box_regression, anchors)
+        order, examples_idxscope = scales_to_examples_order([a.examples_idxscope for a in anchors])
+        objectness, rpn_box_regression = cat_scales_obj_reg(objectness, rpn_box_regression, anchors, order)
         scale_num = len(anchors)
-        anchors = cat_scales_anchor(anchors)
+        anchors = cat_scales_anchor(anchors, order, examples_idxscope)
         anchors.constants['scale_num'] = scale_num
         anchors.constants['num_anchors_per_location'] = self.head.num_anchors_per_location
 
@@ -313,14 +288,9 @@ def build_rpn(cfg):
 
 
 def examples_bidx_2_sizes(examples_bidx):
-  batch_size = examples_bidx[-1]+1
-  s = torch.tensor(0)
-  e = torch.tensor(0)
-  examples_idxscope = []
-  for bi in range(batch_size):
-    e += torch.sum(examples_bidx==bi)
-    examples_idxscope.append(torch.stack([s,e]).view(1,2))
-    s = e.clone()
-  examples_idxscope = torch.cat(examples_idxscope, 0)
+  batch_size = int(examples_bidx[-1])+1
+  e = torch.cumsum(torch.bincount(examples_bidx.long(), minlength=batch_size), 0)
+  s = torch.cat([e.new_zeros(1), e[:-1]])
+  examples_idxscope = torch.stack([s,e], 1)
   return examples_idxscope
 
@@ -2,3 +2,4 @@
 from .build import make_optimizer
 from .build import make_lr_scheduler
 from .lr_scheduler import WarmupMultiStepLR
+from .nonfinite import loss_is_finite, mask_nonfinite_grads
@@ -0,0 +1,27 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import torch
+import torch.distributed as dist
+
+
+def loss_is_finite(losses):
+    """
+    Device flag (0-dim float, 1 or 0) of a finite loss on every process, so
+    that all the processes take the same decision without reading it back.
+    """
+    finite = torch.isfinite(losses.detach()).float()
+    if dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1:
+        dist.all_reduce(finite, op=dist.ReduceOp.MIN)
+    return finite
+
+
+def mask_nonfinite_grads(optimizer, finite):
+    """
+    Zero all the gradients if finite (from loss_is_finite) is 0, on the
+    device, before optimizer.step(): the nan of a bad iteration does not reach
+    the weights. The momentum and the weight decay still apply for this step.
+    """
+    finite = finite > 0
+    for group in optimizer.param_groups:
+        for p in group["params"]:
+            if p.grad is not None:
+                p.grad.copy_(torch.where(finite, p.grad, torch.zeros_like(p.grad)))
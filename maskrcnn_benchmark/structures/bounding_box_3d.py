@@ -87,26 +87,55 @@ def cat_boxlist_3d(bboxes_ls, per_example, use_constants0=False):
     return cat_boxes
 
 
-def cat_scales_anchor(anchors):
+def scales_to_examples_order(examples_idxscopes):
+    '''
+     Gather index to reorder the concatenation of all scales, which is in
+     order [scale_num, batch_size, n], to [batch_size, scale_num, n].
+     examples_idxscopes: list of [batch_size,2], one per scale
+
+     order: [N] index into the scale-major concatenation
+     examples_idxscope: [batch_size,2] of the example-major result
+    '''
+    scopes = torch.stack([ei.long().cpu() for ei in examples_idxscopes], 0) # [scale_num, batch_size, 2]
+    scale_num, batch_size = scopes.shape[0:2]
+    scale_sizes = scopes[:,-1,1]
+    scale_offsets = torch.cumsum(scale_sizes, 0) - scale_sizes
+    # batch-major [batch_size * scale_num]
+    starts = (scopes[:,:,0] + scale_offsets.view(-1,1)).t().reshape(-1)
+    lengths = (scopes[:,:,1] - scopes[:,:,0]).t().reshape(-1)
+    new_starts = torch.cumsum(lengths, 0) - lengths
+    order = torch.arange(int(lengths.sum())) + torch.repeat_interleave(starts - new_starts, lengths)
+
+    example_ends = torch.cumsum(lengths.view(batch_size, scale_num).sum(1), 0)
+    example_starts = torch.cat([example_ends.new_zeros(1), example_ends[:-1]])
+    examples_idxscope = torch.stack([example_starts, example_ends], 1).int()
+    return order, examples_idxscope
+
+
+def cat_scales_anchor(anchors, order=None, examples_idxscope=None):
     '''
      combine anchors of scales
      anchors: list(BoxList)
+     order, examples_idxscope: from scales_to_examples_order, computed if None
 
      anchors_new: BoxList
      final flatten order:  [batch_size, scale_num, sparse_location_num, yaws_num]
     '''
-    scale_num = len(anchors)
+    if order is None:
+      order, examples_idxscope = scales_to_examples_order([a.examples_idxscope for a in anchors])
     batch_size = anchors[0].batch_size()
-    anchors_scales = []
-    for s in range(scale_num):
-      anchors_scales.append( anchors[s].seperate_examples() )
-
-    #num_examples = [[len(an) for an in ans] for ans in anchors_scales] # [batch_size, scale_num]
-
-    examples = []
-    for b in range(batch_size):
-      examples.append( cat_boxlist_3d([ans[b] for ans in anchors_scales], per_example=False ) )
-    anchors_all_scales = cat_boxlist_3d(examples, per_example=True)
+    assert all(a.batch_size() == batch_size for a in anchors)
+    mode = anchors[0].mode
+    assert all(a.mode == mode for a in anchors)
+    fields = set(anchors[0].fields())
+    assert all(set(a.fields()) == fields for a in anchors)
+
+    bbox3d = _cat([a.bbox3d for a in anchors], dim=0)
+    bbox3d = bbox3d.index_select(0, order.to(bbox3d.device))
+    anchors_all_scales = BoxList3D(bbox3d, anchors[0].size3d, mode, examples_idxscope, constants=anchors[0].constants)
+    for field in fields:
+      data = _cat([a.get_field(field) for a in anchors], dim=0)
+      anchors_all_scales.add_field(field, data.index_select(0, order.to(data.device)))
     return anchors_all_scales
 
 
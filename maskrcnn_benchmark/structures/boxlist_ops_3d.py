@@ -8,6 +8,7 @@ from maskrcnn_benchmark.layers import nms as _box_nms
 from second.pytorch.core.box_torch_ops import rotate_nms, rotate_nms_3d, multiclass_nms
 from utils3d.rotate_nms_3d_torch import boxes_iou_3d
 from second.core.non_max_suppression.nms_gpu import rotate_iou_gpu_eval
+from utils3d.geometric_torch import limit_period
 
 DEBUG = False
 
@@ -62,6 +63,150 @@ def boxlist_nms_3d(boxlist, nms_thresh, nms_aug_thickness=None, max_proposals=-1
     return boxlist
 
 
+def boxlist_wbf_3d(boxlist, iou_thresh, nms_aug_thickness=None, score_field="scores", models_num=1):
+    """
+    Rotated weighted box fusion of a boxlist of one example and one label.
+    In decreasing score order, each box not clustered yet starts a cluster
+    with all the unclustered boxes overlapping it by more than iou_thresh.
+    Each cluster is fused to one box: the boxes are averaged with the scores
+    as weights, the yaw with period pi. The fused score is the mean score of
+    the cluster, times min(cluster size, models_num) / models_num, so that
+    a box found by few of models_num predictions is less confident.
+
+    Arguments:
+        boxlist(BoxList3D): yx_zb
+        iou_thresh (float)
+        nms_aug_thickness: [y, z] min thickness for the iou, as boxlist_nms_3d
+        score_field (str)
+        models_num (int): number of predictions fused, e.g. augmented copies
+
+    Returns:
+        boxlist(BoxList3D): one box per cluster, the other fields are the ones
+            of the highest scored box of the cluster
+    """
+    assert boxlist.mode == 'yx_zb'
+    if len(boxlist) == 0:
+      return boxlist
+    if nms_aug_thickness is None:
+      nms_aug_thickness = [0,0]
+
+    scores = boxlist.get_field(score_field)
+    order = torch.sort(scores, descending=True)[1]
+    boxlist = boxlist[order]
+    scores = scores[order]
+    bbox3d = boxlist.bbox3d.clone().detach()
+    bbox3d[:,3:5]=  torch.clamp(bbox3d[:,3:5], min=nms_aug_thickness[0])
+    bbox3d[:,5]=  torch.clamp(bbox3d[:,5], min=nms_aug_thickness[1])
+    ious = boxes_iou_3d(bbox3d, bbox3d, None, -1, flag='roi_post').cpu()
+
+    n = len(boxlist)
+    # one vectorized step per cluster: the first free box is the seed
+    overlaps = (ious > iou_thresh).numpy().astype(np.bool_)
+    free = np.ones(n, dtype=np.bool_)
+    cluster = np.zeros(n, dtype=np.int64)
+    seeds = []
+    while free.any():
+      i = int(np.argmax(free))
+      members = overlaps[i] & free
+      members[i] = True
+      cluster[members] = len(seeds)
+      free &= ~members
+      seeds.append(i)
+    k = len(seeds)
+    cluster = torch.from_numpy(cluster).to(scores.device)
+
+    boxes = boxlist.bbox3d
+    wsum = scores.new_zeros(k).index_add_(0, cluster, scores)
+    fused = boxes.new_zeros(k, 7).index_add_(0, cluster, boxes * scores[:,None])
+    fused = fused / wsum[:,None]
+    sin2 = scores.new_zeros(k).index_add_(0, cluster, scores * torch.sin(2 * boxes[:,6]))
+    cos2 = scores.new_zeros(k).index_add_(0, cluster, scores * torch.cos(2 * boxes[:,6]))
+    fused[:,6] = limit_period(0.5 * torch.atan2(sin2, cos2), 0.5, np.pi)
+
+    count = torch.bincount(cluster, minlength=k).to(scores.dtype)
+    fused_scores = wsum / count * torch.clamp(count, max=models_num) / models_num
+
+    result = boxlist[seeds]
+    result.bbox3d = fused
+    result.add_field(score_field, fused_scores)
+    return result
+
+
+def boxlist_soft_nms_3d(boxlist, nms_thresh, method="linear", sigma=0.5, score_thresh=1e-3,
+                        nms_aug_thickness=None, score_field="scores", label_field=None,
+                        pre_max_size=2000, check_period=8):
+    """
+    Rotated 3D soft-NMS. In decreasing score order, each box decays the
+    scores of the boxes not selected yet by their iou with it:
+    linear: s *= 1 - iou if iou > nms_thresh, gaussian: s *= exp(-iou^2 / sigma).
+    The iou matrix is computed once (cpu or cuda, as boxes_iou_3d), the
+    decay is vectorized over the boxes and runs on the device of the boxes,
+    reading back to the host only every
+    check_period steps, to stop once all the remaining scores are below
+    score_thresh.
+
+    Arguments:
+        boxlist(BoxList3D): yx_zb, one example
+        nms_thresh (float): iou threshold of the linear decay
+        method (str): "linear" or "gaussian"
+        sigma (float): of the gaussian decay
+        score_thresh (float): the boxes decayed below are removed
+        nms_aug_thickness: [y, z] min thickness for the iou, as boxlist_nms_3d
+        score_field (str)
+        label_field (str): if set, only the boxes of the same label decay each
+            other, so all the classes are processed in one batch
+        pre_max_size (int): only the top pre_max_size boxes are processed
+        check_period (int): steps between two checks for an early stop
+
+    Returns:
+        boxlist(BoxList3D): the kept boxes in decreasing decayed score order,
+            with the decayed scores in score_field
+    """
+    assert boxlist.mode == 'yx_zb'
+    assert method in ("linear", "gaussian"), method
+    if len(boxlist) == 0:
+      return boxlist
+    if nms_aug_thickness is None:
+      nms_aug_thickness = [0,0]
+
+    scores = boxlist.get_field(score_field)
+    order = torch.sort(scores, descending=True)[1][:pre_max_size]
+    boxlist = boxlist[order]
+    scores = scores[order].clone().detach()
+    bbox3d = boxlist.bbox3d.clone().detach()
+    bbox3d[:,3:5]=  torch.clamp(bbox3d[:,3:5], min=nms_aug_thickness[0])
+    bbox3d[:,5]=  torch.clamp(bbox3d[:,5], min=nms_aug_thickness[1])
+    ious = boxes_iou_3d(bbox3d, bbox3d, None, -1, flag='roi_post').to(scores.device)
+    if label_field is not None:
+      labels = boxlist.get_field(label_field)
+      ious = ious * (labels[:,None] == labels[None,:]).to(ious.dtype)
+    if method == "linear":
+      decays = torch.where(ious > nms_thresh, 1 - ious, torch.ones_like(ious))
+    else:
+      decays = torch.exp(-ious * ious / sigma)
+
+    n = len(boxlist)
+    selected = torch.zeros(n, dtype=torch.bool, device=scores.device)
+    picks = []
+    for step in range(n):
+      # stop when all the remaining scores are below score_thresh: they can
+      # only decay further. Checked every check_period steps, as reading the
+      # max synchronizes the device
+      if step % check_period == 0 and step > 0 and \
+          scores.masked_fill(selected, -1).max().item() < score_thresh:
+        break
+      i = scores.masked_fill(selected, -1).argmax().view(1)
+      selected.index_fill_(0, i, True)
+      scores = scores * decays.index_select(0, i)[0].masked_fill(selected, 1)
+      picks.append(i)
+    picks = torch.cat(picks)
+    scores = scores[picks]
+    keep = picks[scores >= score_thresh]
+    result = boxlist[keep]
+    result.add_field(score_field, scores[scores >= score_thresh])
+    return result
+
+
 def remove_small_boxes3d(boxlist, min_size):
     """
     Only keep boxes with both sides >= min_size
@@ -0,0 +1,43 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Mixed precision helpers.
+The SparseConvNet kernels only support float32, so the backbone always runs
+in float32 and only the dense heads (RPN Conv2d, ROI MLP) are autocast.
+Box coding, IoU and NMS take the float32 head outputs.
+torch.cuda.amp and the dtypes are only looked up when AMP is on, so that the
+float32 path keeps working with the torch versions without them.
+"""
+import contextlib
+
+import torch
+
+_AMP_DTYPES = ("float16", "bfloat16")
+
+
+def get_amp_dtype(cfg):
+    """
+    Returns the autocast dtype, or None if SOLVER.AMP is off.
+    """
+    if not cfg.SOLVER.AMP:
+        return None
+    assert cfg.SOLVER.AMP_DTYPE in _AMP_DTYPES, cfg.SOLVER.AMP_DTYPE
+    return getattr(torch, cfg.SOLVER.AMP_DTYPE)
+
+
+def autocast(dtype):
+    """
+    autocast context for dtype, does nothing if dtype is None.
+    """
+    if dtype is None:
+        return contextlib.suppress()
+    return torch.cuda.amp.autocast(dtype=dtype)
+
+
+def make_grad_scaler(cfg):
+    """
+    Dynamic loss scaler for float16, None otherwise: float32 and bfloat16
+    (with the float32 exponent range) need no scaling.
+    """
+    if get_amp_dtype(cfg) != torch.float16:
+        return None
+    return torch.cuda.amp.GradScaler()
@@ -1,6 +1,11 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import glob
 import logging
 import os
+import queue
+import re
+import threading
+import time
 
 import torch
 
@@ -19,7 +24,19 @@ class Checkpointer(object):
         save_dir="",
         save_to_disk=None,
         logger=None,
+        async_save=False,
+        max_in_flight=1,
+        keep_last=0,
+        rotate_pattern=r"model_\d{7}",
     ):
+        """
+        async_save: snapshot the state to (pinned) cpu memory and write it
+            from a background thread, so training is not blocked by the disk.
+        max_in_flight: max number of async saves not written yet, save()
+            blocks when it is reached.
+        keep_last: if > 0, only keep the last keep_last checkpoints whose
+            name fully matches rotate_pattern.
+        """
         self.model = model
         self.optimizer = optimizer
         self.scheduler = scheduler
@@ -28,6 +45,18 @@ class Checkpointer(object):
         if logger is None:
             logger = logging.getLogger(__name__)
         self.logger = logger
+        self.async_save = async_save
+        self.keep_last = keep_last
+        self.rotate_pattern = re.compile(rotate_pattern)
+        # (name, seconds training was blocked, seconds to write)
+        self.save_times = []
+        self._lock = threading.Lock()
+        if async_save:
+            self._in_flight = threading.Semaphore(max_in_flight)
+            self._queue = queue.Queue()
+            self._error = None
+            self._worker = threading.Thread(target=self._write_loop, daemon=True)
+            self._worker.start()
 
     def save(self, name, **kwargs):
         if not self.save_dir:
@@ -36,6 +65,11 @@ class Checkpointer(object):
         if not self.save_to_disk:
             return
 
+        start = time.time()
+        if self.async_save:
+            self._raise_write_error()
+            self._in_flight.acquire()
+
         data = {}
         data["model"] = self.model.state_dict()
         if self.optimizer is not None:
@@ -46,8 +80,69 @@ class Checkpointer(object):
 
         save_file = os.path.join(self.save_dir, "{}.pth".format(name))
         self.logger.info("Saving checkpoint to {}".format(save_file))
-        torch.save(data, save_file)
+        if self.async_save:
+            data, copy_done = _snapshot_to_cpu(data)
+            self._queue.put((name, save_file, data, copy_done, time.time() - start))
+        else:
+            self._write(name, save_file, data, time.time() - start)
+
+    def wait(self):
+        """
+        Block until all async saves are written.
+        """
+        if self.async_save:
+            self._queue.join()
+            self._raise_write_error()
+
+    def pop_save_times(self):
+        with self._lock:
+            save_times, self.save_times = self.save_times, []
+        return save_times
+
+    def _write_loop(self):
+        while True:
+            name, save_file, data, copy_done, blocked = self._queue.get()
+            try:
+                if copy_done is not None:
+                    copy_done.synchronize()
+                self._write(name, save_file, data, blocked)
+            except Exception as e:
+                self.logger.error("Failed to save {}: {}".format(save_file, e))
+                self._error = e
+            finally:
+                self._in_flight.release()
+                self._queue.task_done()
+
+    def _raise_write_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _write(self, name, save_file, data, blocked):
+        start = time.time()
+        # write to a temp file and rename, so that save_file is never partial
+        tmp_file = save_file + ".tmp"
+        torch.save(data, tmp_file)
+        os.replace(tmp_file, save_file)
         self.tag_last_checkpoint(save_file)
+        self._rotate()
+        write_time = time.time() - start
+        if not self.async_save:
+            blocked += write_time
+        with self._lock:
+            self.save_times.append((name, blocked, write_time))
+
+    def _rotate(self):
+        if self.keep_last <= 0:
+            return
+        files = [
+            f for f in glob.glob(os.path.join(self.save_dir, "*.pth"))
+            if self.rotate_pattern.fullmatch(os.path.basename(f)[: -len(".pth")])
+        ]
+        files.sort(key=lambda f: (os.path.getmtime(f), f))
+        for f in files[: -self.keep_last]:
+            self.logger.info("Removing old checkpoint {}".format(f))
+            os.remove(f)
 
     def load(self, f=None):
         if self.has_checkpoint():
@@ -88,8 +183,9 @@ class Checkpointer(object):
 
     def tag_last_checkpoint(self, last_filename):
         save_file = os.path.join(self.save_dir, "last_checkpoint")
-        with open(save_file, "w") as f:
+        with open(save_file + ".tmp", "w") as f:
             f.write(last_filename)
+        os.replace(save_file + ".tmp", save_file)
 
     def _load_file(self, f):
         return torch.load(f, map_location=torch.device("cpu"))
@@ -98,6 +194,38 @@ class Checkpointer(object):
         load_state_dict(self.model, checkpoint.pop("model"))
 
 
+def _snapshot_to_cpu(data):
+    """
+    Copy all tensors in data to new cpu tensors, so that training can go on
+    modifying the originals. Cuda tensors are copied asynchronously to pinned
+    memory, wait for the returned event before reading the copies.
+    """
+    has_cuda = [False]
+
+    def copy(d):
+        if isinstance(d, torch.Tensor):
+            if d.is_cuda:
+                has_cuda[0] = True
+                t = torch.empty(d.size(), dtype=d.dtype, pin_memory=True)
+                return t.copy_(d.detach(), non_blocking=True)
+            return d.detach().clone()
+        if isinstance(d, dict):
+            out = type(d)((k, copy(v)) for k, v in d.items())
+            if hasattr(d, "_metadata"):
+                out._metadata = d._metadata
+            return out
+        if isinstance(d, (list, tuple)):
+            return type(d)(copy(v) for v in d)
+        return d
+
+    data = copy(data)
+    copy_done = None
+    if has_cuda[0]:
+        copy_done = torch.cuda.Event()
+        copy_done.record()
+    return data, copy_done
+
+
 class DetectronCheckpointer(Checkpointer):
     def __init__(
         self,
@@ -110,7 +238,10 @@ class DetectronCheckpointer(Checkpointer):
         logger=None,
     ):
         super(DetectronCheckpointer, self).__init__(
-            model, optimizer, scheduler, save_dir, save_to_disk, logger
+            model, optimizer, scheduler, save_dir, save_to_disk, logger,
+            async_save=cfg.SOLVER.ASYNC_CHECKPOINT,
+            max_in_flight=cfg.SOLVER.CHECKPOINT_MAX_IN_FLIGHT,
+            keep_last=cfg.SOLVER.CHECKPOINT_KEEP_LAST,
         )
         self.cfg = cfg.clone()
 
@@ -4,10 +4,7 @@ This file contains primitives for multi-gpu communication.
 This is useful when doing distributed training.
 """
 
-import os
 import pickle
-import tempfile
-import time
 
 import torch
 
@@ -38,54 +35,66 @@ def is_main_process():
 
 def synchronize():
     """
-    Helper function to synchronize between multiple processes when
+    Helper function to synchronize (barrier) among all processes when
     using distributed training
     """
-    if not torch.distributed.is_available():
-        return
-    if not torch.distributed.is_initialized():
+    if get_world_size() == 1:
         return
-    world_size = torch.distributed.get_world_size()
-    rank = torch.distributed.get_rank()
+    torch.distributed.barrier()
+
+
+def _gather_device():
+    # nccl only exchanges cuda tensors, gloo only cpu tensors
+    if torch.distributed.get_backend() == "nccl":
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+
+def all_gather_tensor(tensor):
+    """
+    All-gather tensors whose first dimension differs between processes.
+    The other dimensions and the dtype must be the same.
+
+    Returns:
+        list[Tensor]: the tensor of each rank, on the device of tensor
+    """
+    world_size = get_world_size()
     if world_size == 1:
-        return
+        return [tensor]
+    out_device = tensor.device
+    device = _gather_device()
+    tensor = tensor.to(device)
+
+    # obtain the first dimension of each rank and pad to the max
+    local_size = torch.tensor([tensor.shape[0]], dtype=torch.int64, device=device)
+    size_list = [torch.zeros_like(local_size) for _ in range(world_size)]
+    torch.distributed.all_gather(size_list, local_size)
+    size_list = [int(size.item()) for size in size_list]
+    max_size = max(size_list)
+
+    padded = tensor.new_zeros((max_size,) + tuple(tensor.shape[1:]))
+    padded[: tensor.shape[0]] = tensor
+    tensor_list = [torch.empty_like(padded) for _ in range(world_size)]
+    torch.distributed.all_gather(tensor_list, padded)
+    return [t[:size].to(out_device) for t, size in zip(tensor_list, size_list)]
+
+
+def all_gather(data):
+    """
+    Run all_gather on arbitrary picklable data (not necessarily tensors).
+    Only use it for small data, pack large tensors and use all_gather_tensor.
+
+    Returns:
+        list[data]: list of data gathered from each rank
+    """
+    if get_world_size() == 1:
+        return [data]
+    buffer = pickle.dumps(data)
+    tensor = torch.ByteTensor(torch.ByteStorage.from_buffer(buffer))
+    tensor_list = all_gather_tensor(tensor)
+    return [pickle.loads(t.numpy().tobytes()) for t in tensor_list]
+
 
-    def _send_and_wait(r):
-        if rank == r:
-            tensor = torch.tensor(0, device="cuda")
-        else:
-            tensor = torch.tensor(1, device="cuda")
-        torch.distributed.broadcast(tensor, r)
-        while tensor.item() == 1:
-            time.sleep(1)
-
-    _send_and_wait(0)
-    # now sync on the main process
-    _send_and_wait(1)
-
-
-def _encode(encoded_data, data):
-    # gets a byte representation for the data
-    encoded_bytes = pickle.dumps(data)
-    # convert this byte string into a byte tensor
-    storage = torch.ByteStorage.from_buffer(encoded_bytes)
-    tensor = torch.ByteTensor(storage).to("cuda")
-    # encoding: first byte is the size and then rest is the data
-    s = tensor.numel()
-    assert s <= 255, "Can't encode data greater than 255 bytes"
-    # put the encoded data in encoded_data
-    encoded_data[0] = s
-    encoded_data[1 : (s + 1)] = tensor
-
-
-def _decode(encoded_data):
-    size = encoded_data[0]
-    encoded_tensor = encoded_data[1 : (size + 1)].to("cpu")
-    return pickle.loads(bytearray(encoded_tensor.tolist()))
-
-
-# TODO try to use tensor in shared-memory instead of serializing to disk
-# this involves getting the all_gather to work
 def scatter_gather(data):
     """
     This function gathers data from multiple processes, and returns them
@@ -94,64 +103,16 @@ def scatter_gather(data):
     This function is useful for retrieving data from multiple processes,
     when launching the code with torch.distributed.launch
 
-    Note: this function is slow and should not be used in tight loops, i.e.,
-    do not use it in the training loop.
-
     Arguments:
         data: the object to be gathered from multiple processes.
             It must be serializable
 
     Returns:
-        result (list): a list with as many elements as there are processes,
-            where each element i in the list corresponds to the data that was
-            gathered from the process of rank i.
+        result (list): on the main process, a list with as many elements as
+            there are processes, where each element i in the list corresponds
+            to the data that was gathered from the process of rank i.
+            None on the other processes.
     """
-    # strategy: the main process creates a temporary directory, and communicates
-    # the location of the temporary directory to all other processes.
-    # each process will then serialize the data to the folder defined by
-    # the main process, and then the main process reads all of the serialized
-    # files and returns them in a list
-    if not torch.distributed.is_available():
-        return [data]
-    if not torch.distributed.is_initialized():
-        return [data]
-    synchronize()
-    # get rank of the current process
-    rank = torch.distributed.get_rank()
-
-    # the data to communicate should be small
-    data_to_communicate = torch.empty(256, dtype=torch.uint8, device="cuda")
-    if rank == 0:
-        # manually creates a temporary directory, that needs to be cleaned
-        # afterwards
-        tmp_dir = tempfile.mkdtemp()
-        _encode(data_to_communicate, tmp_dir)
-
-    synchronize()
-    # the main process (rank=0) communicates the data to all processes
-    torch.distributed.broadcast(data_to_communicate, 0)
-
-    # get the data that was communicated
-    tmp_dir = _decode(data_to_communicate)
-
-    # each process serializes to a different file
-    file_template = "file{}.pth"
-    tmp_file = os.path.join(tmp_dir, file_template.format(rank))
-    torch.save(data, tmp_file)
-
-    # synchronize before loading the data
-    synchronize()
-
-    # only the master process returns the data
-    if rank == 0:
-        data_list = []
-        world_size = torch.distributed.get_world_size()
-        for r in range(world_size):
-            file_path = os.path.join(tmp_dir, file_template.format(r))
-            d = torch.load(file_path)
-            data_list.append(d)
-            # cleanup
-            os.remove(file_path)
-        # cleanup
-        os.rmdir(tmp_dir)
+    data_list = all_gather(data)
+    if get_rank() == 0:
         return data_list
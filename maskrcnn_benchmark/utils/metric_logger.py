@@ -8,29 +8,29 @@ import torch
 class SmoothedValue(object):
     """Track a series of values and provide access to smoothed values over a
     window or the global series average.
+    Only the window is kept, the global average is streamed, so the memory
+    does not grow with the number of updates.
     """
 
     def __init__(self, window_size=20):
         self.deque = deque(maxlen=window_size)
-        self.series = []
         self.total = 0.0
         self.count = 0
 
     def update(self, value):
         self.deque.append(value)
-        self.series.append(value)
         self.count += 1
         self.total += value
 
     @property
     def median(self):
-        d = torch.tensor(list(self.deque))
-        return d.median().item()
+        # the lower median, as torch.median
+        d = sorted(self.deque)
+        return d[(len(d) - 1) // 2]
 
     @property
     def avg(self):
-        d = torch.tensor(list(self.deque))
-        return d.mean().item()
+        return sum(self.deque) / len(self.deque)
 
     @property
     def global_avg(self):
@@ -38,19 +38,52 @@ class SmoothedValue(object):
 
 
 class MetricLogger(object):
-    def __init__(self, delimiter="\t"):
+    """
+    Tensor values are kept on their device and only read, all of them at
+    once, when a meter is read (or max_pending values are waiting), so that
+    update() does not synchronize the device at each iteration.
+    """
+
+    def __init__(self, delimiter="\t", max_pending=1000):
         self.meters = defaultdict(SmoothedValue)
         self.delimiter = delimiter
+        self.max_pending = max_pending
+        # [(name, scalar tensor)] not read yet
+        self.pending = []
 
     def update(self, **kwargs):
         for k, v in kwargs.items():
             if isinstance(v, torch.Tensor):
-                v = v.item()
+                self.pending.append((k, v.detach().reshape([])))
+                continue
             assert isinstance(v, (float, int))
             self.meters[k].update(v)
+        if len(self.pending) >= self.max_pending:
+            self.synchronize()
+
+    def synchronize(self):
+        """
+        Read the pending tensor values, with one copy per device, in the
+        order of the updates.
+        """
+        if len(self.pending) == 0:
+            return
+        pending, self.pending = self.pending, []
+        by_device = defaultdict(list)
+        for i, (_, v) in enumerate(pending):
+            by_device[v.device].append(i)
+        values = [None] * len(pending)
+        for ids in by_device.values():
+            stacked = torch.stack([pending[i][1].float() for i in ids])
+            for i, value in zip(ids, stacked.tolist()):
+                values[i] = value
+        for (k, _), value in zip(pending, values):
+            self.meters[k].update(value)
 
     def __getattr__(self, attr):
-        if attr in self.meters:
+        if "pending" in self.__dict__ and any(k == attr for k, _ in self.pending):
+            self.synchronize()
+        if attr in self.__dict__.get("meters", ()):
             return self.meters[attr]
         if attr in self.__dict__:
             return self.__dict__[attr]
@@ -58,6 +91,7 @@ class MetricLogger(object):
                     type(self).__name__, attr))
 
     def __str__(self):
+        self.synchronize()
         loss_str = []
         for name, meter in self.meters.items():
             loss_str.append(
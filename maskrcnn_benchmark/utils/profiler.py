@@ -0,0 +1,201 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import torch
+
+
+def _reset_peak_memory():
+    if hasattr(torch.cuda, "reset_peak_memory_stats"):
+        torch.cuda.reset_peak_memory_stats()
+    else:
+        torch.cuda.reset_max_memory_allocated()
+
+
+class StageProfiler(object):
+    """
+    Wall time and peak memory of the named stages of each iteration.
+    On cuda, the stages are timed by cuda events that are only read in
+    step(), once per iteration, so the stages do not synchronize. On cpu,
+    by time.perf_counter and without memory.
+    The stages may be nested. A stage run several times in one iteration is
+    summed up (time) or maxed (memory).
+    The first trace_iters iterations are written to trace_fn as a chrome
+    trace (chrome://tracing or ui.perfetto.dev).
+    """
+
+    def __init__(self, device, trace_fn=None, trace_iters=20, pid=0):
+        self.use_cuda = torch.device(device).type == "cuda" and torch.cuda.is_available()
+        self.trace_fn = trace_fn
+        self.trace_iters = trace_iters if trace_fn else 0
+        self.pid = pid
+        self.iteration = 0
+        # [name, start, mem at start, peak] of the open stages
+        self.open = []
+        # (name, start, end, peak) of the closed stages of this iteration
+        self.records = []
+        self.trace = []
+        self.max_memory = 0
+        self.origin = self._now()
+
+    def _now(self):
+        if self.use_cuda:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            return event
+        return time.perf_counter()
+
+    def _elapsed_ms(self, t0, t1):
+        if self.use_cuda:
+            return t0.elapsed_time(t1)
+        return (t1 - t0) * 1000.0
+
+    def _peak(self):
+        peak = torch.cuda.max_memory_allocated()
+        self.max_memory = max(self.max_memory, peak)
+        return peak
+
+    def start(self, name):
+        mem = 0
+        if self.use_cuda:
+            if len(self.open) > 0:
+                self.open[-1][3] = max(self.open[-1][3], self._peak())
+            mem = torch.cuda.memory_allocated()
+            _reset_peak_memory()
+        self.open.append([name, self._now(), mem, mem])
+
+    def end(self, name):
+        end = self._now()
+        name0, start, mem, peak = self.open.pop()
+        assert name0 == name, f"stage {name} ends inside stage {name0}"
+        stage_peak = None
+        if self.use_cuda:
+            peak = max(peak, self._peak())
+            if len(self.open) > 0:
+                self.open[-1][3] = max(self.open[-1][3], peak)
+            stage_peak = peak - mem
+        self.records.append((name, start, end, stage_peak))
+
+    @contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def step(self, meters=None):
+        """
+        Close the iteration: read the times of its stages, add them to the
+        trace and to meters (MetricLogger) as prof_<stage>_ms and
+        prof_<stage>_mb.
+        Returns: times (dict: stage -> ms), mems (dict: stage -> MB)
+        """
+        assert len(self.open) == 0, f"stages not ended: {[o[0] for o in self.open]}"
+        if self.use_cuda:
+            torch.cuda.synchronize()
+        times, mems = {}, {}
+        for name, start, end, peak in self.records:
+            ms = self._elapsed_ms(start, end)
+            times[name] = times.get(name, 0.0) + ms
+            if peak is not None:
+                mems[name] = max(mems.get(name, 0.0), peak / 1024.0 / 1024.0)
+            if self.iteration < self.trace_iters:
+                args = {"iteration": self.iteration}
+                if peak is not None:
+                    args["peak_mem_mb"] = peak / 1024.0 / 1024.0
+                self.trace.append({
+                    "name": name, "ph": "X", "pid": self.pid, "tid": 0,
+                    "ts": self._elapsed_ms(self.origin, start) * 1000.0,
+                    "dur": ms * 1000.0, "args": args})
+        self.records = []
+        self.iteration += 1
+        if self.iteration == self.trace_iters:
+            self.dump_trace()
+        if meters is not None:
+            stats = {f"prof_{k}_ms": v for k, v in times.items()}
+            stats.update({f"prof_{k}_mb": v for k, v in mems.items()})
+            meters.update(**stats)
+        return times, mems
+
+    def dump_trace(self):
+        if not self.trace_fn or len(self.trace) == 0:
+            return
+        trace_dir = os.path.dirname(self.trace_fn)
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+        with open(self.trace_fn, "w") as f:
+            json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, f)
+        self.trace = []
+        self.trace_iters = 0
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def profile_stage(profiler, name):
+    """
+    with profile_stage(profiler, name): ...
+    profiler can be None, the stage is then a shared no-op context.
+    """
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+
+class _ProfiledCall(object):
+    """
+    Proxy of an object called as a function (not a nn.Module, e.g. a loss
+    evaluator), the calls are timed as a stage, the attributes are the ones
+    of the object.
+    """
+
+    def __init__(self, profiler, name, obj):
+        self._profiler = profiler
+        self._name = name
+        self._obj = obj
+
+    def __call__(self, *args, **kwargs):
+        with self._profiler.stage(self._name):
+            return self._obj(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._obj, attr)
+
+
+class _StageHandle(object):
+    def __init__(self, hooks=(), parent=None, attr=None, obj=None):
+        self.hooks = hooks
+        self.parent = parent
+        self.attr = attr
+        self.obj = obj
+
+    def remove(self):
+        for h in self.hooks:
+            h.remove()
+        if self.parent is not None:
+            setattr(self.parent, self.attr, self.obj)
+
+
+def attach_stage(profiler, parent, attr, name):
+    """
+    Time every call of parent.<attr> as the stage name: by forward hooks for
+    a nn.Module, else by a proxy replacing the attribute.
+    Returns a handle, handle.remove() restores the original.
+    """
+    obj = getattr(parent, attr)
+    if isinstance(obj, torch.nn.Module):
+        hooks = (obj.register_forward_pre_hook(lambda m, i: profiler.start(name)),
+                 obj.register_forward_hook(lambda m, i, o: profiler.end(name)))
+        return _StageHandle(hooks)
+    setattr(parent, attr, _ProfiledCall(profiler, name, obj))
+    return _StageHandle(parent=parent, attr=attr, obj=obj)
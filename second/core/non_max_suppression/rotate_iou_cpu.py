@@ -0,0 +1,206 @@
+'''
+CPU version of rotate_iou_gpu_eval (nms_gpu.py), the same polygon clipping
+compiled by numba for the host, run in parallel over the boxes.
+Used by utils3d.rotate_nms_3d_torch.boxes_iou_3d for cpu tensors, so that
+the iou, nms and evaluation run without cuda.
+'''
+import math
+
+import numba
+import numpy as np
+
+
+@numba.njit
+def trangle_area(ax, ay, bx, by, cx, cy):
+    return ((ax - cx) * (by - cy) - (ay - cy) * (bx - cx)) / 2.0
+
+
+@numba.njit
+def area(int_pts, num_of_inter):
+    area_val = 0.0
+    for i in range(num_of_inter - 2):
+        area_val += abs(
+            trangle_area(int_pts[0], int_pts[1], int_pts[2 * i + 2], int_pts[2 * i + 3],
+                         int_pts[2 * i + 4], int_pts[2 * i + 5]))
+    return area_val
+
+
+@numba.njit
+def sort_vertex_in_convex_polygon(int_pts, num_of_inter, vs):
+    if num_of_inter > 0:
+        center_x = 0.0
+        center_y = 0.0
+        for i in range(num_of_inter):
+            center_x += int_pts[2 * i]
+            center_y += int_pts[2 * i + 1]
+        center_x /= num_of_inter
+        center_y /= num_of_inter
+        for i in range(num_of_inter):
+            v0 = int_pts[2 * i] - center_x
+            v1 = int_pts[2 * i + 1] - center_y
+            d = math.sqrt(v0 * v0 + v1 * v1)
+            v0 = v0 / d
+            v1 = v1 / d
+            if v1 < 0:
+                v0 = -2 - v0
+            vs[i] = v0
+        for i in range(1, num_of_inter):
+            if vs[i - 1] > vs[i]:
+                temp = vs[i]
+                tx = int_pts[2 * i]
+                ty = int_pts[2 * i + 1]
+                j = i
+                while j > 0 and vs[j - 1] > temp:
+                    vs[j] = vs[j - 1]
+                    int_pts[j * 2] = int_pts[j * 2 - 2]
+                    int_pts[j * 2 + 1] = int_pts[j * 2 - 1]
+                    j -= 1
+                vs[j] = temp
+                int_pts[j * 2] = tx
+                int_pts[j * 2 + 1] = ty
+
+
+@numba.njit
+def line_segment_intersection(pts1, pts2, i, j, temp_pts):
+    A0 = pts1[2 * i]
+    A1 = pts1[2 * i + 1]
+    B0 = pts1[2 * ((i + 1) % 4)]
+    B1 = pts1[2 * ((i + 1) % 4) + 1]
+    C0 = pts2[2 * j]
+    C1 = pts2[2 * j + 1]
+    D0 = pts2[2 * ((j + 1) % 4)]
+    D1 = pts2[2 * ((j + 1) % 4) + 1]
+    BA0 = B0 - A0
+    BA1 = B1 - A1
+    DA0 = D0 - A0
+    CA0 = C0 - A0
+    DA1 = D1 - A1
+    CA1 = C1 - A1
+    acd = DA1 * CA0 > CA1 * DA0
+    bcd = (D1 - B1) * (C0 - B0) > (C1 - B1) * (D0 - B0)
+    if acd != bcd:
+        abc = CA1 * BA0 > BA1 * CA0
+        abd = DA1 * BA0 > BA1 * DA0
+        if abc != abd:
+            DC0 = D0 - C0
+            DC1 = D1 - C1
+            ABBA = A0 * B1 - B0 * A1
+            CDDC = C0 * D1 - D0 * C1
+            DH = BA1 * DC0 - BA0 * DC1
+            Dx = ABBA * DC0 - BA0 * CDDC
+            Dy = ABBA * DC1 - BA1 * CDDC
+            temp_pts[0] = Dx / DH
+            temp_pts[1] = Dy / DH
+            return True
+    return False
+
+
+@numba.njit
+def point_in_quadrilateral(pt_x, pt_y, corners):
+    ab0 = corners[2] - corners[0]
+    ab1 = corners[3] - corners[1]
+    ad0 = corners[6] - corners[0]
+    ad1 = corners[7] - corners[1]
+    ap0 = pt_x - corners[0]
+    ap1 = pt_y - corners[1]
+    abab = ab0 * ab0 + ab1 * ab1
+    abap = ab0 * ap0 + ab1 * ap1
+    adad = ad0 * ad0 + ad1 * ad1
+    adap = ad0 * ap0 + ad1 * ap1
+    return abab >= abap and abap >= 0 and adad >= adap and adap >= 0
+
+
+@numba.njit
+def quadrilateral_intersection(pts1, pts2, int_pts, temp_pts):
+    num_of_inter = 0
+    for i in range(4):
+        if point_in_quadrilateral(pts1[2 * i], pts1[2 * i + 1], pts2):
+            int_pts[num_of_inter * 2] = pts1[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts1[2 * i + 1]
+            num_of_inter += 1
+        if point_in_quadrilateral(pts2[2 * i], pts2[2 * i + 1], pts1):
+            int_pts[num_of_inter * 2] = pts2[2 * i]
+            int_pts[num_of_inter * 2 + 1] = pts2[2 * i + 1]
+            num_of_inter += 1
+    for i in range(4):
+        for j in range(4):
+            if line_segment_intersection(pts1, pts2, i, j, temp_pts):
+                int_pts[num_of_inter * 2] = temp_pts[0]
+                int_pts[num_of_inter * 2 + 1] = temp_pts[1]
+                num_of_inter += 1
+    return num_of_inter
+
+
+@numba.njit
+def rbbox_to_corners(corners, rbbox):
+    # generate clockwise corners and rotate it clockwise
+    a_cos = math.cos(rbbox[4])
+    a_sin = math.sin(rbbox[4])
+    x_d = rbbox[2]
+    y_d = rbbox[3]
+    corners_x = (-x_d / 2, -x_d / 2, x_d / 2, x_d / 2)
+    corners_y = (-y_d / 2, y_d / 2, y_d / 2, -y_d / 2)
+    for i in range(4):
+        corners[2 * i] = a_cos * corners_x[i] + a_sin * corners_y[i] + rbbox[0]
+        corners[2 * i + 1] = -a_sin * corners_x[i] + a_cos * corners_y[i] + rbbox[1]
+
+
+@numba.njit
+def rotate_iou_eval(rbox1, rbox2, criterion, corners1, corners2, int_pts, temp_pts, vs):
+    rbbox_to_corners(corners1, rbox1)
+    rbbox_to_corners(corners2, rbox2)
+    num_intersection = quadrilateral_intersection(corners1, corners2, int_pts, temp_pts)
+    sort_vertex_in_convex_polygon(int_pts, num_intersection, vs)
+    area_inter = area(int_pts, num_intersection)
+
+    area1 = rbox1[2] * rbox1[3]
+    area2 = rbox2[2] * rbox2[3]
+    if criterion == -1:
+        return area_inter / (area1 + area2 - area_inter)
+    elif criterion == 0:
+        return area_inter / area1
+    elif criterion == 1:
+        return area_inter / area2
+    elif criterion == 2:
+        small_thickness = min(rbox2[2], rbox2[3]) / max(rbox2[2], rbox2[3]) < 0.25
+        if small_thickness:
+            return area_inter / (area2 + max(0, area1 * 0.5 - area_inter))
+        else:
+            return area_inter / (area1 + area2 - area_inter)
+    else:
+        return area_inter
+
+
+@numba.njit(parallel=True)
+def _rotate_iou_cpu(boxes, query_boxes, criterion, iou):
+    N = boxes.shape[0]
+    K = query_boxes.shape[0]
+    for n in numba.prange(N):
+        corners1 = np.zeros(8, dtype=np.float32)
+        corners2 = np.zeros(8, dtype=np.float32)
+        int_pts = np.zeros(48, dtype=np.float32)
+        temp_pts = np.zeros(2, dtype=np.float32)
+        vs = np.zeros(24, dtype=np.float32)
+        for k in range(K):
+            # the gpu kernel passes (query box, box)
+            iou[n, k] = rotate_iou_eval(query_boxes[k], boxes[n], criterion,
+                                        corners1, corners2, int_pts, temp_pts, vs)
+
+
+def rotate_iou_cpu_eval(boxes, query_boxes, criterion=-1):
+    """
+    Same arguments and result as rotate_iou_gpu_eval.
+    boxes: [N, 5], query_boxes: [K, 5] (centers, dims, angle)
+    Returns: iou [N, K]
+    """
+    box_dtype = boxes.dtype
+    boxes = np.ascontiguousarray(boxes, dtype=np.float32)
+    query_boxes = np.ascontiguousarray(query_boxes, dtype=np.float32)
+    iou = np.zeros((boxes.shape[0], query_boxes.shape[0]), dtype=np.float32)
+    if iou.size == 0:
+        return iou
+    _rotate_iou_cpu(boxes, query_boxes, criterion, iou)
+    # as check_same_boxes of nms_gpu.py: the iou of same boxes is set to 1
+    same = (np.abs(boxes[:, None, :] - query_boxes[None, :, :]) < 1e-6).all(2)
+    iou[same] = 1
+    return iou.astype(box_dtype)
@@ -113,6 +113,33 @@ class TestCheckpointer(unittest.TestCase):
                 # same content
                 self.assertTrue(loaded.equal(stored))
 
+    def test_async_save_and_rotate(self):
+        trained_model, fresh_model = self.create_model(), self.create_model()
+        with TemporaryDirectory() as f:
+            checkpointer = Checkpointer(
+                trained_model, save_dir=f, save_to_disk=True, async_save=True, keep_last=2
+            )
+            for i in range(4):
+                checkpointer.save("model_{:07d}".format(i))
+            checkpointer.save("model_final")
+            checkpointer.wait()
+            self.assertEqual(len(checkpointer.pop_save_times()), 5)
+            self.assertEqual(
+                sorted(os.listdir(f)),
+                ["last_checkpoint", "model_0000002.pth", "model_0000003.pth", "model_final.pth"],
+            )
+
+            fresh_checkpointer = Checkpointer(fresh_model, save_dir=f)
+            self.assertEqual(
+                fresh_checkpointer.get_checkpoint_file(), os.path.join(f, "model_final.pth")
+            )
+            _ = fresh_checkpointer.load()
+
+        for trained_p, loaded_p in zip(
+            trained_model.parameters(), fresh_model.parameters()
+        ):
+            self.assertTrue(trained_p.equal(loaded_p))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+"""
+SparseRCNN inference end to end on cpu, on one synthetic house: the sparse
+backbone, the rpn and roi heads with the cpu ROIAlignRotated3D kernel, and
+the rotated iou / nms of the cpu path.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+import torch
+
+try:
+    import sparseconvnet  # noqa F401
+    from maskrcnn_benchmark import _C  # noqa F401
+    HAS_C = True
+except ImportError:
+    HAS_C = False
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, "configs", "4c", "4c_Fpn432_bs1_lr5_SD.yaml")
+
+
+@unittest.skipUnless(HAS_C, "sparseconvnet or maskrcnn_benchmark._C is not built")
+class TestCpuInference(unittest.TestCase):
+    def test_synthetic_house(self):
+        sys.path.insert(0, os.path.join(ROOT, "tools"))
+        from train_net_sparse3d import intact_cfg
+        from maskrcnn_benchmark.config import cfg
+        from maskrcnn_benchmark.modeling.detector import build_detection_model
+        from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
+        from data3d.data import trainMerge
+        from data3d.suncg_utils.suncg_dataset import SUNCGDataset
+        from data3d.suncg_utils.synthetic_scenes import write_synthetic_dataset
+
+        cfg = cfg.clone()
+        cfg.merge_from_file(CONFIG)
+        cfg.merge_from_list(["MODEL.DEVICE", "cpu", "MODEL.WEIGHT", ""])
+        intact_cfg(cfg)
+        torch.manual_seed(0)
+        with tempfile.TemporaryDirectory() as d:
+            write_synthetic_dataset(d, 1, "val", seed=0, density=20)
+            dataset = SUNCGDataset("val", cfg, dset_path=d)
+            batch = trainMerge([dataset[0]])
+        model = build_detection_model(cfg)
+        model.eval()
+        with torch.no_grad():
+            output = model(batch["x"])
+        self.assertEqual(len(output), 1)
+        self.assertIsInstance(output[0], BoxList3D)
+        self.assertEqual(output[0].bbox3d.device.type, "cpu")
+        self.assertEqual(output[0].bbox3d.shape[1], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
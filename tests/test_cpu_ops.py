@@ -0,0 +1,177 @@
+"""
+Parity of the cpu kernels of csrc/cpu with the reference formulas below,
+written with differentiable torch ops, in forward and backward.
+"""
+import math
+import unittest
+
+import torch
+
+try:
+    from maskrcnn_benchmark.layers.roi_align_rotated import roi_align as roi_align_rotated
+    from maskrcnn_benchmark.layers.roi_align_rotated_3d import roi_align_rotated_3d
+    from maskrcnn_benchmark.layers.roi_pool import roi_pool
+    from maskrcnn_benchmark.layers.sigmoid_focal_loss import sigmoid_focal_loss, sigmoid_focal_loss_python
+    HAS_C = True
+except ImportError:
+    HAS_C = False
+
+
+def interpolate_ref(feat, coords):
+    """
+    (Bi/Tri)linear interpolation with the boundary rules of the kernels.
+    feat: [C, S0, S1, ...], coords: list of tensors of the same shape, one
+    per spatial dim. Returns [C, *coords[0].shape]
+    """
+    sizes = feat.shape[1:]
+    valid = torch.ones_like(coords[0])
+    lows, highs, ls = [], [], []
+    for c, s in zip(coords, sizes):
+        valid = valid * (c >= -1).to(c.dtype) * (c <= s).to(c.dtype)
+        c = c.clamp(min=0)
+        low = c.floor().long()
+        over = low >= s - 1
+        low = torch.where(over, torch.full_like(low, s - 1), low)
+        high = torch.where(over, low, low + 1)
+        c = torch.where(over, low.to(c.dtype), c)
+        lows.append(low)
+        highs.append(high)
+        ls.append(c - low.to(c.dtype))
+    out = 0
+    for corner in range(2 ** len(sizes)):
+        idx = []
+        w = torch.ones_like(coords[0])
+        for d in range(len(sizes)):
+            if corner >> d & 1:
+                idx.append(highs[d])
+                w = w * ls[d]
+            else:
+                idx.append(lows[d])
+                w = w * (1 - ls[d])
+        out = out + feat[(slice(None),) + tuple(idx)] * w
+    return out * valid
+
+
+def sample_axis(size, pooled, grid):
+    # sampling points of one axis relative to the roi center, in bin order
+    return -size / 2 + (torch.arange(pooled * grid, dtype=torch.float64) + 0.5) * size / (pooled * grid)
+
+
+def roi_align_rotated_ref(input, rois, output_size, spatial_scale, sampling_ratio):
+    ph, pw = output_size
+    g = sampling_ratio
+    outs = []
+    for roi in rois.tolist():
+        cw, ch = roi[1] * spatial_scale, roi[2] * spatial_scale
+        rw, rh = max(roi[3] * spatial_scale, 1), max(roi[4] * spatial_scale, 1)
+        theta = roi[5] * math.pi / 180
+        yy = sample_axis(rh, ph, g)[:, None].expand(ph * g, pw * g)
+        xx = sample_axis(rw, pw, g)[None, :].expand(ph * g, pw * g)
+        x = xx * math.cos(theta) + yy * math.sin(theta) + cw
+        y = yy * math.cos(theta) - xx * math.sin(theta) + ch
+        v = interpolate_ref(input[int(roi[0])], [y, x])
+        outs.append(v.view(-1, ph, g, pw, g).mean(4).mean(2))
+    return torch.stack(outs, 0)
+
+
+def roi_align_rotated_3d_ref(input, rois, output_size, spatial_scale, sampling_ratio):
+    ph, pw, pz = output_size
+    g = sampling_ratio
+    shape = (ph * g, pw * g, pz * g)
+    outs = []
+    for roi in rois.tolist():
+        cw, ch, cz = [v * spatial_scale for v in roi[1:4]]
+        rw, rh, rz = [max(v * spatial_scale, 1) for v in roi[4:7]]
+        theta = roi[7] * math.pi / 180
+        yy = sample_axis(rh, ph, g)[:, None, None].expand(shape)
+        xx = sample_axis(rw, pw, g)[None, :, None].expand(shape)
+        zz = sample_axis(rz, pz, g)[None, None, :].expand(shape)
+        x = xx * math.cos(theta) + yy * math.sin(theta) + cw
+        y = yy * math.cos(theta) - xx * math.sin(theta) + ch
+        v = interpolate_ref(input[int(roi[0])], [y, x, zz + cz])
+        outs.append(v.view(-1, ph, g, pw, g, pz, g).mean(6).mean(4).mean(2))
+    return torch.stack(outs, 0)
+
+
+def c_round(v):
+    # round half away from zero, as round() in c
+    return int(math.copysign(math.floor(abs(v) + 0.5), v))
+
+
+def roi_pool_ref(input, rois, output_size, spatial_scale):
+    ph, pw = output_size
+    _, channels, height, width = input.shape
+    outs = []
+    for roi in rois.tolist():
+        x0, y0, x1, y1 = [c_round(v * spatial_scale) for v in roi[1:5]]
+        bin_h = max(y1 - y0 + 1, 1) / ph
+        bin_w = max(x1 - x0 + 1, 1) / pw
+        bins = []
+        for i in range(ph):
+            hs = min(max(int(math.floor(i * bin_h)) + y0, 0), height)
+            he = min(max(int(math.ceil((i + 1) * bin_h)) + y0, 0), height)
+            for j in range(pw):
+                ws = min(max(int(math.floor(j * bin_w)) + x0, 0), width)
+                we = min(max(int(math.ceil((j + 1) * bin_w)) + x0, 0), width)
+                if he <= hs or we <= ws:
+                    bins.append(input.new_zeros(channels))
+                else:
+                    region = input[int(roi[0]), :, hs:he, ws:we]
+                    bins.append(region.contiguous().view(channels, -1).max(1)[0])
+        outs.append(torch.stack(bins, 1).view(channels, ph, pw))
+    return torch.stack(outs, 0)
+
+
+@unittest.skipIf(not HAS_C, "the _C extension is not built")
+class TestCPUOps(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+
+    def check(self, op, ref, input, *args):
+        input = input.double().requires_grad_()
+        out = op(input, *args)
+        input_ref = input.detach().clone().requires_grad_()
+        out_ref = ref(input_ref, *args)
+        self.assertEqual(out.shape, out_ref.shape)
+        self.assertLess((out - out_ref).abs().max().item(), 1e-8)
+
+        grad = torch.randn_like(out)
+        out.backward(grad)
+        out_ref.backward(grad)
+        self.assertLess((input.grad - input_ref.grad).abs().max().item(), 1e-8)
+
+    def random_rois(self, n, batch_size, centers, sizes, rotated=True):
+        rois = [torch.randint(0, batch_size, (n, 1)).double()]
+        rois += [torch.rand(n, 1).double() * c for c in centers]
+        rois += [torch.rand(n, 1).double() * s + 0.5 for s in sizes]
+        if rotated:
+            rois.append(torch.rand(n, 1).double() * 360 - 180)
+        return torch.cat(rois, 1)
+
+    def test_roi_align_rotated(self):
+        input = torch.randn(2, 4, 12, 10)
+        rois = self.random_rois(7, 2, [20, 24], [12, 12])
+        self.check(roi_align_rotated, roi_align_rotated_ref, input, rois, (3, 4), 0.5, 2)
+
+    def test_roi_align_rotated_3d(self):
+        input = torch.randn(2, 3, 9, 8, 5)
+        rois = self.random_rois(6, 2, [16, 18, 10], [10, 10, 8])
+        self.check(roi_align_rotated_3d, roi_align_rotated_3d_ref, input, rois, (3, 2, 3), 0.5, 2)
+
+    def test_roi_pool(self):
+        input = torch.randn(2, 4, 12, 10)
+        xy0 = self.random_rois(7, 2, [16, 20], [], rotated=False)
+        rois = torch.cat([xy0, xy0[:, 1:3] + torch.rand(7, 2).double() * 10], 1)
+        self.check(roi_pool, roi_pool_ref, input, rois, (3, 3), 0.5)
+
+    def test_sigmoid_focal_loss(self):
+        logits = torch.randn(50, 6) * 3
+        targets = torch.randint(-1, 7, (50,)).int()
+        gamma, alpha = 2.0, 0.25
+        self.check(lambda x: sigmoid_focal_loss(x, targets, gamma, alpha),
+                   lambda x: sigmoid_focal_loss_python(x, targets, gamma, alpha),
+                   logits)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,6 +10,7 @@ from torch.utils.data.sampler import RandomSampler
 
 from maskrcnn_benchmark.data.samplers import GroupedBatchSampler
 from maskrcnn_benchmark.data.samplers import IterationBasedBatchSampler
+from maskrcnn_benchmark.data.samplers import SizeBalancedBatchSampler
 
 
 class SubsetSampler(Sampler):
@@ -149,5 +150,39 @@ class TestIterationBasedBatchSampler(unittest.TestCase):
                         self.assertEqual(batch, expected)
 
 
+class TestSizeBalancedBatchSampler(unittest.TestCase):
+    def test_ranks_cover_dataset(self):
+        sizes = [random.randint(1, 100) for _ in range(23)]
+        batch_size = 2
+        num_replicas = 3
+        batches = [
+            list(SizeBalancedBatchSampler(sizes, batch_size, num_replicas, rank, bucket_steps=2))
+            for rank in range(num_replicas)
+        ]
+        for b in batches:
+            self.assertEqual(len(b), 4)
+            for bi in b:
+                self.assertEqual(len(bi), batch_size)
+        merged = set(itertools.chain.from_iterable(itertools.chain.from_iterable(batches)))
+        self.assertEqual(merged, set(range(len(sizes))))
+
+    def test_balanced(self):
+        sizes = [100, 1, 1, 1, 50, 50, 1, 1]
+        sampler = SizeBalancedBatchSampler(sizes, 4, 2, 0, shuffle=False)
+        rank_sizes = sampler.balance_stats()["rank_sizes"]
+        self.assertEqual(sorted(rank_sizes), [102.0, 103.0])
+
+    def test_set_epoch(self):
+        sizes = list(range(1, 41))
+        sampler = SizeBalancedBatchSampler(sizes, 2, 2, 0, bucket_steps=1)
+        sampler.set_epoch(0)
+        r0 = list(sampler)
+        sampler.set_epoch(1)
+        r1 = list(sampler)
+        sampler.set_epoch(0)
+        self.assertEqual(list(sampler), r0)
+        self.assertNotEqual(r0, r1)
+
+
 if __name__ == "__main__":
     unittest.main()
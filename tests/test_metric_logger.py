@@ -1,6 +1,8 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 import unittest
 
+import torch
+
 from maskrcnn_benchmark.utils.metric_logger import MetricLogger
 
 
@@ -16,6 +18,27 @@ class TestMetricLogger(unittest.TestCase):
         self.assertEqual(m.median, 4)
         self.assertEqual(m.avg, 4.5)
 
+    def test_tensor_update(self):
+        meter = MetricLogger(max_pending=100)
+        for i in range(30):
+            meter.update(metric=torch.tensor(float(i)), time=1.0)
+        self.assertEqual(len(meter.pending), 30)
+        self.assertEqual(meter.time.count, 30)
+        self.assertEqual(len(meter.pending), 30)
+
+        m = meter.metric
+        self.assertEqual(len(meter.pending), 0)
+        self.assertEqual(m.count, 30)
+        self.assertEqual(m.total, 435)
+        self.assertEqual(len(m.deque), 20)
+        self.assertEqual(m.median, 19)
+        self.assertEqual(m.avg, 19.5)
+
+        for i in range(100):
+            meter.update(metric=torch.tensor(1.0))
+        self.assertEqual(len(meter.pending), 0)
+        self.assertEqual(meter.meters["metric"].count, 130)
+
     def test_no_attr(self):
         meter = MetricLogger()
         _ = meter.meters
@@ -0,0 +1,44 @@
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.solver import loss_is_finite, mask_nonfinite_grads
+
+
+class TestNonFinite(unittest.TestCase):
+    def run_steps(self, scales):
+        torch.manual_seed(0)
+        model = torch.nn.Linear(3, 2)
+        optimizer = torch.optim.SGD(model.parameters(), 0.1, momentum=0.9)
+        x = torch.ones(4, 3)
+        for scale in scales:
+            losses = model(x).sum() * scale
+            finite = loss_is_finite(losses)
+            optimizer.zero_grad()
+            losses.backward()
+            mask_nonfinite_grads(optimizer, finite)
+            optimizer.step()
+        return model
+
+    def test_nan_loss(self):
+        model = self.run_steps([1.0, float("nan"), 1.0])
+        for p in model.parameters():
+            self.assertTrue(torch.isfinite(p).all())
+
+    def test_nan_first_step_keeps_weights(self):
+        torch.manual_seed(0)
+        init = [p.clone() for p in torch.nn.Linear(3, 2).parameters()]
+        model = self.run_steps([float("inf")])
+        for p, p0 in zip(model.parameters(), init):
+            self.assertTrue(torch.equal(p, p0))
+
+    def test_finite_loss(self):
+        torch.manual_seed(0)
+        init = [p.clone() for p in torch.nn.Linear(3, 2).parameters()]
+        model = self.run_steps([1.0])
+        for p, p0 in zip(model.parameters(), init):
+            self.assertFalse(torch.equal(p, p0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from data3d.ply_io import read_ply_header, read_ply_vertices, read_ply_points, \
+  iter_ply_vertices, write_ply
+
+
+class TestPlyIO(unittest.TestCase):
+    def test_write_read(self):
+        points = np.random.rand(1000, 3) * 10
+        colors = np.random.randint(0, 256, [1000, 3]) / 255.
+        normals = np.random.rand(1000, 3)
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'pcl.ply')
+            write_ply(fn, points, colors, normals, chunk_size=300)
+            header = read_ply_header(fn)
+            self.assertEqual(header['format'], 'binary_little_endian')
+            self.assertEqual(header['elements'][0][1], 1000)
+
+            vertices = read_ply_vertices(fn)
+            self.assertIsInstance(vertices, np.memmap)
+            np.testing.assert_allclose(vertices['x'], points[:, 0], rtol=1e-6)
+
+            points_r, colors_r, normals_r = read_ply_points(fn)
+            np.testing.assert_allclose(points_r, points, rtol=1e-6)
+            np.testing.assert_allclose(colors_r, colors, atol=1e-6)
+            np.testing.assert_allclose(normals_r, normals, rtol=1e-6)
+
+            chunks = list(iter_ply_vertices(fn, chunk_size=300))
+            self.assertEqual([len(c) for c in chunks], [300, 300, 300, 100])
+
+    def test_ascii(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'pcl.ply')
+            with open(fn, 'w') as f:
+                f.write('ply\nformat ascii 1.0\nelement vertex 2\nproperty float x\n'
+                        'property float y\nproperty float z\nproperty uchar red\n'
+                        'property uchar green\nproperty uchar blue\nend_header\n'
+                        '0 1 2 255 0 0\n3 4 5 0 255 0\n')
+            points, colors, normals = read_ply_points(fn)
+            np.testing.assert_allclose(points, [[0, 1, 2], [3, 4, 5]])
+            np.testing.assert_allclose(colors, [[1, 0, 0], [0, 1, 0]])
+            self.assertIsNone(normals)
+
+
+if __name__ == "__main__":
+    unittest.main()
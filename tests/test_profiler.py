@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.utils.metric_logger import MetricLogger
+from maskrcnn_benchmark.utils.profiler import StageProfiler, attach_stage, profile_stage
+
+
+class Loss(object):
+    def __call__(self, x):
+        return x.sum()
+
+    def subsample(self, x):
+        return x[:1]
+
+
+class Model(torch.nn.Module):
+    def __init__(self):
+        super(Model, self).__init__()
+        self.head = torch.nn.Linear(3, 2)
+        self.loss_evaluator = Loss()
+
+    def forward(self, x):
+        return self.loss_evaluator(self.head(x))
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stages(self):
+        profiler = StageProfiler("cpu")
+        meters = MetricLogger()
+        for _ in range(2):
+            with profile_stage(profiler, "forward"):
+                with profile_stage(profiler, "inner"):
+                    pass
+                with profile_stage(profiler, "inner"):
+                    pass
+            times, mems = profiler.step(meters)
+            self.assertEqual(set(times.keys()), {"forward", "inner"})
+            self.assertGreaterEqual(times["forward"], times["inner"])
+            self.assertEqual(mems, {})
+        self.assertEqual(meters.prof_forward_ms.count, 2)
+
+    def test_disabled(self):
+        with profile_stage(None, "forward"):
+            pass
+
+    def test_attach_and_trace(self):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "trace.json")
+            profiler = StageProfiler("cpu", trace_fn=fn, trace_iters=2)
+            model = Model()
+            handles = [attach_stage(profiler, model, "head", "head"),
+                       attach_stage(profiler, model, "loss_evaluator", "loss")]
+            self.assertEqual(len(model.loss_evaluator.subsample(torch.ones(3, 3))), 1)
+            for _ in range(3):
+                model(torch.ones(4, 3))
+                times, _ = profiler.step()
+                self.assertEqual(set(times.keys()), {"head", "loss"})
+            with open(fn) as f:
+                events = json.load(f)["traceEvents"]
+            self.assertEqual(len(events), 4)
+            self.assertEqual(sorted(set(e["args"]["iteration"] for e in events)), [0, 1])
+
+            for h in handles:
+                h.remove()
+            self.assertIsInstance(model.loss_evaluator, Loss)
+            model(torch.ones(4, 3))
+            self.assertEqual(profiler.step()[0], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+boxlist_soft_nms_3d and boxlist_wbf_3d on cpu boxes, with axis aligned
+boxes of the same z scope, so that the ious are the 2d ones: two 2x2 boxes
+shifted by 1 overlap by 1/3.
+"""
+import math
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
+from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_soft_nms_3d, boxlist_wbf_3d
+
+
+def make_boxlist(boxes, scores, labels=None):
+    """
+    boxes: list of [x, y, yaw, size_y, size_x], z in [0, 1]
+    """
+    bbox3d = torch.tensor([[x, y, 0, sy, sx, 1, yaw] for x, y, yaw, sy, sx in boxes],
+                          dtype=torch.float32)
+    boxlist = BoxList3D(bbox3d, size3d=None, mode='yx_zb', examples_idxscope=None, constants={})
+    boxlist.add_field("scores", torch.tensor(scores, dtype=torch.float32))
+    if labels is not None:
+        boxlist.add_field("labels", torch.tensor(labels, dtype=torch.int64))
+    return boxlist
+
+
+class TestSoftNms(unittest.TestCase):
+    def test_linear_decay(self):
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [1, 0, 0, 2, 2]], [0.9, 0.8])
+        result = boxlist_soft_nms_3d(boxlist, 0.3, method="linear")
+        scores = result.get_field("scores")
+        self.assertEqual(len(result), 2)
+        self.assertAlmostEqual(scores[0].item(), 0.9, places=5)
+        self.assertAlmostEqual(scores[1].item(), 0.8 * (1 - 1 / 3.0), places=4)
+
+    def test_linear_below_thresh_keeps_score(self):
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [1, 0, 0, 2, 2]], [0.9, 0.8])
+        result = boxlist_soft_nms_3d(boxlist, 0.5, method="linear")
+        self.assertAlmostEqual(result.get_field("scores")[1].item(), 0.8, places=5)
+
+    def test_gaussian_decay(self):
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [1, 0, 0, 2, 2]], [0.9, 0.8])
+        result = boxlist_soft_nms_3d(boxlist, 0.3, method="gaussian", sigma=0.5)
+        expected = 0.8 * math.exp(-(1 / 3.0) ** 2 / 0.5)
+        self.assertAlmostEqual(result.get_field("scores")[1].item(), expected, places=4)
+
+    def test_score_thresh(self):
+        # the duplicate decays to 0, the far box starts below score_thresh
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [0, 0, 0, 2, 2], [10, 0, 0, 2, 2]],
+                               [0.9, 0.5, 1e-4])
+        for check_period in [1, 8]:
+            result = boxlist_soft_nms_3d(boxlist, 0.3, score_thresh=1e-3, check_period=check_period)
+            self.assertEqual(len(result), 1)
+            self.assertAlmostEqual(result.get_field("scores")[0].item(), 0.9, places=5)
+
+    def test_labels_do_not_decay_each_other(self):
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [0, 0, 0, 2, 2]], [0.9, 0.8], labels=[1, 2])
+        result = boxlist_soft_nms_3d(boxlist, 0.3, label_field="labels")
+        self.assertEqual(len(result), 2)
+        self.assertAlmostEqual(result.get_field("scores")[1].item(), 0.8, places=5)
+        result = boxlist_soft_nms_3d(boxlist, 0.3)
+        self.assertEqual(len(result), 1)
+
+
+class TestWbf(unittest.TestCase):
+    def test_clusters(self):
+        # the first two overlap by 0.82, the third is far
+        boxlist = make_boxlist([[0.2, 0, 0, 2, 2], [10, 0, 0, 2, 2], [0, 0, 0, 2, 2]],
+                               [0.8, 0.7, 0.9])
+        result = boxlist_wbf_3d(boxlist, 0.55)
+        self.assertEqual(len(result), 2)
+        bbox3d = result.bbox3d
+        scores = result.get_field("scores")
+        self.assertAlmostEqual(bbox3d[0, 0].item(), 0.2 * 0.8 / 1.7, places=4)
+        self.assertAlmostEqual(scores[0].item(), 0.85, places=5)
+        self.assertAlmostEqual(bbox3d[1, 0].item(), 10, places=4)
+        self.assertAlmostEqual(scores[1].item(), 0.7, places=5)
+
+    def test_models_num(self):
+        boxlist = make_boxlist([[0, 0, 0, 2, 2], [10, 0, 0, 2, 2]], [0.9, 0.6])
+        result = boxlist_wbf_3d(boxlist, 0.55, models_num=2)
+        scores = result.get_field("scores")
+        self.assertAlmostEqual(scores[0].item(), 0.45, places=5)
+        self.assertAlmostEqual(scores[1].item(), 0.3, places=5)
+
+    def test_yaw_wrap(self):
+        # yaw pi/2 - 0.05 and -pi/2 + 0.05 differ by 0.1 with period pi:
+        # fused near +-pi/2, not near 0 as a plain average
+        yaw = math.pi / 2 - 0.05
+        boxlist = make_boxlist([[0, 0, yaw, 1, 4], [0, 0, -yaw, 1, 4]], [0.9, 0.8])
+        result = boxlist_wbf_3d(boxlist, 0.5)
+        self.assertEqual(len(result), 1)
+        fused = result.bbox3d[0, 6].item()
+        self.assertLess(abs(abs(fused) - math.pi / 2), 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from data3d.suncg_utils.synthetic_scenes import gen_synthetic_house, write_synthetic_dataset
+
+
+class TestSyntheticScenes(unittest.TestCase):
+    def test_deterministic(self):
+        pcl0, boxes0 = gen_synthetic_house(3, density=50)
+        pcl1, boxes1 = gen_synthetic_house(3, density=50)
+        pcl2, _ = gen_synthetic_house(4, density=50)
+        self.assertTrue(np.array_equal(pcl0, pcl1))
+        for k in boxes0:
+            self.assertTrue(np.array_equal(boxes0[k], boxes1[k]))
+        self.assertFalse(pcl0.shape == pcl2.shape and np.array_equal(pcl0, pcl2))
+
+    def test_format(self):
+        pcl, boxes = gen_synthetic_house(0, rooms_xy=(2, 3), density=50)
+        self.assertEqual(pcl.dtype, np.float32)
+        self.assertEqual(pcl.shape[1], 9)
+        self.assertEqual(set(boxes.keys()), {'wall', 'window', 'door', 'floor', 'ceiling', 'room'})
+        self.assertEqual(len(boxes['room']), 6)
+        # 3 walls along y with 3 segments, 4 walls along x with 2 segments
+        self.assertEqual(len(boxes['wall']), 3 * 3 + 4 * 2)
+        for b in boxes.values():
+            self.assertEqual(b.shape[1], 7)
+            self.assertTrue(np.all(b[:, 6] >= 0) and np.all(b[:, 6] <= np.pi))
+        normals = np.linalg.norm(pcl[:, 6:9], axis=1)
+        self.assertTrue(np.allclose(normals, 1, atol=1e-5))
+        self.assertTrue(np.all(pcl[:, 3:6] >= 0) and np.all(pcl[:, 3:6] <= 1))
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as d:
+            names = write_synthetic_dataset(d, 2, 'val', seed=5, density=20)
+            with open(os.path.join(d, 'train_test_splited', 'val.txt')) as f:
+                self.assertEqual(f.read().split(), names)
+            pcl, boxes = torch.load(os.path.join(d, 'houses', names[1], 'pcl_0.pth'))
+            pcl6, _ = gen_synthetic_house(6, density=20)
+            self.assertTrue(np.array_equal(pcl, pcl6))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Compare training step time and peak memory of float32 and mixed precision
+on a fixed set of scenes (the first --scenes examples of the val split).
+
+python tools/benchmark_amp_sparse3d.py --config-file configs/4c/4c_Fpn432_bs1_lr5_SD.yaml --scenes 20
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import json
+import time
+
+import numpy as np
+import torch
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.solver import make_optimizer
+from maskrcnn_benchmark.modeling.detector import build_detection_model
+from maskrcnn_benchmark.utils.amp import make_grad_scaler
+
+from data3d.data import make_data_loader
+from train_net_sparse3d import intact_cfg
+
+
+def load_scenes(cfg, scene_num):
+    data_loader = make_data_loader(cfg, is_train=False)
+    batches = []
+    for batch in data_loader:
+        batches.append(batch)
+        if len(batches) == scene_num:
+            break
+    return batches
+
+
+def run_steps(cfg, batches, warmup):
+    torch.manual_seed(0)
+    device = torch.device(cfg.MODEL.DEVICE)
+    model = build_detection_model(cfg)
+    model.to(device)
+    model.train()
+    optimizer = make_optimizer(cfg, model)
+    scaler = make_grad_scaler(cfg)
+
+    torch.cuda.empty_cache()
+    torch.cuda.reset_max_memory_allocated()
+    step_times = []
+    for i, batch in enumerate(batches):
+        x = [batch['x'][0], batch['x'][1].to(device)]
+        y = [b.to(device) for b in batch['y']]
+        torch.cuda.synchronize()
+        start = time.time()
+        loss_dict, _ = model(x, y)
+        losses = sum(loss for loss in loss_dict.values())
+        optimizer.zero_grad()
+        if scaler is None:
+            losses.backward()
+            optimizer.step()
+        else:
+            scaler.scale(losses).backward()
+            scaler.step(optimizer)
+            scaler.update()
+        torch.cuda.synchronize()
+        if i >= warmup:
+            step_times.append(time.time() - start)
+    return {
+        "step_time_mean": float(np.mean(step_times)),
+        "step_time_std": float(np.std(step_times)),
+        "max_memory_mb": torch.cuda.max_memory_allocated() / 1024.0 / 1024.0,
+        "loss_last": float(losses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs AMP training benchmark")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+        type=str,
+    )
+    parser.add_argument("--scenes", type=int, default=20, help="number of fixed scenes")
+    parser.add_argument("--warmup", type=int, default=3, help="steps not timed")
+    parser.add_argument("--output", default="", help="json file to save the result")
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    intact_cfg(cfg)
+    batches = load_scenes(cfg, args.scenes)
+
+    results = {}
+    for mode, amp, dtype in [("fp32", False, "float16"), ("fp16", True, "float16"), ("bf16", True, "bfloat16")]:
+        cfg_m = cfg.clone()
+        cfg_m.SOLVER.AMP = amp
+        cfg_m.SOLVER.AMP_DTYPE = dtype
+        results[mode] = run_steps(cfg_m, batches, args.warmup)
+        r = results[mode]
+        print(f"{mode:6}step time: {r['step_time_mean']*1000:.1f} +- {r['step_time_std']*1000:.1f} ms"
+              f"  max mem: {r['max_memory_mb']:.0f} MB  last loss: {r['loss_last']:.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Time the box ops and the model stages on deterministic synthetic houses
+(data3d/suncg_utils/synthetic_scenes.py), with fixed seeds, so that the json
+results of two commits can be compared without the SUNCG data.
+
+python tools/benchmark_sparse3d.py --config-file configs/4c/4c_Fpn432_bs1_lr5_SD.yaml --output bench.json
+python tools/benchmark_sparse3d.py --config-file configs/4c/4c_Fpn432_bs1_lr5_SD.yaml --output bench_cpu.json MODEL.DEVICE cpu
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import torch
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.modeling.detector import build_detection_model
+from maskrcnn_benchmark.modeling.matcher import Matcher
+from maskrcnn_benchmark.structures.bounding_box_3d import BoxList3D
+from maskrcnn_benchmark.structures.boxlist_ops_3d import boxlist_nms_3d
+from maskrcnn_benchmark.utils.checkpoint import DetectronCheckpointer
+from utils3d.bbox3d_ops import Bbox3D
+from utils3d.rotate_nms_3d_torch import boxes_iou_3d
+
+from data3d.data import trainMerge
+from data3d.suncg_utils.suncg_dataset import SUNCGDataset
+from data3d.suncg_utils.synthetic_scenes import write_synthetic_dataset
+from train_net_sparse3d import intact_cfg
+
+ALL_STAGES = ["boxes_iou_3d", "boxlist_nms_3d", "Matcher", "points_in_bbox",
+              "FPN_Net_forward", "SparseRCNN_inference"]
+
+
+def timeit(fn, inputs_num, repeat, warmup, cuda):
+    """
+    Call fn(i) warmup times, then repeat times, cycling over the inputs.
+    Returns the statistics of the timed calls (ms).
+    """
+    for i in range(warmup):
+        fn(i % inputs_num)
+    times = []
+    for i in range(repeat):
+        if cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        fn(i % inputs_num)
+        if cuda:
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - start) * 1000.0)
+    times = np.array(times)
+    return {
+        "mean_ms": float(times.mean()),
+        "std_ms": float(times.std()),
+        "median_ms": float(np.median(times)),
+        "min_ms": float(times.min()),
+        "repeat": repeat,
+    }
+
+
+def jitter_boxes(gt, copies, generator):
+    """
+    copies noisy boxes around each gt box (yx_zb), with random scores, as
+    proposals of a fixed size
+    """
+    bbox3d = gt.bbox3d.repeat(copies, 1)
+    noise = torch.randn(bbox3d.shape, generator=generator, dtype=bbox3d.dtype)
+    noise[:, 0:3] *= 0.1
+    noise[:, 3:6] = 1 + noise[:, 3:6] * 0.05
+    noise[:, 6] *= 0.05
+    bbox3d[:, 0:3] += noise[:, 0:3]
+    bbox3d[:, 3:6] *= noise[:, 3:6]
+    bbox3d[:, 6] += noise[:, 6]
+    boxes = BoxList3D(bbox3d, gt.size3d, "yx_zb", None, {})
+    boxes.add_field("scores", torch.rand(bbox3d.shape[0], generator=generator))
+    return boxes
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="box ops and model stages benchmark on synthetic houses")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+        type=str,
+    )
+    parser.add_argument("--data-dir", default="", help="synthetic houses, written if missing (default: a temp dir)")
+    parser.add_argument("--houses", type=int, default=4, help="number of synthetic houses")
+    parser.add_argument("--density", type=float, default=200.0, help="points per square meter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--copies", type=int, default=20, help="jittered proposals per gt box")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per stage")
+    parser.add_argument("--warmup", type=int, default=3, help="calls not timed")
+    parser.add_argument("--stages", nargs="+", default=ALL_STAGES, choices=ALL_STAGES)
+    parser.add_argument("--output", default="", help="json file to save the result")
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    if args.config_file:
+        cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    intact_cfg(cfg)
+    device = torch.device(cfg.MODEL.DEVICE)
+    cuda = device.type == "cuda"
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="synthetic_suncg_")
+    if not os.path.exists(os.path.join(data_dir, "train_test_splited", "val.txt")):
+        write_synthetic_dataset(data_dir, args.houses, "val", args.seed, density=args.density)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    generator = torch.Generator().manual_seed(args.seed)
+    dataset = SUNCGDataset("val", cfg, dset_path=data_dir)
+    samples = [dataset[i] for i in range(len(dataset))]
+    raw = [torch.load(fn) for fn in dataset.files]
+
+    gts = [s["y"].to(device) for s in samples]
+    proposals = [jitter_boxes(s["y"], args.copies, generator).to(device) for s in samples]
+    ious = [boxes_iou_3d(g.bbox3d, p.bbox3d, None, -1, flag="roi_post") for g, p in zip(gts, proposals)]
+    matcher = Matcher(cfg.MODEL.ROI_HEADS.FG_IOU_THRESHOLD, cfg.MODEL.ROI_HEADS.BG_IOU_THRESHOLD,
+                      allow_low_quality_matches=True)
+    walls = [b["wall"] for _, b in raw]
+    batches = []
+    for s in samples:
+        batch = trainMerge([s])
+        batch["x"] = [batch["x"][0].to(device), batch["x"][1].to(device)]
+        batches.append(batch)
+
+    stage_fns = {
+        "boxes_iou_3d": lambda i: boxes_iou_3d(gts[i].bbox3d, proposals[i].bbox3d, None, -1, flag="roi_post"),
+        "boxlist_nms_3d": lambda i: boxlist_nms_3d(proposals[i], cfg.MODEL.ROI_HEADS.NMS,
+                                                   score_field="scores", flag="roi_post"),
+        "Matcher": lambda i: matcher(ious[i]),
+        "points_in_bbox": lambda i: Bbox3D.points_in_bbox(raw[i][0][:, 0:3], walls[i]),
+    }
+    model = None
+    if "FPN_Net_forward" in args.stages or "SparseRCNN_inference" in args.stages:
+        model = build_detection_model(cfg)
+        model.to(device)
+        if cfg.MODEL.WEIGHT:
+            DetectronCheckpointer(cfg, model).load(cfg.MODEL.WEIGHT)
+        model.eval()
+
+        def fpn_forward(i):
+            with torch.no_grad():
+                return model.backbone(batches[i]["x"])
+
+        def inference(i):
+            with torch.no_grad():
+                return model(batches[i]["x"])
+        stage_fns["FPN_Net_forward"] = fpn_forward
+        stage_fns["SparseRCNN_inference"] = inference
+
+    results = {}
+    for stage in args.stages:
+        results[stage] = timeit(stage_fns[stage], len(samples), args.repeat, args.warmup, cuda)
+        r = results[stage]
+        print(f"{stage:22}{r['mean_ms']:9.2f} +- {r['std_ms']:.2f} ms  (min {r['min_ms']:.2f})")
+
+    meta = {
+        "commit": git_commit(),
+        "torch": torch.__version__,
+        "device": torch.cuda.get_device_name(device) if cuda else "cpu",
+        "args": {k: v for k, v in vars(args).items() if k not in ("opts", "output")},
+        "config_file": args.config_file,
+        "houses": len(samples),
+        "points_num": [int(s["x"][0].shape[0]) for s in samples],
+        "gt_boxes_num": [len(g) for g in gts],
+        "proposals_num": [len(p) for p in proposals],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+r"""
+Long-lived detection service: the model is built and the checkpoint loaded
+once, then scenes are detected as they arrive, with the pending scenes
+micro batched by trainMerge up to a voxel budget.
+
+Scenes (.ply, or .pth as in SuncgTorch) arrive by
+  --spool DIR: files moved (renamed) into DIR/in. A file is claimed by
+      moving it to DIR/work, the result is written to DIR/out/<name>.pth,
+      the scenes that fail are moved to DIR/failed.
+      Write the file elsewhere then rename it into DIR/in, as only complete
+      .ply / .pth files should be seen there.
+  --socket PATH: unix socket, one json request per line
+      {"path": "/abs/scene.ply", "out": "/abs/result.pth"}
+      answered by one json line {"out": ..., "boxes": n} or {"error": ...}
+
+A result is a cpu BoxList3D (yx_zb) saved by torch.save, in the frame of
+the input points.
+
+python tools/serve_sparse3d.py --config-file configs/4c/4c_Fpn432_bs1_lr5_SD.yaml --spool /tmp/spool MODEL.WEIGHT model_final.pth
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+import torch
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.modeling.detector import build_detection_model
+from maskrcnn_benchmark.utils.checkpoint import DetectronCheckpointer
+from maskrcnn_benchmark.utils.logger import setup_logger
+
+from data3d.data import trainMerge
+from data3d.ply_io import read_ply_points
+from data3d.suncg_utils.suncg_dataset import ELEMENTS_IDS
+from train_net_sparse3d import intact_cfg
+
+SCENE_EXTS = ('.ply', '.pth')
+
+
+class Job(object):
+    """
+    path: the scene file, out: the result file
+    reply: called with the result dict (out, boxes or error) when done, only
+        once
+    """
+
+    def __init__(self, path, out, reply=None):
+        self.path = path
+        self.out = out
+        self.reply = reply
+        self.data = None
+        self.offset = None
+        self.finished = False
+
+    def done(self, result):
+        if self.finished:
+            return
+        self.finished = True
+        if self.reply is not None:
+            self.reply(result)
+
+
+def load_scene(path):
+    """
+    Returns pcl: [n,9] float32, [xyz, color, normal], zeros if missing
+    """
+    if path.endswith('.ply'):
+        points, colors, normals = read_ply_points(path)
+        zeros = np.zeros_like(points)
+        pcl = np.concatenate([points,
+                              colors if colors is not None else zeros,
+                              normals if normals is not None else zeros], 1)
+    else:
+        pcl = torch.load(path)
+        if isinstance(pcl, (tuple, list)):
+            # (pcl, bboxes) of SuncgTorch
+            pcl = pcl[0]
+    return np.ascontiguousarray(pcl, dtype=np.float32)
+
+
+class Voxelizer(object):
+    """
+    The input of the model from the points, as SUNCGDataset at test time
+    without augmentation: the points beyond VOXEL_FULL_SCALE are dropped.
+    """
+
+    def __init__(self, cfg):
+        self.scale = cfg.SPARSE3D.VOXEL_SCALE
+        self.full_scale = np.array(cfg.SPARSE3D.VOXEL_FULL_SCALE)
+        self.with_xyz = 'xyz' in cfg.INPUT.ELEMENTS
+        self.elements_ids = np.sort(np.array([ELEMENTS_IDS[e] for e in cfg.INPUT.ELEMENTS]).reshape(-1))
+
+    def __call__(self, job):
+        """
+        Set job.data (the input of trainMerge) and job.offset (meter): the
+        boxes predicted in the voxel frame minus offset are in the frame of
+        the input points.
+        """
+        pcl = load_scene(job.path)
+        a = pcl[:, 0:3] * self.scale
+        offset = -a.min(0)
+        a += offset
+        b = pcl[:, self.elements_ids]
+        if self.with_xyz:
+            b[:, 0:3] = a / self.scale
+        keep = np.all(a < self.full_scale[np.newaxis, :], 1)
+        if not np.all(keep):
+            logging.getLogger("maskrcnn_benchmark.serve").warning(
+                f"{job.path}: {np.sum(~keep)} points beyond full scale are dropped")
+        locs = torch.from_numpy(a[keep]).long()
+        feats = torch.from_numpy(np.ascontiguousarray(b[keep]))
+        job.data = {'x': [locs, feats], 'y': None, 'id': 0, 'fn': job.path}
+        job.offset = offset / self.scale
+        return locs.shape[0]
+
+
+class BatchingServer(object):
+    """
+    Jobs are submitted by any thread, run() detects them in micro batches:
+    the pending jobs are taken in arrival order, waiting up to max_wait
+    seconds for more, until the voxel budget is reached. A scene over the
+    budget is run alone.
+    """
+
+    def __init__(self, model, voxelizer, device, voxel_budget, max_wait):
+        self.model = model
+        self.voxelizer = voxelizer
+        self.device = device
+        self.voxel_budget = voxel_budget
+        self.max_wait = max_wait
+        self.jobs = queue.Queue()
+        self.carry = None
+        self.logger = logging.getLogger("maskrcnn_benchmark.serve")
+
+    def submit(self, job):
+        self.jobs.put(job)
+
+    def _prepare(self, job):
+        try:
+            return self.voxelizer(job)
+        except Exception as e:
+            self.logger.error(f"{job.path}: {e}")
+            job.done({'error': str(e)})
+            return None
+
+    def next_batch(self):
+        batch, voxels = [], 0
+        deadline = None
+        while True:
+            if self.carry is not None:
+                job, n = self.carry
+                self.carry = None
+            else:
+                timeout = None if deadline is None else max(0, deadline - time.time())
+                try:
+                    job = self.jobs.get(timeout=timeout)
+                except queue.Empty:
+                    return batch
+                n = self._prepare(job)
+                if n is None:
+                    continue
+            if len(batch) > 0 and voxels + n > self.voxel_budget:
+                self.carry = (job, n)
+                return batch
+            batch.append(job)
+            voxels += n
+            if voxels >= self.voxel_budget:
+                return batch
+            if deadline is None:
+                deadline = time.time() + self.max_wait
+
+    def run_batch(self, batch):
+        start = time.time()
+        data = trainMerge([job.data for job in batch])
+        x = [data['x'][0].to(self.device), data['x'][1].to(self.device)]
+        with torch.no_grad():
+            output = self.model(x)
+        for job, boxlist in zip(batch, output):
+            boxlist = boxlist.to(torch.device("cpu"))
+            shift = boxlist.bbox3d.new_zeros(7)
+            shift[0:3] = torch.from_numpy(job.offset)
+            boxlist.bbox3d = boxlist.bbox3d - shift
+            os.makedirs(os.path.dirname(os.path.abspath(job.out)), exist_ok=True)
+            tmp = job.out + '.tmp'
+            torch.save(boxlist, tmp)
+            os.replace(tmp, job.out)
+            job.data = None
+            job.done({'out': job.out, 'boxes': len(boxlist)})
+        self.logger.info(f"{len(batch)} scenes, {data['x'][0].shape[0]} voxels in {time.time() - start:.3f} s")
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if len(batch) == 0:
+                continue
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                self.logger.exception(f"batch of {[job.path for job in batch]} failed")
+                # the jobs before the failing one are already written
+                for job in batch:
+                    if not job.finished:
+                        job.done({'error': str(e)})
+
+
+def watch_spool(server, spool_dir, poll):
+    """
+    Claim the scenes in spool_dir/in by moving them to spool_dir/work, the
+    claimed file is removed once detected, or moved to spool_dir/failed.
+    """
+    dirs = {d: os.path.join(spool_dir, d) for d in ['in', 'work', 'out', 'failed']}
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+
+    def finisher(path):
+        def finish(result):
+            try:
+                if 'error' in result:
+                    os.replace(path, os.path.join(dirs['failed'], os.path.basename(path)))
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+        return finish
+
+    def mtime(fn):
+        # the file may be claimed by another server since the glob
+        try:
+            return os.path.getmtime(fn)
+        except OSError:
+            return float('inf')
+
+    # the scenes claimed before a restart
+    fns = sorted(glob.glob(os.path.join(dirs['work'], '*')))
+    while True:
+        fns += sorted(glob.glob(os.path.join(dirs['in'], '*')), key=mtime)
+        for fn in fns:
+            name = os.path.basename(fn)
+            stem, ext = os.path.splitext(name)
+            if ext not in SCENE_EXTS:
+                continue
+            work_fn = os.path.join(dirs['work'], name)
+            if fn != work_fn:
+                try:
+                    os.rename(fn, work_fn)
+                except OSError:
+                    # claimed by another server
+                    continue
+            server.submit(Job(work_fn, os.path.join(dirs['out'], stem + '.pth'), finisher(work_fn)))
+        fns = []
+        time.sleep(poll)
+
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line.decode())
+                path = request['path']
+                out = request.get('out', os.path.splitext(path)[0] + '_boxes.pth')
+            except (ValueError, KeyError) as e:
+                self._send({'error': f'bad request: {e}'})
+                continue
+            finished = threading.Event()
+            result = {}
+
+            def reply(r):
+                result.update(r)
+                finished.set()
+            self.server.batching.submit(Job(path, out, reply))
+            finished.wait()
+            self._send(result)
+
+    def _send(self, result):
+        self.wfile.write((json.dumps(result) + '\n').encode())
+        self.wfile.flush()
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(server, path):
+    if os.path.exists(path):
+        os.remove(path)
+    unix_server = ThreadingUnixServer(path, SocketHandler)
+    unix_server.batching = server
+    unix_server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm model SparseRCNN detection service")
+    parser.add_argument(
+        "--config-file",
+        default="",
+        metavar="FILE",
+        help="path to config file",
+        type=str,
+    )
+    parser.add_argument("--spool", default="", help="spool directory (in/, work/, out/)")
+    parser.add_argument("--socket", default="", help="unix socket path")
+    parser.add_argument("--voxel-budget", type=int, default=1000000,
+                        help="max input voxels (points) of one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=20,
+                        help="time waiting for more scenes to fill a batch")
+    parser.add_argument("--poll", type=float, default=0.2, help="spool polling period (s)")
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+    assert args.spool or args.socket, "set --spool and / or --socket"
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    intact_cfg(cfg)
+    cfg.freeze()
+    logger = setup_logger("maskrcnn_benchmark", cfg.OUTPUT_DIR, 0)
+    logger.info(args)
+
+    model = build_detection_model(cfg)
+    device = torch.device(cfg.MODEL.DEVICE)
+    model.to(device)
+    DetectronCheckpointer(cfg, model, save_dir=cfg.OUTPUT_DIR).load(cfg.MODEL.WEIGHT)
+    model.eval()
+
+    server = BatchingServer(model, Voxelizer(cfg), device, args.voxel_budget, args.max_wait_ms / 1000.0)
+    if args.spool:
+        threading.Thread(target=watch_spool, args=(server, args.spool, args.poll), daemon=True).start()
+        logger.info(f"watching {args.spool}/in")
+    if args.socket:
+        threading.Thread(target=serve_socket, args=(server, args.socket), daemon=True).start()
+        logger.info(f"listening on {args.socket}")
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
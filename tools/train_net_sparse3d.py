@@ -25,6 +25,8 @@ from maskrcnn_benchmark.utils.comm import synchronize, get_rank
 from maskrcnn_benchmark.utils.imports import import_file
 from maskrcnn_benchmark.utils.logger import setup_logger
 from maskrcnn_benchmark.utils.miscellaneous import mkdir
+from maskrcnn_benchmark.utils.amp import make_grad_scaler
+from maskrcnn_benchmark.utils.profiler import StageProfiler
 
 from data3d.data import make_data_loader, check_data
 from data3d.dataset_metas import DSET_METAS
@@ -48,6 +50,7 @@ def train(cfg, local_rank, distributed, loop, only_test, min_loss):
                   start_iter=arguments["iteration"])
 
     scheduler = make_lr_scheduler(cfg, optimizer)
+    scaler = make_grad_scaler(cfg)
 
     if distributed:
         model = torch.nn.parallel.DistributedDataParallel(
@@ -69,6 +72,11 @@ def train(cfg, local_rank, distributed, loop, only_test, min_loss):
     if only_test:
       return model, min_loss
 
+    profiler = None
+    if cfg.DEBUG.PROFILE:
+      trace_fn = os.path.join(output_dir, f'profile_trace_rank{get_rank()}.json')
+      profiler = StageProfiler(device, trace_fn, cfg.DEBUG.PROFILE_TRACE_ITERS, pid=get_rank())
+      (model.module if distributed else model).enable_profiler(profiler)
 
     checkpoint_period = int(cfg.SOLVER.CHECKPOINT_PERIOD_EPOCHS * cfg.INPUT.Example_num / cfg.SOLVER.IMS_PER_BATCH)
 
@@ -89,8 +97,16 @@ def train(cfg, local_rank, distributed, loop, only_test, min_loss):
           cfg.DEBUG.eval_in_train_per_iter,
           cfg.TEST.IOU_THRESHOLD,
           min_loss,
-          eval_aug_thickness = EVAL_AUG_THICKNESS
+          eval_aug_thickness = EVAL_AUG_THICKNESS,
+          scaler = scaler,
+          detect_anomaly = cfg.DEBUG.DETECT_ANOMALY,
+          eval_max_scenes = cfg.DEBUG.eval_in_train_max_scenes,
+          profiler = profiler,
+          log_period = cfg.SOLVER.LOG_PERIOD,
+          check_nan = cfg.DEBUG.CHECK_NAN,
       )
+    if profiler is not None:
+      (model.module if distributed else model).disable_profiler()
 
     return model, min_loss
 
@@ -99,6 +115,34 @@ def test(cfg, model, distributed, epoch):
     ay = cfg.TEST.EVAL_AUG_THICKNESS_Y_TAR_ANC
     az = cfg.TEST.EVAL_AUG_THICKNESS_Z_TAR_ANC
     EVAL_AUG_THICKNESS = {'target_Y':ay[0], 'anchor_Y':ay[1],'target_Z':az[0], 'anchor_Z':az[1], }
+    eval_sweep = None
+    if len(cfg.TEST.SWEEP_IOU_THRESHOLDS) > 0 or len(cfg.TEST.SWEEP_EVAL_AUG_THICKNESS) > 0:
+      iou_threshs = cfg.TEST.SWEEP_IOU_THRESHOLDS or [cfg.TEST.IOU_THRESHOLD]
+      eval_aug_thicknesses = [{'target_Y':t, 'anchor_Y':t, 'target_Z':t, 'anchor_Z':t}
+                              for t in cfg.TEST.SWEEP_EVAL_AUG_THICKNESS] or [EVAL_AUG_THICKNESS]
+      eval_sweep = dict(iou_threshs=iou_threshs, eval_aug_thicknesses=eval_aug_thicknesses)
+    tiling = None
+    if cfg.TEST.TILED:
+      tiling = dict(tile_size=cfg.SPARSE3D.VOXEL_FULL_SCALE,
+                    overlap=int(cfg.TEST.TILE_OVERLAP * cfg.SPARSE3D.VOXEL_SCALE),
+                    voxel_scale=cfg.SPARSE3D.VOXEL_SCALE,
+                    tiles_per_batch=cfg.TEST.TILES_PER_BATCH,
+                    nms_thresh=cfg.TEST.TILE_NMS_THRESH,
+                    nms_aug_thickness=cfg.MODEL.ROI_HEADS.NMS_AUG_THICKNESS_Y_Z,
+                    xyz_feat='xyz' in cfg.INPUT.ELEMENTS)
+    tta = None
+    if cfg.TEST.TTA:
+      # feature columns of each element, in the order of the dataset
+      cols = {}
+      for e in ['xyz', 'color', 'normal']:
+        if e in cfg.INPUT.ELEMENTS:
+          cols[e] = [3*len(cols), 3*len(cols)+1, 3*len(cols)+2]
+      tta = dict(reps=cfg.SPARSE3D.VAL_REPS,
+                 voxel_scale=cfg.SPARSE3D.VOXEL_SCALE,
+                 iou_thresh=cfg.TEST.TTA_FUSION_IOU,
+                 nms_aug_thickness=cfg.MODEL.ROI_HEADS.NMS_AUG_THICKNESS_Y_Z,
+                 xyz_cols=cols.get('xyz'),
+                 normal_cols=cols.get('normal'))
 
     if distributed:
         model = model.module
@@ -131,6 +175,9 @@ def test(cfg, model, distributed, epoch):
             output_folder=output_folder,
             epoch = epoch,
             eval_aug_thickness = EVAL_AUG_THICKNESS,
+            eval_sweep = eval_sweep,
+            tiling = tiling,
+            tta = tta,
         )
         synchronize()
     pass
@@ -171,9 +218,12 @@ def main():
     args.distributed = num_gpus > 1
 
     if args.distributed:
-        torch.cuda.set_device(args.local_rank)
+        # gloo for cpu only runs, comm.all_gather then exchanges cpu tensors
+        backend = "nccl" if torch.cuda.is_available() else "gloo"
+        if backend == "nccl":
+            torch.cuda.set_device(args.local_rank)
         torch.distributed.init_process_group(
-            backend="nccl", init_method="env://"
+            backend=backend, init_method="env://"
         )
 
     cfg.merge_from_file(args.config_file)
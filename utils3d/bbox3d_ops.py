@@ -768,6 +768,8 @@ class Bbox3D():
     corners0 = Bbox3D.bbox_corners(bbox0, up_axis)
     xneg_corners0 = np.mean(corners0[Bbox3D._xneg_vs], 0, keepdims=True)
     xpos_corners0 = np.mean(corners0[Bbox3D._xpos_vs], 0, keepdims=True)
+    if bboxes_others.shape[0] == 0:
+      return [-1, -1], np.concatenate([xneg_corners0, xpos_corners0], 0)
 
     direction = np.expand_dims(bbox0[0:3], 0) - xneg_corners0
     direction = direction / np.linalg.norm(direction)
@@ -821,14 +823,28 @@ class Bbox3D():
     intersec_corners_idx: [n][2]
       the intersection index
     intersec_corners: [n,2,3]
+
+    Only the boxes close enough to contain a corner of box i are checked:
+    a point inside box j is within the half diagonal of j from its center,
+    and the corners (and the points searched inward from them, up to 4e-2)
+    are within the half diagonal of i from the center of i. The candidates
+    are found by a kd-tree radius query on the centers, in index order, so
+    the result is the same as checking all the other boxes.
     '''
+    from scipy.spatial import cKDTree
     bn = bboxes.shape[0]
     intersec_corners_idx = []
     intersec_corners = []
+    centroids = bboxes[:,0:3]
+    half_diags = np.linalg.norm(bboxes[:,3:6], axis=1) / 2.0 + 4e-2
+    if bn > 0:
+      neighbours = cKDTree(centroids).query_ball_point(centroids, half_diags + half_diags.max())
     for i in range(bn):
-      bboxes_others = bboxes[ [j for j in range(bn) if j!=i] ]
-      itsc_i, xcorners_i = Bbox3D.detect_intersection_corners(bboxes[i], bboxes_others, up_axis)
-      itsc_i = [d+int(d>=i) for d in  itsc_i]
+      cands = np.array(sorted(neighbours[i]), dtype=np.int64)
+      dis = np.linalg.norm(centroids[cands] - centroids[i], axis=1)
+      cands = cands[(cands != i) & (dis <= half_diags[cands] + half_diags[i])]
+      itsc_i, xcorners_i = Bbox3D.detect_intersection_corners(bboxes[i], bboxes[cands], up_axis)
+      itsc_i = [int(cands[d]) if d>=0 else -1 for d in itsc_i]
 
       if scene_scope is not None:
         # check if the intersec_corners are inside scene_scope
@@ -1,9 +1,19 @@
 import torch
 import numpy as np
 from second.core.non_max_suppression.nms_gpu import rotate_iou_gpu_eval
+from second.core.non_max_suppression.rotate_iou_cpu import rotate_iou_cpu_eval
 
 DEBUG = False
 
+def rotate_iou_eval(boxes, query_boxes, criterion=-1, device_id=None):
+  '''
+  rotate_iou_gpu_eval on the cuda device device_id, rotate_iou_cpu_eval if
+  device_id is None (cpu tensors)
+  '''
+  if device_id is None:
+    return rotate_iou_cpu_eval(boxes, query_boxes, criterion=criterion)
+  return rotate_iou_gpu_eval(boxes, query_boxes, criterion=criterion, device_id=device_id)
+
 def iou_one_dim(targets_z, anchors_z):
     '''
     For ceiling, and floor: z size of target is small, augment to 1
@@ -61,7 +71,7 @@ def boxes_iou_3d(targets_bbox3d, anchors_bbox3d, aug_thickness=None, criterion=-
 
   iouz = iou_one_dim(targets_bbox3d[:,[2,5]], anchors_bbox3d[:,[2,5]])
 
-  cuda_index = targets_bbox3d.device.index
+  cuda_index = targets_bbox3d.device.index if targets_bbox3d.is_cuda else None
   anchors_2d = anchors_bbox3d[:,[0,1,3,4,6]].cpu().data.numpy()
   targets_2d = targets_bbox3d[:,[0,1,3,4,6]].cpu().data.numpy()
 
@@ -78,7 +88,7 @@ def boxes_iou_3d(targets_bbox3d, anchors_bbox3d, aug_thickness=None, criterion=-
   #anchors_2d[:,2] += aug_thickness['anchor'] * aug_th_mask
 
   # criterion=1: use targets_2d as ref
-  iou2d = rotate_iou_gpu_eval(targets_2d, anchors_2d, criterion=criterion, device_id=cuda_index)
+  iou2d = rotate_iou_eval(targets_2d, anchors_2d, criterion=criterion, device_id=cuda_index)
   iou2d = torch.from_numpy(iou2d)
   iou2d = iou2d.to(targets_bbox3d.device)
 
@@ -107,9 +117,9 @@ def boxes_iou_3d(targets_bbox3d, anchors_bbox3d, aug_thickness=None, criterion=-
           #print(a.bbox3d.cpu().data.numpy())
           #print(t.bbox3d.cpu().data.numpy())
 
-          areas = rotate_iou_gpu_eval(targets_2d, anchors_2d, criterion=3, device_id=cuda_index)
-          ious0 = rotate_iou_gpu_eval(targets_2d, anchors_2d, criterion=0, device_id=cuda_index)
-          ious1 = rotate_iou_gpu_eval(targets_2d, anchors_2d, criterion=1, device_id=cuda_index)
+          areas = rotate_iou_eval(targets_2d, anchors_2d, criterion=3, device_id=cuda_index)
+          ious0 = rotate_iou_eval(targets_2d, anchors_2d, criterion=0, device_id=cuda_index)
+          ious1 = rotate_iou_eval(targets_2d, anchors_2d, criterion=1, device_id=cuda_index)
           import pdb; pdb.set_trace()  # XXX BREAKPOINT
           areas_max = areas[t_i, a_i]
           import pdb; pdb.set_trace()  # XXX BREAKPOINT